@@ -15,6 +15,7 @@
 """
 
 from .syntax.translator import scenarioFromFile, scenarioFromString
+from .core.simulators import runCampaign
 
 import scenic.core.errors as _errors
 _errors.showInternalBacktrace = False
@@ -14,7 +14,7 @@ else:
 
 import scenic.syntax.translator as translator
 import scenic.core.errors as errors
-from scenic.core.simulators import SimulationCreationError
+from scenic.core.simulators import SimulationCreationError, runCampaign
 
 parser = argparse.ArgumentParser(prog='scenic', add_help=False,
                                  usage='scenic [-h | --help] [options] FILE [options]',
@@ -33,13 +33,17 @@ mainOptions.add_argument('-p', '--param', help='override a global parameter',
 mainOptions.add_argument('-m', '--model', help='specify a Scenic world model', default=None)
 mainOptions.add_argument('--scenario', default=None,
                          help='name of scenario to run (if file contains multiple)')
+mainOptions.add_argument('--count', type=int, default=0,
+                         help='number of scenes to generate, or of successful simulations '
+                              'to run if -S is given (default infinity)')
+mainOptions.add_argument('--workers', type=int, default=1, metavar='K',
+                         help='number of worker processes to use to generate scenes '
+                              '(default 1)')
 
 # Simulation options
 simOpts = parser.add_argument_group('dynamic simulation options')
 simOpts.add_argument('--time', help='time bound for simulations (default none)',
                      type=int, default=None)
-simOpts.add_argument('--count', help='number of successful simulations to run (default infinity)',
-                     type=int, default=0)
 simOpts.add_argument('--max-sims-per-scene', type=int, default=1, metavar='N',
                      help='max # of rejected simulations before sampling a new scene (default 1)')
 
@@ -72,6 +76,8 @@ debugOpts.add_argument('--dump-python', help='dump Python equivalent of final AS
 debugOpts.add_argument('--no-pruning', help='disable pruning', action='store_true')
 debugOpts.add_argument('--gather-stats', type=int, metavar='N',
                        help='collect timing statistics over this many scenes')
+debugOpts.add_argument('--sampler', choices=('recursive', 'plan'), default='recursive',
+                       help='sampling backend to use (default recursive)')
 
 parser.add_argument('-h', '--help', action='help', default=argparse.SUPPRESS,
                     help=argparse.SUPPRESS)
@@ -119,8 +125,9 @@ scenario = errors.callBeginningScenicTrace(
 totalTime = time.time() - startTime
 if args.verbosity >= 1:
     print(f'Scenario constructed in {totalTime:.2f} seconds.')
+scenario.setSamplingBackend(args.sampler)
 
-if args.simulate:
+if args.simulate and args.workers <= 1:
     simulator = errors.callBeginningScenicTrace(scenario.getSimulator)
 
 def generateScene():
@@ -136,6 +143,29 @@ def generateScene():
                 print(f'    Parameter "{param}": {value}')
     return scene, iterations
 
+def generateScenes(batchSize):
+    """Generate scenes indefinitely, in parallel batches if multiple workers are used."""
+    if args.workers <= 1:
+        while True:
+            yield generateScene()
+    while True:
+        startTime = time.time()
+        results = errors.callBeginningScenicTrace(
+            lambda: scenario.generateMany(batchSize, workers=args.workers,
+                                          verbosity=args.verbosity)
+        )
+        if args.verbosity >= 1:
+            totalTime = time.time() - startTime
+            print(f'  Generated {len(results)} scenes in {totalTime:.4g} seconds '
+                  f'using {args.workers} workers.')
+        for scene, iterations in results:
+            if args.verbosity >= 1:
+                print(f'  Generated scene in {iterations} iterations.')
+                if args.show_params:
+                    for param, value in scene.params.items():
+                        print(f'    Parameter "{param}": {value}')
+            yield scene, iterations
+
 def runSimulation(scene):
     startTime = time.time()
     if args.verbosity >= 1:
@@ -153,21 +183,56 @@ def runSimulation(scene):
         totalTime = time.time() - startTime
         print(f'  Ran simulation in {totalTime:.4g} seconds.')
     if simulation and args.show_records:
-        for name, value in simulation.result.records.items():
-            if isinstance(value, list):
-                print(f'    Record "{name}": (time series)')
-                for step, subval in value:
-                    print(f'      {step:4d}: {subval}')
-            else:
-                print(f'    Record "{name}": {value}')
+        showRecords(simulation.result)
     return simulation is not None
 
+def runSimulations(count):
+    """Run simulations in parallel until the given number succeed (or forever, if 0)."""
+    successCount = 0
+    while count <= 0 or successCount < count:
+        batchSize = args.workers if count <= 0 else count - successCount
+        startTime = time.time()
+        campaign = runCampaign(scenario, batchSize, workers=args.workers,
+                               maxSteps=args.time,
+                               maxSimulationIterations=args.max_sims_per_scene,
+                               verbosity=args.verbosity)
+        while True:
+            run = errors.callBeginningScenicTrace(lambda: next(campaign, None))
+            if run is None:
+                break
+            if args.verbosity >= 1:
+                if run.result is None:
+                    print(f'  Simulation of scene {run.index} failed.')
+                else:
+                    print(f'  Simulated scene {run.index} in worker {run.workerNum}.')
+            if run.result is not None:
+                successCount += 1
+                if args.show_records:
+                    showRecords(run.result)
+        if args.verbosity >= 1:
+            totalTime = time.time() - startTime
+            print(f'  Ran {batchSize} simulations in {totalTime:.4g} seconds '
+                  f'using {args.workers} workers.')
+
+def showRecords(result):
+    for name, value in result.records.items():
+        if isinstance(value, list):
+            print(f'    Record "{name}": (time series)')
+            for step, subval in value:
+                print(f'      {step:4d}: {subval}')
+        else:
+            print(f'    Record "{name}": {value}')
+
 try:
-    if args.gather_stats is None:   # Generate scenes interactively until killed
+    if args.gather_stats is None and args.simulate and args.workers > 1:
+        runSimulations(args.count)
+    elif args.gather_stats is None:   # Generate scenes interactively until killed
         import matplotlib.pyplot as plt
         successCount = 0
-        while True:
-            scene, _ = generateScene()
+        batchSize = args.workers
+        if not args.simulate and args.count > 0:
+            batchSize = min(batchSize, args.count)
+        for scene, _ in generateScenes(batchSize):
             if args.simulate:
                 success = runSimulation(scene)
                 if success:
@@ -175,18 +240,22 @@ try:
                     if 0 < args.count <= successCount:
                         break
             else:
+                successCount += 1
                 if delay is None:
                     scene.show(zoom=args.zoom)
                 else:
                     scene.show(zoom=args.zoom, block=False)
                     plt.pause(delay)
                     plt.clf()
+                if 0 < args.count <= successCount:
+                    break
     else:   # Gather statistics over the specified number of scenes
         its = []
         startTime = time.time()
-        while len(its) < args.gather_stats:
-            scene, iterations = generateScene()
+        for scene, iterations in generateScenes(args.gather_stats):
             its.append(iterations)
+            if len(its) >= args.gather_stats:
+                break
         totalTime = time.time() - startTime
         count = len(its)
         print(f'Sampled {len(its)} scenes in {totalTime:.2f} seconds.')
@@ -197,7 +266,7 @@ except KeyboardInterrupt:
     pass
 
 finally:
-    if args.simulate:
+    if args.simulate and args.workers <= 1:
         simulator.destroy()
 
 def dummy():    # for the 'scenic' entry point to call after importing this module
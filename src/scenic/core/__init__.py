@@ -14,6 +14,7 @@
    geometry
    lazy_eval
    object_types
+   parallel
    pruning
    regions
    requirements
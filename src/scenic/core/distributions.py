@@ -52,6 +52,154 @@ class RejectionException(Exception):
 	"""Exception used to signal that the sample currently being generated must be rejected."""
 	pass
 
+class SampledValues(DefaultIdentityDict):
+	"""Values sampled so far for a collection of `Samplable` objects.
+
+	This is the mapping passed to `Samplable.sampleGiven`. Besides the values of the
+	dependencies, it provides the random number generator to use for any new random
+	choices, which has the same interface as :obj:`random.Random`.
+
+	Args:
+		rng: the random number generator (default is Python's global generator,
+		  i.e. the `random` module itself).
+	"""
+	def __init__(self, rng=None):
+		super().__init__()
+		self.rng = random if rng is None else rng
+
+class BatchedValues(DefaultIdentityDict):
+	"""Values sampled for a batch of independent samples, stored as columns.
+
+	This is the mapping passed to `Samplable.batchSampleGiven`. The column for a
+	`Samplable` is either a NumPy array whose first axis indexes the samples (numbers
+	are stored as 1-D arrays and vectors as arrays of shape (n, 2)) or a list of
+	arbitrary values. As in `SampledValues`, values which have not been sampled are
+	mapped to themselves, being the same for all samples.
+
+	Samples which have been rejected are marked in the ``rejected`` array; their
+	entries in the columns are meaningless.
+
+	Args:
+		n (int): the number of samples in the batch.
+		rng (numpy.random.Generator): the generator to use for vectorized sampling.
+		  Samplables which are sampled one sample at a time use a :obj:`random.Random`
+		  seeded from it.
+	"""
+	def __init__(self, n, rng):
+		super().__init__()
+		self.n = n
+		self.rng = rng
+		self.rowRNG = random.Random(int(rng.integers(2**63)))
+		self.rejected = numpy.zeros(n, dtype=bool)
+		self._lists = {}
+		self._rows = {}
+		from scenic.core.vectors import Vector
+		self._vectorType = Vector
+
+	def row(self, index):
+		"""A `SampledValues` view of the values of the sample with the given index."""
+		row = self._rows.get(index)
+		if row is None:
+			row = self._rows[index] = _BatchRow(self, index)
+		return row
+
+	def element(self, key, index):
+		"""The value of **key** in the sample with the given index."""
+		keyID = id(key)
+		if keyID not in self.storage:
+			return key
+		return self._element(keyID, self.storage[keyID], index)
+
+	def _element(self, keyID, column, index):
+		if not isinstance(column, numpy.ndarray):
+			return column[index]
+		items = self._lists.get(keyID)
+		if items is None:
+			items = self._lists[keyID] = column.tolist()
+		item = items[index]
+		return self._vectorType(*item) if column.ndim == 2 else item
+
+	def numbers(self, key):
+		"""The column for **key** as a 1-D array, or a scalar if it is a constant number.
+
+		Returns None if the values are not all numbers.
+		"""
+		if id(key) not in self.storage:
+			if isinstance(key, (float, int)) and not isinstance(key, bool):
+				return key
+			return None
+		column = self.storage[id(key)]
+		if isinstance(column, numpy.ndarray) and column.ndim == 1:
+			return column
+		return None
+
+	def vectors(self, key):
+		"""The column for **key** as an array of shape (n, 2), or (2,) if it is constant.
+
+		Returns None if the values are not all vectors.
+		"""
+		if id(key) not in self.storage:
+			if isinstance(key, self._vectorType) and not needsSampling(key):
+				return numpy.array(key.coordinates, dtype=float)
+			return None
+		column = self.storage[id(key)]
+		if isinstance(column, numpy.ndarray) and column.ndim == 2:
+			return column
+		return None
+
+	def makeColumn(self, items):
+		"""Make a column from a list of the values of each sample.
+
+		If all the values (of samples which have not been rejected) are numbers or
+		vectors, the column is vectorized; otherwise the list itself is used (as it is
+		for integers too large for NumPy).
+		"""
+		valid = [item for item, rejected in zip(items, self.rejected) if not rejected]
+		kinds = set(map(type, valid))
+		if kinds and kinds <= {float, int}:
+			dtype = float if float in kinds else int
+			try:
+				return numpy.array([0 if rejected else item
+				                    for item, rejected in zip(items, self.rejected)],
+				                   dtype=dtype)
+			except OverflowError:
+				return items
+		if kinds == {self._vectorType}:
+			return numpy.array([(0, 0) if rejected else item.coordinates
+			                    for item, rejected in zip(items, self.rejected)], dtype=float)
+		return items
+
+class _BatchRow(SampledValues):
+	"""View of a single sample of a `BatchedValues`, converting values as needed."""
+	def __init__(self, batch, index):
+		super().__init__(batch.rowRNG)
+		self.batch = batch
+		self.index = index
+
+	def __getitem__(self, key):
+		keyID = id(key)
+		storage = self.storage
+		if keyID in storage:
+			return storage[keyID]
+		batchStorage = self.batch.storage
+		if keyID not in batchStorage:
+			return key
+		value = storage[keyID] = self.batch._element(keyID, batchStorage[keyID], self.index)
+		return value
+
+	def __contains__(self, key):
+		return id(key) in self.storage or id(key) in self.batch.storage
+
+	def detached(self):
+		"""Copy the values of this sample into a `SampledValues` not referring to the batch."""
+		values = SampledValues(self.rng)
+		batch, index = self.batch, self.index
+		storage = values.storage
+		for keyID, column in batch.storage.items():
+			storage[keyID] = batch._element(keyID, column, index)
+		storage.update(self.storage)
+		return values
+
 ## Abstract distributions
 
 class Samplable(LazilyEvaluable):
@@ -73,30 +221,90 @@ class Samplable(LazilyEvaluable):
 		self._conditioned = self	# version (partially) conditioned on requirements
 
 	@staticmethod
-	def sampleAll(quantities):
+	def sampleAll(quantities, rng=None):
 		"""Sample all the given Samplables, which may have dependencies in common.
 
+		Random choices are made using **rng**, which must have the same interface as
+		:obj:`random.Random` (by default, Python's global generator is used).
+
 		Reproducibility note: the order in which the quantities are given can affect the
 		order in which calls to random are made, affecting the final result.
 		"""
-		subsamples = DefaultIdentityDict()
+		subsamples = SampledValues(rng)
 		for q in quantities:
 			if q not in subsamples:
 				subsamples[q] = q.sample(subsamples) if isinstance(q, Samplable) else q
 		return subsamples
 
-	def sample(self, subsamples=None):
-		"""Sample this value, optionally given some values already sampled."""
+	def sample(self, subsamples=None, rng=None):
+		"""Sample this value, optionally given some values already sampled.
+
+		If **subsamples** is given, it must be a `SampledValues`, whose random number
+		generator is then used; otherwise the generator **rng** is used.
+		"""
 		if subsamples is None:
-			subsamples = DefaultIdentityDict()
+			subsamples = SampledValues(rng)
 		for child in self._conditioned._dependencies:
 			if child not in subsamples:
 				subsamples[child] = child.sample(subsamples)
 		return self._conditioned.sampleGiven(subsamples)
 
+	@staticmethod
+	def batchSampleAll(quantities, n, rng):
+		"""Sample all the given Samplables **n** times, vectorizing where possible.
+
+		Like `sampleAll`, but draws **n** independent samples at once, returning them
+		as the columns of a `BatchedValues`. Samples for which some value raised a
+		`RejectionException` are marked as rejected rather than aborting the batch.
+
+		Args:
+			quantities: the Samplables to sample.
+			n (int): the number of samples.
+			rng (numpy.random.Generator): the random number generator to use.
+		"""
+		values = BatchedValues(n, rng)
+		for q in quantities:
+			if isinstance(q, Samplable) and q not in values:
+				values[q] = q.batchSample(values)
+		return values
+
+	def batchSample(self, values):
+		"""Sample this value for each sample of a batch, given some values already sampled.
+
+		The counterpart of `sample` for a `BatchedValues` mapping.
+		"""
+		for child in self._conditioned._dependencies:
+			if child not in values:
+				values[child] = child.batchSample(values)
+		return self._conditioned.batchSampleGiven(values)
+
+	def batchSampleGiven(self, values):
+		"""Sample this value for each sample of a batch, given columns for its dependencies.
+
+		The default implementation calls `sampleGiven` for each sample in turn, and
+		builds a column from the results using `BatchedValues.makeColumn`. Subclasses
+		may override this method to sample whole columns at once; overrides should fall
+		back on this implementation for dependencies which are not vectorized.
+		"""
+		items = []
+		rejected = values.rejected
+		for index in range(values.n):
+			if rejected[index]:
+				items.append(None)
+				continue
+			try:
+				items.append(self.sampleGiven(values.row(index)))
+			except RejectionException:
+				rejected[index] = True
+				items.append(None)
+		return values.makeColumn(items)
+
 	def sampleGiven(self, value):
 		"""Sample this value, given values for all its dependencies.
 
+		The values are provided in a `SampledValues` mapping, whose ``rng`` attribute
+		is the random number generator to use.
+
 		The default implementation simply returns a dictionary of dependency values.
 		Subclasses must override this method to specify how actual sampling is done.
 		"""
@@ -122,6 +330,98 @@ class Samplable(LazilyEvaluable):
 				l.append('  ' + line)
 		return l
 
+class SamplingPlan:
+	"""A compiled plan for sampling a fixed collection of Samplables.
+
+	`Samplable.sampleAll` traverses the dependency graph recursively for every
+	sample. A plan does this traversal once, flattening the graph into a list of the
+	Samplables to sample in the order `Samplable.sampleAll` would sample them, so
+	that each sample is then a single loop over this list. Given the same random
+	number generator, the plan makes exactly the same random choices as
+	`Samplable.sampleAll`.
+
+	The plan reflects the conditioning of the Samplables (see `Samplable.conditionTo`)
+	at the time it was compiled, so it must be recompiled if that changes.
+
+	Args:
+		quantities: the values to sample, as for `Samplable.sampleAll`.
+	"""
+	def __init__(self, quantities):
+		order = []
+		constants = []
+		stageEnds = []
+		seen = set()
+		def visit(q):
+			seen.add(id(q))
+			target = q._conditioned
+			for child in target._dependencies:
+				if id(child) not in seen:
+					visit(child)
+			order.append((q, target))
+		for q in quantities:
+			if id(q) not in seen:
+				if isinstance(q, Samplable):
+					visit(q)
+				else:
+					seen.add(id(q))
+					constants.append(q)
+			stageEnds.append(len(order))
+		self.order = tuple(order)
+		self.constants = tuple(constants)
+		self.stageEnds = tuple(stageEnds)
+		self._makeSteps()
+
+	def _makeSteps(self):
+		# slots of the sampled values (keyed by id, as in SampledValues) and the
+		# methods which sample them
+		self._steps = tuple((id(q), target.sampleGiven) for q, target in self.order)
+
+	def sample(self, rng=None):
+		"""Sample all the quantities, returning a `SampledValues`.
+
+		Args:
+			rng: the random number generator to use, as for `Samplable.sampleAll`.
+		"""
+		values = SampledValues(rng)
+		storage = values.storage
+		for q in self.constants:
+			storage[id(q)] = q
+		for slot, sampleGiven in self._steps:
+			storage[slot] = sampleGiven(values)
+		return values
+
+	def sampleInStages(self, rng=None):
+		"""Like `sample`, but yielding the `SampledValues` as each quantity is finished.
+
+		The values are yielded once before anything is sampled, then once for each of
+		the quantities given to the plan (in order), as soon as that quantity and all
+		its dependencies have been sampled.
+		"""
+		values = SampledValues(rng)
+		storage = values.storage
+		for q in self.constants:
+			storage[id(q)] = q
+		yield values
+		steps = self._steps
+		start = 0
+		for end in self.stageEnds:
+			for slot, sampleGiven in steps[start:end]:
+				storage[slot] = sampleGiven(values)
+			start = end
+			yield values
+
+	def __len__(self):
+		return len(self.order)
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		del state['_steps']		# ids are only valid in this process
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._makeSteps()
+
 class ConstantSamplable(Samplable):
 	"""A samplable which always evaluates to a constant value.
 
@@ -296,7 +596,7 @@ def toDistribution(val):
 
 class FunctionDistribution(Distribution):
 	"""Distribution resulting from passing distributions to a function"""
-	def __init__(self, func, args, kwargs, support=None, valueType=None):
+	def __init__(self, func, args, kwargs, support=None, valueType=None, vectorized=None):
 		args = tuple(toDistribution(arg) for arg in args)
 		kwargs = { name: toDistribution(arg) for name, arg in kwargs.items() }
 		if valueType is None:
@@ -306,6 +606,7 @@ class FunctionDistribution(Distribution):
 		self.arguments = args
 		self.kwargs = kwargs
 		self.support = support
+		self.vectorized = vectorized
 
 	def sampleGiven(self, value):
 		args = []
@@ -323,11 +624,19 @@ class FunctionDistribution(Distribution):
 		kwargs = { name: value[arg] for name, arg in self.kwargs.items() }
 		return self.function(*args, **kwargs)
 
+	def batchSampleGiven(self, values):
+		if self.vectorized is not None and not self.kwargs:
+			args = [values.numbers(arg) for arg in self.arguments]
+			if all(arg is not None for arg in args):
+				with numpy.errstate(all='ignore'):
+					return numpy.broadcast_to(self.vectorized(*args), values.n)
+		return super().batchSampleGiven(values)
+
 	def evaluateInner(self, context):
 		function = valueInContext(self.function, context)
 		arguments = tuple(valueInContext(arg, context) for arg in self.arguments)
 		kwargs = { name: valueInContext(arg, context) for name, arg in self.kwargs.items() }
-		return FunctionDistribution(function, arguments, kwargs)
+		return FunctionDistribution(function, arguments, kwargs, vectorized=self.vectorized)
 
 	def supportInterval(self):
 		if self.support is None:
@@ -348,16 +657,23 @@ class FunctionDistribution(Distribution):
 		args = argsToString(itertools.chain(self.arguments, self.kwargs.items()))
 		return f'{self.function.__name__}{args}'
 
-def distributionFunction(wrapped=None, *, support=None, valueType=None):
-	"""Decorator for wrapping a function so that it can take distributions as arguments."""
+def distributionFunction(wrapped=None, *, support=None, valueType=None, vectorized=None):
+	"""Decorator for wrapping a function so that it can take distributions as arguments.
+
+	If **vectorized** is given, it should be a version of the function operating
+	elementwise on NumPy arrays of numbers (e.g. a NumPy ufunc); it is used to speed
+	up batch sampling (see `Samplable.batchSampleAll`).
+	"""
 	if wrapped is None:		# written without arguments as @distributionFunction
-		return lambda wrapped: distributionFunction(wrapped,
-		                                            support=support, valueType=valueType)
+		return lambda wrapped: distributionFunction(wrapped, support=support,
+		                                            valueType=valueType,
+		                                            vectorized=vectorized)
 	def helper(wrapped, *args, **kwargs):
 		args = tuple(toDistribution(arg) for arg in args)
 		kwargs = { name: toDistribution(arg) for name, arg in kwargs.items() }
 		if any(needsSampling(arg) for arg in itertools.chain(args, kwargs.values())):
-			return FunctionDistribution(wrapped, args, kwargs, support, valueType)
+			return FunctionDistribution(wrapped, args, kwargs, support, valueType,
+			                            vectorized)
 		elif any(needsLazyEvaluation(arg)
 		         for arg in itertools.chain(args, kwargs.values())):
 			# recursively call this helper (not the original function), since the
@@ -368,8 +684,11 @@ def distributionFunction(wrapped=None, *, support=None, valueType=None):
 			return wrapped(*args, **kwargs)
 	return unpacksDistributions(decorator.decorate(wrapped, helper, kwsyntax=True))
 
-def monotonicDistributionFunction(method, valueType=None):
+def monotonicDistributionFunction(method=None, valueType=None, *, vectorized=None):
 	"""Like distributionFunction, but additionally specifies that the function is monotonic."""
+	if method is None:		# written with arguments, e.g. @monotonicDistributionFunction(...)
+		return lambda method: monotonicDistributionFunction(method, valueType,
+		                                                    vectorized=vectorized)
 	def support(*subsupports, **kwss):
 		mins, maxes = zip(*subsupports)
 		kwmins = { name: interval[0] for name, interval in kwss.items() }
@@ -377,7 +696,8 @@ def monotonicDistributionFunction(method, valueType=None):
 		l = None if None in mins or None in kwmins else method(*mins, **kwmins)
 		r = None if None in maxes or None in kwmaxes else method(*maxes, **kwmaxes)
 		return l, r
-	return distributionFunction(method, support=support, valueType=valueType)
+	return distributionFunction(method, support=support, valueType=valueType,
+	                            vectorized=vectorized)
 
 class StarredDistribution(Distribution):
 	"""A placeholder for the iterable unpacking operator * applied to a distribution."""
@@ -527,6 +847,52 @@ class OperatorDistribution(Distribution):
 			result = op(*rest)
 		return result
 
+	def batchSampleGiven(self, values):
+		if self.operator in vectorizedOperators:
+			first = values.numbers(self.object)
+			rest = [values.numbers(child) for child in self.operands]
+			if first is not None and all(arg is not None for arg in rest):
+				result = self._vectorizedResult(first, rest)
+				if result is not None:
+					return numpy.broadcast_to(result, values.n)
+		return super().batchSampleGiven(values)
+
+	def _vectorizedResult(self, first, rest):
+		# Apply the operator to whole columns at once, returning None (so that the
+		# samples are computed one at a time) where NumPy's semantics could differ from
+		# Python's: division by zero, powers which are complex or not finite, and
+		# integer overflow
+		operator = self.operator
+		args = [numpy.asarray(first)] + [numpy.asarray(arg) for arg in rest]
+		if any(arg.dtype.kind not in 'iuf' for arg in args):
+			return None
+		if operator in divisionOperators:
+			divisor = args[0] if operator.startswith('__r') else args[1]
+			if not divisor.all():
+				return None
+		elif operator in ('__pow__', '__rpow__'):
+			base, exponent = args if operator == '__pow__' else reversed(args)
+			if base.dtype.kind != 'f' and exponent.dtype.kind != 'f':
+				return None		# NumPy rejects negative integer powers
+			if (((base < 0) & (exponent != numpy.round(exponent)))
+			    | ((base == 0) & (exponent < 0))).any():
+				return None
+		with numpy.errstate(all='ignore'):
+			result = getattr(args[0], operator)(*args[1:])
+			if result is NotImplemented:
+				return None
+			result = numpy.asarray(result)
+			if result.dtype.kind == 'f':
+				if not numpy.isfinite(result).all():
+					return None
+			else:
+				# detect overflow by comparing with the result in floating point
+				floats = [arg.astype(float) for arg in args]
+				exact = getattr(floats[0], operator)(*floats[1:])
+				if not ((numpy.abs(exact) < 2**53) & (exact == result)).all():
+					return None
+		return result
+
 	def evaluateInner(self, context):
 		obj = valueInContext(self.object, context)
 		operands = tuple(valueInContext(arg, context) for arg in self.operands)
@@ -592,6 +958,26 @@ def makeOperatorHandler(op):
 for op in allowedOperators:
 	setattr(Distribution, op, makeOperatorHandler(op))
 
+# Operators which OperatorDistribution applies to whole columns of numbers at once
+# when batch sampling, using their NumPy equivalents.
+vectorizedOperators = frozenset((
+	'__neg__', '__pos__', '__abs__',
+	'__add__', '__radd__',
+	'__sub__', '__rsub__',
+	'__mul__', '__rmul__',
+	'__truediv__', '__rtruediv__',
+	'__floordiv__', '__rfloordiv__',
+	'__mod__', '__rmod__',
+	'__pow__', '__rpow__',
+))
+
+# Vectorized operators for which division by zero is checked before applying them.
+divisionOperators = frozenset((
+	'__truediv__', '__rtruediv__',
+	'__floordiv__', '__rfloordiv__',
+	'__mod__', '__rmod__',
+))
+
 import scenic.core.type_support as type_support
 
 class MultiplexerDistribution(Distribution):
@@ -609,6 +995,21 @@ class MultiplexerDistribution(Distribution):
 		assert 0 <= idx < len(self.options), (idx, len(self.options))
 		return value[self.options[idx]]
 
+	def batchSampleGiven(self, values):
+		index = values.numbers(self.index)
+		if isinstance(index, numpy.ndarray) and index.dtype.kind in 'iu':
+			n = values.n
+			options = [values.numbers(opt) for opt in self.options]
+			if (all(opt is not None for opt in options)
+			    and len(set(numpy.asarray(opt).dtype.kind for opt in options)) == 1):
+				table = numpy.stack([numpy.broadcast_to(opt, n) for opt in options])
+				return table[index, numpy.arange(n)]
+			options = [values.vectors(opt) for opt in self.options]
+			if all(opt is not None for opt in options):
+				table = numpy.stack([numpy.broadcast_to(opt, (n, 2)) for opt in options])
+				return table[index, numpy.arange(n)]
+		return super().batchSampleGiven(values)
+
 	def evaluateInner(self, context):
 		return type(self)(valueInContext(self.index, context),
 		                  (valueInContext(opt, context) for opt in self.options))
@@ -651,7 +1052,13 @@ class Range(Distribution):
 		return Options(ranges)
 
 	def sampleGiven(self, value):
-		return random.uniform(value[self.low], value[self.high])
+		return value.rng.uniform(value[self.low], value[self.high])
+
+	def batchSampleGiven(self, values):
+		low, high = values.numbers(self.low), values.numbers(self.high)
+		if low is None or high is None:
+			return super().batchSampleGiven(values)
+		return values.rng.uniform(low, high, values.n)
 
 	def evaluateInner(self, context):
 		low = valueInContext(self.low, context)
@@ -726,7 +1133,13 @@ class Normal(Distribution):
 		return Options(dict(zip(pieces, probs)))
 
 	def sampleGiven(self, value):
-		return random.gauss(value[self.mean], value[self.stddev])
+		return value.rng.gauss(value[self.mean], value[self.stddev])
+
+	def batchSampleGiven(self, values):
+		mean, stddev = values.numbers(self.mean), values.numbers(self.stddev)
+		if mean is None or stddev is None:
+			return super().batchSampleGiven(values)
+		return mean + stddev * values.rng.standard_normal(values.n)
 
 	def evaluateInner(self, context):
 		mean = valueInContext(self.mean, context)
@@ -795,10 +1208,23 @@ class TruncatedNormal(Normal):
 		beta_cdf = Normal.cdf(0, 1, beta)
 		if beta_cdf - alpha_cdf < 1e-15:
 			warnings.warn('low precision when sampling TruncatedNormal')
-		unif = random.random()
+		unif = value.rng.random()
 		p = alpha_cdf + unif * (beta_cdf - alpha_cdf)
 		return mean + (stddev * Normal.cdfinv(0, 1, p))
 
+	def batchSampleGiven(self, values):
+		import scipy.special
+		mean, stddev = values.numbers(self.mean), values.numbers(self.stddev)
+		if mean is None or stddev is None:
+			return super().batchSampleGiven(values)
+		with numpy.errstate(all='ignore'):
+			alpha_cdf = scipy.special.ndtr((self.low - mean) / stddev)
+			beta_cdf = scipy.special.ndtr((self.high - mean) / stddev)
+		if numpy.any(beta_cdf - alpha_cdf < 1e-15):
+			warnings.warn('low precision when sampling TruncatedNormal')
+		p = alpha_cdf + values.rng.random(values.n) * (beta_cdf - alpha_cdf)
+		return mean + (stddev * scipy.special.ndtri(p))
+
 	def evaluateInner(self, context):
 		mean = valueInContext(self.mean, context)
 		stddev = valueInContext(self.stddev, context)
@@ -845,7 +1271,12 @@ class DiscreteRange(Distribution):
 		return self.clone()		# already bucketed
 
 	def sampleGiven(self, value):
-		return random.choices(self.options, cum_weights=self.cumulativeWeights)[0]
+		return value.rng.choices(self.options, cum_weights=self.cumulativeWeights)[0]
+
+	def batchSampleGiven(self, values):
+		total = self.cumulativeWeights[-1]
+		probs = [weight / total for weight in self.weights]
+		return self.low + values.rng.choice(len(self.options), size=values.n, p=probs)
 
 	def isEquivalentTo(self, other):
 		if not type(other) is DiscreteRange:
@@ -948,7 +1379,7 @@ class UniformDistribution(Distribution):
 				opts.append(value[opt])
 		if not opts:
 			raise RejectionException('uniform distribution over empty domain')
-		return random.choice(opts)
+		return value.rng.choice(opts)
 
 	def evaluateInner(self, context):
 		opts = tuple(valueInContext(opt, context) for opt in self.options)
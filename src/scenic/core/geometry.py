@@ -7,21 +7,22 @@ import warnings
 import numpy as np
 import shapely.geometry
 import shapely.ops
+import shapely.strtree
 
 from scenic.core.distributions import (needsSampling, distributionFunction,
                                        monotonicDistributionFunction)
 from scenic.core.lazy_eval import needsLazyEvaluation
 from scenic.core.utils import cached_property
 
-@distributionFunction
+@distributionFunction(vectorized=np.sin)
 def sin(x) -> float:
 	return math.sin(x)
 
-@distributionFunction
+@distributionFunction(vectorized=np.cos)
 def cos(x) -> float:
 	return math.cos(x)
 
-@monotonicDistributionFunction
+@monotonicDistributionFunction(vectorized=np.hypot)
 def hypot(x, y) -> float:
 	return math.hypot(x, y)
 
@@ -63,6 +64,15 @@ def rotateVector(vector, angle):
 	c, s = cos(angle), sin(angle)
 	return ((c * x) - (s * y), (s * x) + (c * y))
 
+def rotateVectorArray(vectors, angle):
+	"""Vectorized version of `rotateVector` for an array of shape (..., 2).
+
+	The angle may be a number or an array broadcastable against ``vectors[..., 0]``.
+	"""
+	x, y = vectors[..., 0], vectors[..., 1]
+	c, s = np.cos(angle), np.sin(angle)
+	return np.stack(np.broadcast_arrays((c * x) - (s * y), (s * x) + (c * y)), axis=-1)
+
 def findMinMax(iterable):
 	minv = float('inf')
 	maxv = float('-inf')
@@ -112,6 +122,27 @@ def pointIsInCone(point, base, heading, angle):
 	va = viewAngleToPoint(point, base, heading)
 	return (abs(va) <= angle / 2.0)
 
+def pointInSector(point, center, radius, heading, angle):
+	"""Whether a point lies in the sector of the disc with the given center and radius
+	spanning **angle** around **heading** (if **angle** is at least 2π, the whole disc).
+	"""
+	x, y = point
+	cx, cy = center
+	if math.hypot(x - cx, y - cy) > radius:
+		return False
+	return angle >= math.tau or pointIsInCone(point, center, heading, angle)
+
+def pointsInSector(points, center, radius, heading, angle):
+	"""Vectorized version of `pointInSector` for an array of points of shape (..., 2)."""
+	points = np.asarray(points, dtype=float)
+	dx, dy = points[..., 0] - center[0], points[..., 1] - center[1]
+	inside = np.hypot(dx, dy) <= radius
+	if angle < math.tau:
+		viewAngle = np.arctan2(dy, dx) - (heading + (math.pi / 2.0))
+		viewAngle = np.mod(viewAngle + math.pi, math.tau) - math.pi
+		inside &= np.abs(viewAngle) <= angle / 2.0
+	return inside
+
 def distanceToLine(point, a, b):
 	lx, ly = b[0] - a[0], b[1] - a[1]
 	norm = math.hypot(lx, ly)
@@ -390,15 +421,227 @@ def plotPolygon(polygon, plt, style='r-', **kwargs):
 		else:
 			raise RuntimeError(f'unknown kind of shapely geometry {polygon}')
 
+class BoundingBoxIndex:
+	"""Spatial index over a sequence of bounding boxes, for finding those near a point.
+
+	The index uses a Shapely STRtree, and so cannot be pickled; objects holding one
+	should rebuild it after unpickling.
+
+	Args:
+		boxes: sequence of bounding boxes (minx, miny, maxx, maxy), or :obj:`None` for
+		  items with unknown bounds, which are always considered candidates. Empty
+		  boxes (as returned by the ``bounds`` of empty Shapely geometries) are never
+		  candidates.
+	"""
+	def __init__(self, boxes):
+		geometries, self.positions, self.unbounded = [], {}, []
+		for position, box in enumerate(boxes):
+			if box is None:
+				self.unbounded.append(position)
+			elif box:
+				geometry = shapely.geometry.box(*box)
+				self.positions[id(geometry)] = position
+				geometries.append(geometry)
+		with warnings.catch_warnings():
+			# ignore warnings about the STRtree API changing in Shapely 2.0
+			warnings.simplefilter('ignore')
+			self.tree = shapely.strtree.STRtree(geometries)
+
+	def candidates(self, point, tolerance=0):
+		"""Positions of the boxes within **tolerance** of the point, in increasing order."""
+		x, y = point
+		if tolerance > 0:
+			return self.overlapping((x - tolerance, y - tolerance,
+			                         x + tolerance, y + tolerance))
+		return self._query(shapely.geometry.Point(x, y))
+
+	def overlapping(self, box):
+		"""Positions of the boxes overlapping the given box, in increasing order."""
+		return self._query(shapely.geometry.box(*box))
+
+	def _query(self, geometry):
+		positions = self.positions
+		found = [positions[id(box)] for box in self.tree.query(geometry)]
+		found.extend(self.unbounded)
+		found.sort()
+		return found
+
+	def __getstate__(self):
+		raise TypeError('BoundingBoxIndex cannot be pickled')
+
+# Relative tolerance for the analytic tests on rectangles
+_rectangleTolerance = 1e-9
+
+class CircleGrid:
+	"""Uniform grid of bounding circles, for broad-phase collision detection.
+
+	Each item inserted into the grid is stored in every cell overlapped by the bounding
+	box of its circle, so that finding the items whose circles overlap a given circle
+	only requires looking at a few cells rather than at all items. Circles covering
+	too many cells are stored in a separate list which is always searched.
+
+	Args:
+		cellSize (float): side length of the grid cells; by default, the diameter of
+		  the first circle inserted.
+	"""
+	maxCells = 16
+
+	def __init__(self, cellSize=None):
+		self.cellSize = cellSize
+		self.cells = {}
+		self.large = []
+		self.entries = []
+
+	def insert(self, item, x, y, radius):
+		"""Add an item with the given bounding circle to the grid."""
+		if self.cellSize is None:
+			self.cellSize = 2 * radius if radius > 0 else 1
+		entry = (item, x, y, radius)
+		self.entries.append(entry)
+		cells = self._cellsOf(x, y, radius)
+		if cells is None:
+			self.large.append(entry)
+			return
+		grid = self.cells
+		for cell in cells:
+			bucket = grid.get(cell)
+			if bucket is None:
+				grid[cell] = [entry]
+			else:
+				bucket.append(entry)
+
+	def overlapping(self, x, y, radius):
+		"""Find the items whose bounding circles overlap the given circle.
+
+		Circles which are tangent (up to floating-point error) count as overlapping,
+		so that any pair of shapes within the circles which may touch is found.
+		"""
+		if not self.entries:
+			return []
+		cells = self._cellsOf(x, y, radius)
+		if cells is None:
+			candidates = self.entries
+		else:
+			candidates = list(self.large)
+			grid = self.cells
+			for cell in cells:
+				bucket = grid.get(cell)
+				if bucket is not None:
+					candidates.extend(bucket)
+		items = []
+		seen = set()
+		for entry in candidates:
+			item, ex, ey, er = entry
+			if id(entry) in seen:
+				continue
+			seen.add(id(entry))
+			bound = (radius + er) * (1 + 1e-9) + 1e-12
+			if (ex - x) * (ex - x) + (ey - y) * (ey - y) <= bound * bound:
+				items.append(item)
+		return items
+
+	def _cellsOf(self, x, y, radius):
+		size = self.cellSize
+		x0, x1 = math.floor((x - radius) / size), math.floor((x + radius) / size)
+		y0, y1 = math.floor((y - radius) / size), math.floor((y + radius) / size)
+		if (x1 - x0 + 1) * (y1 - y0 + 1) > self.maxCells:
+			return None
+		return [(i, j) for i in range(x0, x1 + 1) for j in range(y0, y1 + 1)]
+
+def rectangleSeparation(first, second):
+	"""Separation between two oriented rectangles along their separating axes.
+
+	Each rectangle is given as a tuple (x, y, heading, hw, hl) of the coordinates of
+	its center, its heading, and its half-width and half-length. The result is
+	positive if and only if the rectangles are disjoint (in which case it is a lower
+	bound on the distance between them); it is zero if they touch.
+	"""
+	ax, ay, ah, ahw, ahl = first
+	bx, by, bh, bhw, bhl = second
+	sa, ca = math.sin(ah), math.cos(ah)
+	sb, cb = math.sin(bh), math.cos(bh)
+	dx, dy = bx - ax, by - ay
+	# cosines between the width axes of the rectangles and the length axes
+	# (the width axis of a rectangle is (c, s) and its length axis (-s, c))
+	ww, wl = abs(ca*cb + sa*sb), abs(sa*cb - ca*sb)
+	return max(
+		abs(ca*dx + sa*dy) - ahw - bhw*ww - bhl*wl,
+		abs(ca*dy - sa*dx) - ahl - bhw*wl - bhl*ww,
+		abs(cb*dx + sb*dy) - bhw - ahw*ww - ahl*wl,
+		abs(cb*dy - sb*dx) - bhl - ahw*wl - ahl*ww,
+	)
+
+def rectangleSeparations(first, second):
+	"""Vectorized version of `rectangleSeparation` for arrays of pairs of rectangles.
+
+	Args:
+		first: array with shape (..., 5) whose last axis gives the x and y coordinates
+		  of the center, heading, half-width, and half-length of each rectangle.
+		second: array of the same form as **first**, broadcastable against it.
+	"""
+	first, second = np.asarray(first, dtype=float), np.asarray(second, dtype=float)
+	ax, ay, ah, ahw, ahl = np.moveaxis(first, -1, 0)
+	bx, by, bh, bhw, bhl = np.moveaxis(second, -1, 0)
+	sa, ca = np.sin(ah), np.cos(ah)
+	sb, cb = np.sin(bh), np.cos(bh)
+	dx, dy = bx - ax, by - ay
+	ww, wl = np.abs(ca*cb + sa*sb), np.abs(sa*cb - ca*sb)
+	return np.maximum.reduce([
+		np.abs(ca*dx + sa*dy) - ahw - bhw*ww - bhl*wl,
+		np.abs(ca*dy - sa*dx) - ahl - bhw*wl - bhl*ww,
+		np.abs(cb*dx + sb*dy) - bhw - ahw*ww - ahl*wl,
+		np.abs(cb*dy - sb*dx) - bhl - ahw*wl - ahl*ww,
+	])
+
+def rectanglesIntersect(first, second):
+	"""Vectorized intersection test for arrays of pairs of oriented rectangles.
+
+	The arguments are as for `rectangleSeparations`. Returns a boolean array
+	indicating which pairs of rectangles intersect (including rectangles which only
+	touch, up to floating-point error).
+	"""
+	return rectangleSeparations(first, second) <= 0
+
 class _RotatedRectangle:
 	"""mixin providing collision detection for rectangular objects and regions"""
 	def containsPoint(self, point):
-		pt = shapely.geometry.Point(point)
-		return self.polygon.intersects(pt)
+		params = self._rectangleParameters
+		if params is None:
+			pt = shapely.geometry.Point(point)
+			return self.polygon.intersects(pt)
+		px, py, heading, hw, hl = params
+		x, y = point
+		s, c = math.sin(heading), math.cos(heading)
+		dx, dy = x - px, y - py
+		# points on the boundary count as contained, as for Shapely's intersects
+		tolerance = _rectangleTolerance * (1 + abs(px) + abs(py) + hw + hl)
+		return (abs(c*dx + s*dy) <= hw + tolerance
+		        and abs(c*dy - s*dx) <= hl + tolerance)
 
 	def intersects(self, rect):
+		params = self._rectangleParameters
+		otherParams = getattr(rect, '_rectangleParameters', None)
+		if params is not None and otherParams is not None:
+			# Use the separating axis test, falling back on Shapely only when the
+			# rectangles are close enough to touching for rounding error to matter
+			separation = rectangleSeparation(params, otherParams)
+			tolerance = _rectangleTolerance * sum(abs(x) for x in params + otherParams)
+			if separation > tolerance:
+				return False
+			if separation < -tolerance:
+				return True
 		return self.polygon.intersects(rect.polygon)
 
+	@property
+	def _rectangleParameters(self):
+		# (x, y, heading, hw, hl), or None if not all of these are known numbers
+		position = self.position
+		params = (position.x, position.y, self.heading, self.hw, self.hl)
+		for param in params:
+			if not isinstance(param, (int, float)):
+				return None
+		return params
+
 	@cached_property
 	def polygon(self):
 		position, heading, hw, hl = self.position, self.heading, self.hw, self.hl
@@ -410,7 +653,7 @@ class _RotatedRectangle:
 
 	@staticmethod
 	def makeCorners(px, py, heading, hw, hl):
-		s, c = sin(heading), cos(heading)
+		s, c = math.sin(heading), math.cos(heading)
 		s_hw, c_hw = s*hw, c*hw
 		s_hl, c_hl = s*hl, c*hl
 		corners = (
@@ -1,14 +1,17 @@
 """Implementations of the built-in Scenic classes."""
 
 import collections
+import inspect
 import math
 import random
 
+import numpy
+
 from scenic.core.distributions import Samplable, needsSampling
 from scenic.core.specifiers import Specifier, PropertyDefault
 from scenic.core.vectors import Vector
 from scenic.core.geometry import (_RotatedRectangle, averageVectors, hypot, min,
-                                  pointIsInCone)
+                                  pointIsInCone, pointInSector, pointsInSector)
 from scenic.core.regions import CircularRegion, SectorRegion
 from scenic.core.type_support import toVector, toHeading, toType
 from scenic.core.lazy_eval import needsLazyEvaluation
@@ -201,10 +204,33 @@ class Mutator:
 	is called to compute a mutated version.
 	"""
 
-	def appliedTo(self, obj):
-		"""Return a mutated copy of the object. Implemented by subclasses."""
+	def appliedTo(self, obj, rng=random):
+		"""Return a mutated copy of the object. Implemented by subclasses.
+
+		Any random choices should be made using **rng**, which has the same interface
+		as :obj:`random.Random` (by default, Python's global generator is used).
+		Subclasses written for older versions of Scenic, whose `appliedTo` method
+		does not take **rng**, are still supported, but their random choices cannot
+		be controlled by the generator passed to `Scenario.generate`.
+		"""
 		raise NotImplementedError
 
+	@staticmethod
+	def _apply(mutator, obj, rng):
+		# Call appliedTo, omitting the generator for mutators with the old signature
+		cls = type(mutator)
+		takesRNG = _mutatorTakesRNG.get(cls)
+		if takesRNG is None:
+			params = inspect.signature(mutator.appliedTo).parameters.values()
+			takesRNG = (len(params) >= 2
+			            or any(param.kind is param.VAR_POSITIONAL for param in params))
+			_mutatorTakesRNG[cls] = takesRNG
+		if takesRNG:
+			return mutator.appliedTo(obj, rng)
+		return mutator.appliedTo(obj)
+
+_mutatorTakesRNG = {}	# whether the appliedTo method of each mutator class takes an RNG
+
 class PositionMutator(Mutator):
 	"""Mutator adding Gaussian noise to ``position``. Used by `Point`.
 
@@ -214,8 +240,8 @@ class PositionMutator(Mutator):
 	def __init__(self, stddev):
 		self.stddev = stddev
 
-	def appliedTo(self, obj):
-		noise = Vector(random.gauss(0, self.stddev), random.gauss(0, self.stddev))
+	def appliedTo(self, obj, rng=random):
+		noise = Vector(rng.gauss(0, self.stddev), rng.gauss(0, self.stddev))
 		pos = obj.position + noise
 		return (obj.copyWith(position=pos), True)		# allow further mutation
 
@@ -236,8 +262,8 @@ class HeadingMutator(Mutator):
 	def __init__(self, stddev):
 		self.stddev = stddev
 
-	def appliedTo(self, obj):
-		noise = random.gauss(0, self.stddev)
+	def appliedTo(self, obj, rng=random):
+		noise = rng.gauss(0, self.stddev)
 		h = obj.heading + noise
 		return (obj.copyWith(heading=h), True)		# allow further mutation
 
@@ -291,18 +317,45 @@ class Point(_Constructible):
 		return self.position
 
 	def canSee(self, other) -> bool:	# TODO improve approximation?
+		sector = self._visibleSector()
+		if sector is None:
+			visibleRegion = self.visibleRegion
+			return any(visibleRegion.containsPoint(corner) for corner in other.corners)
 		for corner in other.corners:
-			if self.visibleRegion.containsPoint(corner):
+			if pointInSector(corner, *sector):
 				return True
 		return False
 
+	def canSeeAll(self, objects):
+		"""Check which of several objects this one can see, in a single vectorized call.
+
+		Returns:
+			A boolean NumPy array whose entries give `canSee` for each object.
+		"""
+		objects = tuple(objects)
+		sector = self._visibleSector()
+		if sector is None or not objects:
+			return numpy.array([self.canSee(other) for other in objects], dtype=bool)
+		cornerLists = [other.corners for other in objects]
+		corners = numpy.array([tuple(corner) for corners in cornerLists for corner in corners],
+		                      dtype=float)
+		starts = numpy.cumsum([0] + [len(corners) for corners in cornerLists[:-1]])
+		return numpy.logical_or.reduceat(pointsInSector(corners, *sector), starts)
+
+	def _visibleSector(self):
+		# The visible region as a tuple (center, radius, heading, angle) for
+		# pointInSector, or None if visibleRegion has been overridden
+		if type(self).visibleRegion is not Point.visibleRegion:
+			return None
+		return (self.position, self.visibleDistance, 0, math.tau)
+
 	def sampleGiven(self, value):
 		sample = super().sampleGiven(value)
 		if self.mutationEnabled:
 			for mutator in self.mutator:
 				if mutator is None:
 					continue
-				sample, proceed = mutator.appliedTo(sample)
+				sample, proceed = Mutator._apply(mutator, sample, value.rng)
 				if not proceed:
 					break
 		return sample
@@ -341,6 +394,11 @@ class OrientedPoint(Point):
 		return SectorRegion(self.position, self.visibleDistance,
 		                    self.heading, self.viewAngle)
 
+	def _visibleSector(self):
+		if type(self).visibleRegion is not OrientedPoint.visibleRegion:
+			return None
+		return (self.position, self.visibleDistance, self.heading, self.viewAngle)
+
 	def relativize(self, vec):
 		pos = self.relativePosition(vec)
 		return OrientedPoint(position=pos, heading=self.heading)
@@ -398,6 +456,24 @@ class Object(OrientedPoint, _RotatedRectangle):
 	behavior: None
 	lastActions: None
 
+	# Properties which the cached geometric values computed by this class (corners,
+	# visibleRegion, etc.) depend on; other cached values are assumed to depend on
+	# every property (see _updateProperties)
+	_geometricProperties = frozenset(('position', 'heading', 'width', 'length',
+	                                  'cameraOffset', 'visibleDistance', 'viewAngle'))
+	_geometricCacheNames = ('left', 'right', 'front', 'back', 'frontLeft', 'frontRight',
+	                        'backLeft', 'backRight', 'visibleRegion', 'corners', 'polygon')
+
+	# Set of properties assigned to since the last update, for dynamic proxies only
+	_assignedProperties = None
+
+	def __init_subclass__(cls):
+		super().__init_subclass__()
+		# cached values of properties overridden by subclasses may depend on anything
+		cls._geometricCaches = frozenset(f'_cached_{name}'
+		                                 for name in cls._geometricCacheNames
+		                                 if getattr(cls, name) is getattr(Object, name))
+
 	def __new__(cls, *args, **kwargs):
 		obj = super().__new__(cls)
 		# The _dynamicProxy attribute stores a mutable copy of the object used during
@@ -408,13 +484,15 @@ class Object(OrientedPoint, _RotatedRectangle):
 
 	def __init__(self, *args, **kwargs):
 		super().__init__(*args, **kwargs)
+		self._computeExtents()
+		self._relations = []
+
+	def _computeExtents(self):
 		self.hw = hw = self.width / 2
 		self.hl = hl = self.length / 2
 		self.radius = hypot(hw, hl)	# circumcircle; for collision detection
 		self.inradius = min(hw, hl)	# incircle; for collision detection
 
-		self._relations = []
-
 	def _specify(self, prop, value):
 		# Normalize types of some built-in properties
 		if prop == 'behavior':
@@ -434,11 +512,38 @@ class Object(OrientedPoint, _RotatedRectangle):
 	def __setattr__(self, name, value):
 		proxy = object.__getattribute__(self, '_dynamicProxy')
 		object.__setattr__(proxy, name, value)
+		assigned = object.__getattribute__(proxy, '_assignedProperties')
+		if assigned is not None:
+			assigned.add(name)
 
 	def __delattr__(self, name):
 		proxy = object.__getattribute__(self, '_dynamicProxy')
 		object.__delattr__(proxy, name)
 
+	def _updateProperties(self, values):
+		# Update properties of a dynamic proxy in place, discarding cached values
+		# which may depend on properties that have changed or been assigned to
+		# since the last update
+		assigned = self._assignedProperties
+		changed = assigned & self.properties
+		assigned.clear()
+		for prop, value in values.items():
+			if prop in changed or not _sameValue(getattr(self, prop), value):
+				object.__setattr__(self, prop, value)
+				changed.add(prop)
+		if not changed:
+			return
+		if 'width' in changed or 'length' in changed:
+			self._computeExtents()
+		if changed.isdisjoint(self._geometricProperties):
+			keep = self._geometricCaches
+		else:
+			keep = ()
+		attrs = self.__dict__
+		stale = [name for name in attrs if name.startswith('_cached_') and name not in keep]
+		for name in stale:
+			del attrs[name]
+
 	def startDynamicSimulation(self):
 		"""Hook called at the beginning of each dynamic simulation.
 
@@ -484,6 +589,12 @@ class Object(OrientedPoint, _RotatedRectangle):
 		camera = self.position.offsetRotated(self.heading, self.cameraOffset)
 		return SectorRegion(camera, self.visibleDistance, self.heading, self.viewAngle)
 
+	def _visibleSector(self):
+		if type(self).visibleRegion is not Object.visibleRegion:
+			return None
+		camera = self.position.offsetRotated(self.heading, self.cameraOffset)
+		return (camera, self.visibleDistance, self.heading, self.viewAngle)
+
 	@cached_property
 	def corners(self):
 		hw, hl = self.hw, self.hl
@@ -527,11 +638,36 @@ class Object(OrientedPoint, _RotatedRectangle):
 		plt.fill(x, y, "w")
 		plt.plot(x + (x[0],), y + (y[0],), color="k", linewidth=1)
 
+Object._geometricCaches = frozenset(f'_cached_{name}'
+                                    for name in Object._geometricCacheNames)
+
+def _sameValue(old, new):
+	if old is new:
+		return True
+	# only compare values of simple types, whose equality tests are cheap and exact
+	ty = type(old)
+	return ty is type(new) and ty in (int, float, bool, Vector) and old == new
+
 def enableDynamicProxyFor(obj):
 	object.__setattr__(obj, '_dynamicProxy', obj.copyWith())
 
 def setDynamicProxyFor(obj, proxy):
 	object.__setattr__(obj, '_dynamicProxy', proxy)
 
+def updateDynamicProxyFor(obj, values):
+	"""Update the dynamic proxy for an object with new values of some properties.
+
+	The first update makes a copy of the object to serve as its proxy; later updates
+	modify this copy in place, discarding only those cached values (``corners``,
+	``visibleRegion``, etc.) which may depend on properties that have changed.
+	"""
+	proxy = object.__getattribute__(obj, '_dynamicProxy')
+	if proxy is obj:
+		proxy = obj.copyWith(**values)
+		object.__setattr__(proxy, '_assignedProperties', set())
+		setDynamicProxyFor(obj, proxy)
+	else:
+		proxy._updateProperties(values)
+
 def disableDynamicProxyFor(obj):
 	object.__setattr__(obj, '_dynamicProxy', obj)
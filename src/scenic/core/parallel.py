@@ -0,0 +1,113 @@
+"""Support for running Scenic in several worker processes.
+
+Compiled scenarios generally cannot be pickled (they refer to classes, functions,
+and closures defined in Scenic modules), so workers are created by forking a process
+which already holds the scenario. Results sent back from the workers are pickled
+relative to a `SharedObjects` table, so that objects which existed before the fork
+are transmitted by reference rather than copied.
+"""
+
+import io
+import multiprocessing
+import pickle
+import sys
+import types
+
+import numpy
+
+def deriveSeed(seed, index):
+	"""Seed for the task with the given index in a batch started from **seed**.
+
+	The random streams seeded by the results for different indices are statistically
+	independent, and the seed for any index can be computed directly without
+	computing those for earlier indices.
+	"""
+	sequence = numpy.random.SeedSequence(seed, spawn_key=(index,))
+	return int(sequence.generate_state(1, numpy.uint64)[0])
+
+def forkContext():
+	"""Multiprocessing context using the 'fork' start method, if it is available.
+
+	Returns None on platforms which do not support forking (e.g. Windows).
+	"""
+	if 'fork' not in multiprocessing.get_all_start_methods():
+		return None
+	return multiprocessing.get_context('fork')
+
+_atomicTypes = (type(None), bool, int, float, complex, str, bytes)
+# objects whose contents are not part of a scenario: we share them, but do not look
+# inside them (in particular, we do not follow functions to their global namespaces)
+_opaqueTypes = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+                types.MethodType, types.CodeType, types.FrameType, types.GeneratorType)
+_missing = object()
+
+def _contents(obj):
+	"""Values stored in an object: its items if it is a container, and its attributes."""
+	if isinstance(obj, _opaqueTypes):
+		return []
+	contents = []
+	if isinstance(obj, dict):
+		contents.extend(obj.keys())
+		contents.extend(obj.values())
+	elif isinstance(obj, (tuple, list, set, frozenset)):
+		contents.extend(obj)
+	# access attributes directly to avoid triggering any __getattr__ hooks
+	try:
+		contents.append(object.__getattribute__(obj, '__dict__'))
+	except AttributeError:
+		pass
+	for cls in type(obj).__mro__:
+		slots = cls.__dict__.get('__slots__', ())
+		for slot in ((slots,) if isinstance(slots, str) else slots):
+			try:
+				contents.append(object.__getattribute__(obj, slot))
+			except AttributeError:
+				pass
+	return contents
+
+class SharedObjects:
+	"""Table of objects shared between a process and the workers it forks.
+
+	A forked worker starts as a copy of its parent, so every object which existed
+	before the fork has the same `id` in both processes (the table keeps such objects
+	alive, so their ids cannot be reused). Values pickled with `dumps` in a worker
+	replace references to objects in the table by their ids, which `loads` in the
+	parent maps back to the original objects.
+
+	Args:
+		roots: objects from which to gather the table. We include the roots and the
+		  values stored in them (as container items or attributes), recursively; we do
+		  not look inside classes, functions, modules, or the global namespaces of
+		  modules, so the table holds only the data the roots depend on rather than
+		  everything reachable from them.
+	"""
+	def __init__(self, *roots):
+		moduleDicts = set(id(module.__dict__) for module in list(sys.modules.values())
+		                  if isinstance(module, types.ModuleType))
+		objects = {}
+		stack = list(roots)
+		while stack:
+			obj = stack.pop()
+			if isinstance(obj, _atomicTypes) or id(obj) in objects:
+				continue
+			objects[id(obj)] = obj
+			if id(obj) not in moduleDicts:
+				stack.extend(_contents(obj))
+		self.objects = objects
+
+	def dumps(self, value):
+		"""Pickle a value, referring to shared objects by id."""
+		objects = self.objects
+		def persistentID(obj):
+			return id(obj) if objects.get(id(obj), _missing) is obj else None
+		stream = io.BytesIO()
+		pickler = pickle.Pickler(stream, protocol=pickle.HIGHEST_PROTOCOL)
+		pickler.persistent_id = persistentID
+		pickler.dump(value)
+		return stream.getvalue()
+
+	def loads(self, data):
+		"""Unpickle a value produced by `dumps` in this process or a forked worker."""
+		unpickler = pickle.Unpickler(io.BytesIO(data))
+		unpickler.persistent_load = self.objects.__getitem__
+		return unpickler.load()
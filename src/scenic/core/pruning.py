@@ -9,7 +9,7 @@ import shapely.geos
 from scenic.core.distributions import (Samplable, MethodDistribution, OperatorDistribution,
                                        needsSampling, supportInterval, underlyingFunction)
 from scenic.core.object_types import Point, Object
-from scenic.core.geometry import normalizeAngle, polygonUnion, plotPolygon
+from scenic.core.geometry import normalizeAngle, polygonUnion, plotPolygon, BoundingBoxIndex
 from scenic.core.vectors import VectorField, PolygonalVectorField, VectorMethodDistribution
 from scenic.core.workspaces import Workspace
 from scenic.syntax.relations import RelativeHeadingRelation, DistanceRelation
@@ -164,9 +164,12 @@ def pruneRelativeHeading(scenario, verbosity):
                 maxDist = maxDistanceBetween(scenario, obj, rel.target)
                 if maxDist == float('inf'):     # the distance between the objects must be bounded
                     continue
+                targetBase = matchInRegion(currentPropValue(rel.target, 'position'))
+                targetBasePoly = None if targetBase is None else regions.toPolygon(targetBase)
                 feasible = feasibleRHPolygon(field, offsetL, offsetR,
                                              tField, tOffsetL, tOffsetR,
-                                             rel.lower, rel.upper, maxDist)
+                                             rel.lower, rel.upper, maxDist,
+                                             base=newBasePoly, targetBase=targetBasePoly)
                 if feasible is None:    # the RH bounds may be too weak to restrict the space
                     continue
                 try:
@@ -225,25 +228,81 @@ def visibilityBound(obj, target):
 
 def feasibleRHPolygon(field, offsetL, offsetR,
                       tField, tOffsetL, tOffsetR,
-                      lowerBound, upperBound, maxDist):
-    """Find where objects aligned to the given fields can satisfy the given RH bounds."""
+                      lowerBound, upperBound, maxDist, base=None, targetBase=None):
+    """Find where objects aligned to the given fields can satisfy the given RH bounds.
+
+    If a polygon **base** is given, only the part of the result intersecting it is
+    guaranteed to be correct (so cells of **field** disjoint from it can be skipped).
+    Likewise, if a polygon **targetBase** containing the target object is given, cells
+    of **tField** disjoint from it may be ignored.
+
+    Fields with a default heading assign it to points outside their cells, so such
+    points are treated as forming an additional cell. This requires **base** to be
+    given for **field** (otherwise we return None); for **tField**, if **targetBase**
+    is not given, the target may be anywhere outside the cells, so we conservatively
+    keep every cell of **field** whose heading is compatible with the default heading.
+    """
     if (offsetR - offsetL >= math.tau
         or tOffsetR - tOffsetL >= math.tau
         or upperBound - lowerBound >= math.tau):
         return None
+    if base is None and field.defaultHeading is not None:
+        return None
+    baseCells = cellsWithin(field, base)
+    targetCells = cellsWithin(tField, targetBase)
+    def compatible(baseHeading, targetHeading):
+        lower, upper = relativeHeadingRange(baseHeading, offsetL, offsetR,
+                                            targetHeading, tOffsetL, tOffsetR)
+        return upper >= lowerBound and lower <= upperBound
+    unboundedTarget = (targetBase is None and tField.defaultHeading is not None)
+    # Only expand target cells near some base cell, finding them with a spatial index
+    targetBoxes = []
+    for cell, heading in targetCells:
+        minx, miny, maxx, maxy = cell.bounds
+        targetBoxes.append((minx - maxDist, miny - maxDist, maxx + maxDist, maxy + maxDist))
+    index = BoundingBoxIndex(targetBoxes)
+    expanded = {}
     polygons = []
-    expanded = [(poly.buffer(maxDist), heading) for poly, heading in tField.cells]
-    for baseCell, baseHeading in field.cells:   # TODO skip cells not contained in base region?
-        for expandedTargetCell, targetHeading in expanded:
-            lower, upper = relativeHeadingRange(baseHeading, offsetL, offsetR,
-                                                targetHeading, tOffsetL, tOffsetR)
-            if (upper >= lowerBound and lower <= upperBound):   # RH intervals overlap
-                intersection = baseCell & expandedTargetCell
-                if not intersection.is_empty:
-                    assert isinstance(intersection, shapely.geometry.Polygon), intersection
-                    polygons.append(intersection)
+    for baseCell, baseHeading in baseCells:
+        if unboundedTarget and compatible(baseHeading, tField.defaultHeading):
+            polygons.extend(polygonalParts(baseCell))
+            continue
+        for i in index.overlapping(baseCell.bounds):
+            if not compatible(baseHeading, targetCells[i][1]):   # RH intervals disjoint
+                continue
+            expandedTargetCell = expanded.get(i)
+            if expandedTargetCell is None:
+                expandedTargetCell = targetCells[i][0].buffer(maxDist)
+                expanded[i] = expandedTargetCell
+            intersection = baseCell & expandedTargetCell
+            polygons.extend(polygonalParts(intersection))
     return polygonUnion(polygons)
 
+def cellsWithin(field, base=None):
+    """Get the cells of a PolygonalVectorField which may intersect a polygon.
+
+    If the field has a default heading, the parts of **base** outside all cells are
+    included as additional cells with that heading (**base** must then be given).
+    """
+    cells = field.cells
+    if base is None:
+        return cells
+    baseBox = shapely.geometry.box(*base.bounds) if not base.is_empty else base
+    cells = [cell for cell in cells if cell[0].intersects(baseBox)]
+    if field.defaultHeading is not None:
+        outside = base.difference(polygonUnion([cell for cell, heading in cells]))
+        cells.extend((part, field.defaultHeading) for part in polygonalParts(outside))
+    return cells
+
+def polygonalParts(geometry):
+    """Get the nondegenerate polygons making up a Shapely geometry."""
+    if isinstance(geometry, shapely.geometry.Polygon):
+        return [geometry] if not geometry.is_empty and geometry.area > 0 else []
+    elif hasattr(geometry, 'geoms'):     # MultiPolygon or GeometryCollection
+        return [part for geom in geometry.geoms for part in polygonalParts(geom)]
+    else:
+        return []
+
 def relativeHeadingRange(baseHeading, offsetL, offsetR,
                          targetHeading, tOffsetL, tOffsetR):
     """Lower/upper bound the possible RH between two headings with bounded disturbances."""
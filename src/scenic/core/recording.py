@@ -0,0 +1,216 @@
+"""Recording simulations to disk as they run.
+
+A `SimulationRecorder` passed to `Simulator.simulate` is notified of the state of
+the simulation at every time step and of the values of all recorded expressions.
+The `StreamingRecorder` writes this information to a file incrementally, so that
+long simulations need not keep it all in memory and a crashed or killed run still
+leaves a usable recording behind. Recordings can be read back lazily using
+`SimulationRecording`.
+"""
+
+import collections
+import pickle
+import struct
+import warnings
+
+from scenic.core.requirements import RequirementType
+
+class SimulationRecorder:
+    """Base class for objects recording the progress of simulations.
+
+    All methods do nothing by default; subclasses override those they need.
+
+    Attributes:
+        keepTrajectory (bool): Whether the simulation should keep its entire
+            trajectory in memory. If false, only the latest state is kept, so that
+            ``SimulationResult.trajectory`` contains only the final state, and
+            ``SimulationResult.actions`` is empty.
+    """
+    keepTrajectory = True
+
+    def beginSimulation(self, simulation):
+        """Called at the start of each simulation (including ones later rejected)."""
+        pass
+
+    def recordState(self, time, state):
+        """Called with the state of the simulation after each time step.
+
+        The initial state is recorded at time 0.
+        """
+        pass
+
+    def recordValues(self, time, values, recordType):
+        """Called with the values of recorded expressions.
+
+        Args:
+            time (int): Current time step.
+            values (dict): Values of the recorded expressions, indexed by name.
+            recordType (RequirementType): Which kind of ``record`` statement the
+                expressions come from.
+        """
+        pass
+
+    def endSimulation(self, result):
+        """Called when a simulation ends.
+
+        Args:
+            result (SimulationResult): The result of the simulation, or ``None`` if
+                the simulation was rejected or failed.
+        """
+        pass
+
+class StreamingRecorder(SimulationRecorder):
+    """Recorder streaming states and recorded values to an append-only file.
+
+    The file consists of a header followed by a sequence of chunks, each holding
+    the events of several time steps. Chunks are flushed to disk as soon as they
+    are complete, so if the simulation is interrupted, all but the last few time
+    steps can still be read with `SimulationRecording`. A new simulation (for
+    example a retry after a rejected simulation) overwrites the file.
+
+    Args:
+        path: Path of the file to write.
+        decimation (int): Only record states and per-step values every this many
+            time steps. The initial and final states are always recorded.
+        keepTrajectory (bool): Whether the simulation should also keep its whole
+            trajectory in memory (see `SimulationRecorder`).
+        chunkSize (int): Number of recorded time steps per chunk.
+    """
+    def __init__(self, path, decimation=1, keepTrajectory=True, chunkSize=100):
+        if decimation < 1:
+            raise ValueError('decimation must be a positive integer')
+        self.path = path
+        self.decimation = decimation
+        self.keepTrajectory = keepTrajectory
+        self.chunkSize = chunkSize
+        self._file = None
+        self._events = []
+        self._steps = 0
+        self._lastState = None
+
+    def beginSimulation(self, simulation):
+        self.close()
+        self._file = open(self.path, 'wb')
+        self._file.write(_header)
+        self._file.flush()
+        self._events = []
+        self._steps = 0
+        self._lastState = None
+
+    def recordState(self, time, state):
+        if time % self.decimation == 0:
+            self._events.append(RecordingEvent('state', time, state))
+            self._lastState = None
+            self._steps += 1
+            if self._steps >= self.chunkSize:
+                self._flush()
+        else:
+            self._lastState = (time, state)
+
+    def recordValues(self, time, values, recordType):
+        if not values:
+            return
+        if recordType is RequirementType.record and time % self.decimation != 0:
+            return
+        self._events.append(RecordingEvent(recordType.name, time, dict(values)))
+
+    def endSimulation(self, result):
+        if self._file is None:
+            return
+        if self._lastState is not None:    # make sure the final state is included
+            self._events.append(RecordingEvent('state', *self._lastState))
+        if result is not None:
+            info = (result.terminationType, result.terminationReason)
+            self._events.append(RecordingEvent('end', None, info))
+        self.close()
+
+    def _flush(self):
+        if self._events:
+            chunk = pickle.dumps(self._events, protocol=pickle.HIGHEST_PROTOCOL)
+            self._file.write(struct.pack('<Q', len(chunk)))
+            self._file.write(chunk)
+            self._file.flush()
+            self._events = []
+        self._steps = 0
+
+    def close(self):
+        """Write any buffered events and close the file."""
+        if self._file is not None:
+            self._flush()
+            self._file.close()
+            self._file = None
+
+_header = b'SCENICRECORDING\x01'
+
+RecordingEvent = collections.namedtuple('RecordingEvent', ('kind', 'time', 'data'))
+RecordingEvent.__doc__ = """An event in a simulation recording.
+
+The **kind** is ``'state'`` for states of the simulation, the name of a
+`RequirementType` for values of recorded expressions (in which case **data** is a
+dict mapping names to values), or ``'end'`` for the end of a completed simulation
+(in which case **data** is a pair giving the termination type and reason).
+"""
+
+class SimulationRecording:
+    """A simulation recording written by `StreamingRecorder`.
+
+    The file is read lazily, one chunk at a time, whenever the recording is
+    iterated over. Recordings of interrupted simulations can be read up to the
+    last complete chunk.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(_header)) != _header:
+                raise ValueError(f'{path} is not a Scenic simulation recording')
+
+    def __iter__(self):
+        """Iterate over all `RecordingEvent` objects in the recording."""
+        with open(self.path, 'rb') as f:
+            f.seek(len(_header))
+            while True:
+                prefix = f.read(8)
+                if not prefix:
+                    return
+                size = struct.unpack('<Q', prefix)[0] if len(prefix) == 8 else None
+                chunk = f.read(size) if size is not None else b''
+                if size is None or len(chunk) < size:
+                    warnings.warn(f'simulation recording {self.path} is truncated')
+                    return
+                yield from pickle.loads(chunk)
+
+    def states(self):
+        """Iterate over the recorded states, as pairs (time, state)."""
+        for event in self:
+            if event.kind == 'state':
+                yield event.time, event.data
+
+    def values(self, name):
+        """Iterate over the recorded values of the given ``record`` statement.
+
+        Yields pairs (time, value), including for ``record initial`` and
+        ``record final`` statements.
+        """
+        for event in self:
+            if event.kind != 'state' and event.kind != 'end' and name in event.data:
+                yield event.time, event.data[name]
+
+    @property
+    def records(self):
+        """Recorded values in the format of ``SimulationResult.records``."""
+        records = collections.defaultdict(list)
+        for event in self:
+            if event.kind == RequirementType.record.name:
+                for name, value in event.data.items():
+                    records[name].append((event.time, value))
+            elif event.kind != 'state' and event.kind != 'end':
+                records.update(event.data)
+        return dict(records)
+
+    @property
+    def termination(self):
+        """Pair (termination type, reason) for a completed simulation, else ``None``."""
+        for event in self:
+            if event.kind == 'end':
+                return event.data
+        return None
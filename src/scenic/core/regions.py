@@ -1,13 +1,15 @@
 """Objects representing regions in space."""
 
+import inspect
 import math
 import random
-import itertools
+import zlib
 
 import numpy
 import shapely.geometry
 import shapely.ops
 import shapely.prepared
+import shapely.vectorized
 
 from scenic.core.distributions import (Samplable, RejectionException, needsSampling,
                                        distributionMethod)
@@ -42,6 +44,40 @@ def regionFromShapelyObject(obj, orientation=None):
 	else:
 		raise RuntimeError(f'unhandled type of Shapely geometry: {obj}')
 
+def geometryFingerprint(geometry):
+	"""Cheap fingerprint of the content of a Shapely geometry, for hashing.
+
+	This is much faster than serializing the geometry to WKT, which matters for the
+	very large polygons of road networks.
+	"""
+	wkb = geometry.wkb
+	return (len(wkb), geometry.bounds, zlib.crc32(wkb))
+
+def _takesRNG(function, numArgs):
+	"""Whether a callback takes a random generator after **numArgs** other arguments.
+
+	Region samplers and `Region.uniformPointInner` methods written for older versions
+	of Scenic do not take a generator (as for `Mutator.appliedTo`).
+	"""
+	key = (type(function), getattr(function, '__code__', None))
+	takesRNG = _callbacksTakingRNG.get(key)
+	if takesRNG is None:
+		params = inspect.signature(function).parameters.values()
+		takesRNG = (len(params) > numArgs
+		            or any(param.kind is param.VAR_POSITIONAL for param in params))
+		if key[1] is not None:		# only cache results for ordinary functions
+			_callbacksTakingRNG[key] = takesRNG
+	return takesRNG
+
+_callbacksTakingRNG = {}
+
+def _callSampler(sampler, region, rng):
+	# Call the sampler of an IntersectionRegion or DifferenceRegion, omitting the
+	# generator for samplers with the old signature
+	if _takesRNG(sampler, 1):
+		return sampler(region, rng)
+	return sampler(region)
+
 class PointInRegionDistribution(VectorDistribution):
 	"""Uniform distribution over points in a Region"""
 	def __init__(self, region):
@@ -49,7 +85,14 @@ class PointInRegionDistribution(VectorDistribution):
 		self.region = region
 
 	def sampleGiven(self, value):
-		return value[self.region].uniformPointInner()
+		return value[self.region]._uniformPointWithRNG(value.rng)
+
+	def batchSampleGiven(self, values):
+		region = self.region
+		if (isinstance(region, PolygonalRegion) and region.orientation is None
+		    and not needsSampling(region)):
+			return region.uniformPoints(values.n, values.rng)
+		return super().batchSampleGiven(values)
 
 	@property
 	def heading(self):
@@ -108,22 +151,54 @@ class Region(Samplable):
 		"""Get a uniform `Distribution` over points in a `Region`."""
 		return PointInRegionDistribution(region)
 
-	def uniformPoint(self):
+	def uniformPoint(self, rng=random):
 		"""Sample a uniformly-random point in this `Region`.
 
 		Can only be called on fixed Regions with no random parameters.
+
+		Args:
+			rng: random number generator to use, with the same interface as
+			  :obj:`random.Random` (default is Python's global generator).
 		"""
 		assert not needsSampling(self)
-		return self.uniformPointInner()
+		return self._uniformPointWithRNG(rng)
+
+	def uniformPointInner(self, rng=random):
+		"""Do the actual random sampling, using the given generator.
 
-	def uniformPointInner(self):
-		"""Do the actual random sampling. Implemented by subclasses."""
+		Implemented by subclasses. Subclasses written for older versions of Scenic,
+		whose `uniformPointInner` method does not take **rng**, are still supported,
+		but their random choices cannot be controlled by the generator passed to
+		`Scenario.generate`.
+		"""
 		raise NotImplementedError
 
+	def _uniformPointWithRNG(self, rng):
+		# Call uniformPointInner, omitting the generator for subclasses with the old
+		# signature
+		if _takesRNG(self.uniformPointInner, 0):
+			return self.uniformPointInner(rng)
+		return self.uniformPointInner()
+
 	def containsPoint(self, point):
 		"""Check if the `Region` contains a point. Implemented by subclasses."""
 		raise NotImplementedError
 
+	def containsPoints(self, points):
+		"""Check which of an array of points the `Region` contains.
+
+		Args:
+			points: NumPy array of shape (..., 2) giving the coordinates of the points.
+
+		Returns:
+			A boolean array of shape (...). The default implementation calls
+			`containsPoint` on each point; subclasses may override it to give a
+			vectorized implementation.
+		"""
+		points = numpy.asarray(points, dtype=float)
+		result = [self.containsPoint(Vector(x, y)) for x, y in points.reshape(-1, 2).tolist()]
+		return numpy.array(result, dtype=bool).reshape(points.shape[:-1])
+
 	def containsObject(self, obj):
 		"""Check if the `Region` contains an :obj:`~scenic.core.object_types.Object`.
 
@@ -150,6 +225,12 @@ class Region(Samplable):
 		"""Axis-aligned bounding box for this `Region`. Implemented by some subclasses."""
 		raise NotImplementedError
 
+	def _boundingBox(self):
+		# Bounding box (minx, miny, maxx, maxy) for spatial indices, or None if it is
+		# not known. Unlike the bounds of `polygons`, this does not force regions which
+		# are computed or loaded lazily to be computed.
+		return None
+
 	def orient(self, vec):
 		"""Orient the given vector along the region's orientation, if any."""
 		if self.orientation is None:
@@ -177,6 +258,9 @@ class AllRegion(Region):
 	def containsPoint(self, point):
 		return True
 
+	def containsPoints(self, points):
+		return numpy.ones(numpy.shape(points)[:-1], dtype=bool)
+
 	def containsObject(self, obj):
 		return True
 
@@ -197,12 +281,15 @@ class EmptyRegion(Region):
 	def union(self, other, triedReversed=False):
 		return other
 
-	def uniformPointInner(self):
+	def uniformPointInner(self, rng=random):
 		raise RejectionException(f'sampling empty Region')
 
 	def containsPoint(self, point):
 		return False
 
+	def containsPoints(self, points):
+		return numpy.zeros(numpy.shape(points)[:-1], dtype=bool)
+
 	def containsObject(self, obj):
 		return False
 
@@ -252,10 +339,10 @@ class CircularRegion(Region):
 	def distanceTo(self, point):
 		return max(0, point.distanceTo(self.center) - self.radius)
 
-	def uniformPointInner(self):
+	def uniformPointInner(self, rng=random):
 		x, y = self.center
-		r = random.triangular(0, self.radius, self.radius)
-		t = random.uniform(-math.pi, math.pi)
+		r = rng.triangular(0, self.radius, self.radius)
+		t = rng.uniform(-math.pi, math.pi)
 		pt = Vector(x + (r * cos(t)), y + (r * sin(t)))
 		return self.orient(pt)
 
@@ -321,12 +408,12 @@ class SectorRegion(Region):
 			return False
 		return point.distanceTo(self.center) <= self.radius
 
-	def uniformPointInner(self):
+	def uniformPointInner(self, rng=random):
 		x, y = self.center
 		heading, angle, maxDist = self.heading, self.angle, self.radius
-		r = random.triangular(0, maxDist, maxDist)
+		r = rng.triangular(0, maxDist, maxDist)
 		ha = angle / 2.0
-		t = random.uniform(-ha, ha) + (heading + (math.pi / 2))
+		t = rng.uniform(-ha, ha) + (heading + (math.pi / 2))
 		pt = Vector(x + (r * cos(t)), y + (r * sin(t)))
 		return self.orient(pt)
 
@@ -368,10 +455,10 @@ class RectangularRegion(_RotatedRectangle, Region):
 		return RectangularRegion(position, heading, width, length,
 		                         name=self.name)
 
-	def uniformPointInner(self):
+	def uniformPointInner(self, rng=random):
 		hw, hl = self.hw, self.hl
-		rx = random.uniform(-hw, hw)
-		ry = random.uniform(-hl, hl)
+		rx = rng.uniform(-hw, hw)
+		ry = rng.uniform(-hl, hl)
 		pt = self.position.offsetRotated(self.heading, Vector(rx, ry))
 		return self.orient(pt)
 
@@ -499,10 +586,10 @@ class PolylineRegion(Region):
 		start, end = self.nearestSegmentTo(point)
 		return start.angleTo(end)
 
-	def uniformPointInner(self):
-		pointA, pointB = random.choices(self.segments,
-		                                cum_weights=self.cumulativeLengths)[0]
-		interpolation = random.random()
+	def uniformPointInner(self, rng=random):
+		pointA, pointB = rng.choices(self.segments,
+		                             cum_weights=self.cumulativeLengths)[0]
+		interpolation = rng.random()
 		x, y = averageVectors(pointA, pointB, weight=interpolation)
 		if self.usingDefaultOrientation:
 			return OrientedVector(x, y, headingOfSegment(pointA, pointB))
@@ -612,6 +699,9 @@ class PolylineRegion(Region):
 		xmin, ymin, xmax, ymax = self.lineString.bounds
 		return ((xmin, ymin), (xmax, ymax))
 
+	def _boundingBox(self):
+		return self.lineString.bounds
+
 	def show(self, plt, style='r-', **kwargs):
 		plotPolygon(self.lineString, plt, style=style, **kwargs)
 
@@ -650,7 +740,10 @@ class PolylineRegion(Region):
 
 	@cached
 	def __hash__(self):
-		return hash(str(self.lineString))
+		return hash(geometryFingerprint(self.lineString))
+
+# Relative tolerance for the fast containment test in PolygonalRegion.containsObject
+_containmentTolerance = 1e-9
 
 class PolygonalRegion(Region):
 	"""Region given by one or more polygons (possibly with holes)"""
@@ -685,24 +778,70 @@ class PolygonalRegion(Region):
 		if self.polygons.is_empty:
 			raise RuntimeError('tried to create empty PolygonalRegion')
 
-		triangles = []
-		for polygon in self.polygons.geoms:
-			triangles.extend(triangulatePolygon(polygon))
-		assert len(triangles) > 0, self.polygons
-		self.trianglesAndBounds = tuple((tri, tri.bounds) for tri in triangles)
-		areas = (triangle.area for triangle in triangles)
-		self.cumulativeTriangleAreas = tuple(itertools.accumulate(areas))
-
-	def uniformPointInner(self):
-		triangle, bounds = random.choices(
-			self.trianglesAndBounds,
-			cum_weights=self.cumulativeTriangleAreas)[0]
-		minx, miny, maxx, maxy = bounds
-		# TODO improve?
-		while True:
-			x, y = random.uniform(minx, maxx), random.uniform(miny, maxy)
-			if triangle.intersects(shapely.geometry.Point(x, y)):
-				return self.orient(Vector(x, y))
+		# The triangulation is only computed when we first sample from the region,
+		# since many regions (e.g. parts of road networks) are never sampled from
+		self._triangulation = None
+
+	@property
+	def triangles(self):
+		"""Triangulation of the region, as an array of shape (triangles, 3, 2)."""
+		return self._triangulate()[0]
+
+	@property
+	def cumulativeTriangleAreas(self):
+		"""Array of the cumulative areas of the triangles in `triangles`."""
+		return self._triangulate()[1]
+
+	def _triangulate(self):
+		if self._triangulation is None:
+			triangles = []
+			for polygon in self.polygons.geoms:
+				triangles.extend(triangulatePolygon(polygon))
+			assert len(triangles) > 0, self.polygons
+			triangles = numpy.array([tri.exterior.coords[:3] for tri in triangles],
+			                        dtype=float)
+			a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+			(ux, uy), (vx, vy) = (b - a).T, (c - a).T
+			areas = numpy.cumsum(numpy.abs(ux*vy - uy*vx) / 2)
+			self._triangulation = (triangles, areas)
+		return self._triangulation
+
+	def uniformPointInner(self, rng=random):
+		# Pick a triangle with probability proportional to its area, then a uniform
+		# point in it using barycentric coordinates
+		triangles, areas = self._triangulate()
+		index = areas.searchsorted(rng.random() * areas[-1], side='right')
+		index = min(index, len(areas) - 1)	# in case of rounding at the end
+		(ax, ay), (bx, by), (cx, cy) = triangles[index].tolist()
+		u, v = rng.random(), rng.random()
+		if u + v > 1:
+			u, v = 1 - u, 1 - v
+		x = ax + u * (bx - ax) + v * (cx - ax)
+		y = ay + u * (by - ay) + v * (cy - ay)
+		return self.orient(Vector(x, y))
+
+	def uniformPoints(self, n, rng=None):
+		"""Sample many points uniformly from this region at once.
+
+		Args:
+			n (int): number of points to sample.
+			rng: NumPy random :obj:`~numpy.random.Generator` to use (by default, a
+			  new generator seeded from fresh entropy).
+
+		Returns:
+			A NumPy array of shape (n, 2) giving the coordinates of the points (which
+			are not oriented, unlike those returned by `uniformPointInner`).
+		"""
+		if rng is None:
+			rng = numpy.random.default_rng()
+		triangles, areas = self._triangulate()
+		indices = areas.searchsorted(rng.random(n) * areas[-1], side='right')
+		triangles = triangles[numpy.minimum(indices, len(areas) - 1)]
+		u, v = rng.random((2, n, 1))
+		flip = (u + v > 1)
+		u, v = numpy.where(flip, 1 - u, u), numpy.where(flip, 1 - v, v)
+		a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+		return a + u * (b - a) + v * (c - a)
 
 	def difference(self, other):
 		poly = toPolygon(other)
@@ -769,18 +908,23 @@ class PolygonalRegion(Region):
 		return PolygonalRegion(polygon=union, orientation=orientation)
 
 	@staticmethod
-	def unionAll(regions, buf=0):
-		regs, polys = [], []
-		for reg in regions:
-			if reg != nowhere:
-				regs.append(reg)
-				polys.append(toPolygon(reg))
-		if not polys:
+	def unionAll(regions, buf=0, lazy=False):
+		"""Get the union of a sequence of regions.
+
+		If **lazy** is true, the union is a `PolygonalUnionRegion`, which defers
+		computing its polygons until they are first needed.
+		"""
+		regions = tuple(regions)
+		regs = [reg for reg in regions if reg != nowhere]
+		if not regs:
 			return nowhere
+		orientation = VectorField.forUnionOf(regs)
+		if lazy:
+			return PolygonalUnionRegion(regs, buf=buf, orientation=orientation)
+		polys = [toPolygon(reg) for reg in regs]
 		if any(not poly for poly in polys):
 			raise RuntimeError(f'cannot take union of regions {regions}')
 		union = polygonUnion(polys, buf=buf)
-		orientation = VectorField.forUnionOf(regs)
 		return PolygonalRegion(polygon=union, orientation=orientation)
 
 	@property
@@ -794,13 +938,60 @@ class PolygonalRegion(Region):
 	def containsPoint(self, point):
 		return self.prepared.intersects(shapely.geometry.Point(point))
 
+	def containsPoints(self, points):
+		points = numpy.asarray(points, dtype=float)
+		x, y = points[..., 0], points[..., 1]
+		# points on the boundary count as contained, as in containsPoint
+		return (shapely.vectorized.contains(self.polygons, x, y)
+		        | shapely.vectorized.touches(self.polygons, x, y))
+
 	def containsObject(self, obj):
+		halfPlanes = self._halfPlanes
+		params = getattr(obj, '_rectangleParameters', None)
+		if halfPlanes is not None and params is not None:
+			# The region is convex, so it contains the object iff it contains all its
+			# corners; we use Shapely only if some corner is very close to the boundary
+			normals, offsets = halfPlanes
+			corners = numpy.array(_RotatedRectangle.makeCorners(*params))
+			margins = corners @ normals.T - offsets
+			tolerance = _containmentTolerance * (1 + numpy.abs(corners).max())
+			closest = margins.min()
+			if closest > tolerance:
+				return True
+			if closest < -tolerance:
+				return False
 		objPoly = obj.polygon
 		if objPoly is None:
 			raise RuntimeError('tried to test containment of symbolic Object!')
 		# TODO improve boundary handling?
 		return self.prepared.contains(objPoly)
 
+	@cached_property
+	def _halfPlanes(self):
+		# If the region is a convex polygon, arrays of the inward unit normals and
+		# offsets of its edges, so that a point p is inside iff normals @ p >= offsets
+		polygon = self.polygons
+		if isinstance(polygon, shapely.geometry.MultiPolygon):
+			if len(polygon.geoms) != 1:
+				return None
+			polygon = polygon.geoms[0]
+		if polygon.interiors:
+			return None
+		polygon = shapely.geometry.polygon.orient(polygon)	# counterclockwise
+		coords = numpy.array(polygon.exterior.coords)
+		edges = coords[1:] - coords[:-1]
+		lengths = numpy.hypot(edges[:, 0], edges[:, 1])
+		keep = lengths > 0
+		coords, edges, lengths = coords[:-1][keep], edges[keep], lengths[keep]
+		# a simple polygon is convex iff it never turns right
+		nextEdges = numpy.roll(edges, -1, axis=0)
+		turns = edges[:, 0] * nextEdges[:, 1] - edges[:, 1] * nextEdges[:, 0]
+		if (turns < 0).any():
+			return None
+		normals = numpy.column_stack([-edges[:, 1], edges[:, 0]]) / lengths[:, None]
+		offsets = (normals * coords).sum(axis=1)
+		return normals, offsets
+
 	def containsRegion(self, other, tolerance=0):
 		poly = toPolygon(other)
 		if poly is None:
@@ -815,6 +1006,9 @@ class PolygonalRegion(Region):
 		xmin, xmax, ymin, ymax = self.polygons.bounds
 		return ((xmin, ymin), (xmax, ymax))
 
+	def _boundingBox(self):
+		return self.polygons.bounds
+
 	def show(self, plt, style='r-', **kwargs):
 		plotPolygon(self.polygons, plt, style=style, **kwargs)
 
@@ -829,14 +1023,83 @@ class PolygonalRegion(Region):
 
 	@cached
 	def __hash__(self):
-		# TODO better way to hash mutable Shapely geometries? (also for PolylineRegion)
-		return hash((str(self.polygons), self.orientation))
+		return hash((geometryFingerprint(self.polygons), self.orientation))
 
 	def __getstate__(self):
 		state = self.__dict__.copy()
 		state.pop('_cached_prepared', None)		# prepared geometries are not picklable
 		return state
 
+class PolygonalUnionRegion(PolygonalRegion):
+	"""Union of a sequence of polygonal regions, computed when first needed.
+
+	Taking the union of many polygons is expensive, and aggregate regions (e.g. all
+	the sidewalks of a road network) are often never used, so the polygons of this
+	region are only computed when first accessed. Until then, pickling the region
+	saves the regions it is the union of rather than its polygons.
+
+	Args:
+		regions: the regions to take the union of (each having polygons, as
+		  returned by `toPolygon`).
+		buf: buffer to use when taking the union (see `polygonUnion`).
+		orientation (`VectorField`, optional): orientation of the region.
+		name (str, optional): name for debugging.
+	"""
+	def __init__(self, regions, buf=0, orientation=None, name=None):
+		Region.__init__(self, name, orientation=orientation)
+		self._regions = tuple(regions)
+		self._buf = buf
+		self._triangulation = None
+
+	@cached_property
+	def polygons(self):
+		polys = [toPolygon(region) for region in self._regions]
+		if any(not poly for poly in polys):
+			raise RuntimeError(f'cannot take union of regions {self._regions}')
+		union = polygonUnion(polys, buf=self._buf)
+		if isinstance(union, shapely.geometry.Polygon):
+			union = shapely.geometry.MultiPolygon([union])
+		return union
+
+	@property
+	def points(self):
+		# as for PolygonalRegion, only defined for a single polygon without holes
+		polygons = self.polygons
+		if len(polygons.geoms) != 1 or len(polygons.geoms[0].interiors) != 0:
+			raise AttributeError(f"'{type(self).__name__}' object has no attribute 'points'")
+		return tuple(polygons.geoms[0].exterior.coords[:-1])
+
+	@property
+	def isComputed(self):
+		"""Whether the union has been computed yet."""
+		return '_cached_polygons' in self.__dict__
+
+	def _boundingBox(self):
+		if self.isComputed:
+			return self.polygons.bounds
+		# combine the boxes of the regions, enlarged by the buffer used for the union
+		boxes = [region._boundingBox() if isinstance(region, Region) else None
+		         for region in self._regions]
+		if None in boxes:
+			return None
+		boxes = [box for box in boxes if box]
+		if not boxes:
+			return ()
+		minx, miny, maxx, maxy = zip(*boxes)
+		buf = abs(self._buf)
+		return (min(minx) - buf, min(miny) - buf, max(maxx) + buf, max(maxy) + buf)
+
+	def __getstate__(self):
+		state = super().__getstate__()
+		if self.isComputed:
+			del state['_regions']	# no longer needed
+		return state
+
+	def __repr__(self):
+		if not self.isComputed:
+			return f'PolygonalUnionRegion({self._regions})'
+		return super().__repr__()
+
 class PointSetRegion(Region):
 	"""Region consisting of a set of discrete points.
 
@@ -866,11 +1129,11 @@ class PointSetRegion(Region):
 		self.orientation = orientation
 		self.tolerance = tolerance
 
-	def uniformPointInner(self):
-		return self.orient(Vector(*random.choice(self.points)))
+	def uniformPointInner(self, rng=random):
+		return self.orient(Vector(*rng.choice(self.points)))
 
 	def intersect(self, other, triedReversed=False):
-		def sampler(intRegion):
+		def sampler(intRegion, rng):
 			o = intRegion.regions[1]
 			center, radius = o.circumcircle
 			possibles = (Vector(*self.kdTree.data[i])
@@ -878,7 +1141,7 @@ class PointSetRegion(Region):
 			intersection = [p for p in possibles if o.containsPoint(p)]
 			if len(intersection) == 0:
 				raise RejectionException(f'empty intersection of Regions {self} and {o}')
-			return self.orient(random.choice(intersection))
+			return self.orient(rng.choice(intersection))
 		return IntersectionRegion(self, other, sampler=sampler, orientation=self.orientation)
 
 	def containsPoint(self, point):
@@ -1007,13 +1270,13 @@ class IntersectionRegion(Region):
 	def containsPoint(self, point):
 		return all(region.containsPoint(point) for region in self.regions)
 
-	def uniformPointInner(self):
-		return self.orient(self.sampler(self))
+	def uniformPointInner(self, rng=random):
+		return self.orient(_callSampler(self.sampler, self, rng))
 
 	@staticmethod
-	def genericSampler(intersection):
+	def genericSampler(intersection, rng):
 		regs = intersection.regions
-		point = regs[0].uniformPointInner()
+		point = regs[0]._uniformPointWithRNG(rng)
 		for region in regs[1:]:
 			if not region.containsPoint(point):
 				raise RejectionException(
@@ -1059,13 +1322,13 @@ class DifferenceRegion(Region):
 	def containsPoint(self, point):
 		return regionA.containsPoint(point) and not regionB.containsPoint(point)
 
-	def uniformPointInner(self):
-		return self.orient(self.sampler(self))
+	def uniformPointInner(self, rng=random):
+		return self.orient(_callSampler(self.sampler, self, rng))
 
 	@staticmethod
-	def genericSampler(difference):
+	def genericSampler(difference, rng):
 		regionA, regionB = difference.regionA, difference.regionB
-		point = regionA.uniformPointInner()
+		point = regionA._uniformPointWithRNG(rng)
 		if regionB.containsPoint(point):
 			raise RejectionException(
 			    f'sampling difference of Regions {regionA} and {regionB}')
@@ -1,19 +1,27 @@
 """Scenario and scene objects."""
 
+import math
+import os
 import random
 import time
+import typing
+
+import numpy
 
 from scenic.core.distributions import (Samplable, ConstantSamplable, RejectionException,
-                                       needsSampling)
+                                       SampledValues, SamplingPlan, needsSampling)
 from scenic.core.lazy_eval import needsLazyEvaluation
 from scenic.core.external_params import ExternalSampler
-from scenic.core.regions import EmptyRegion
+from scenic.core.regions import EmptyRegion, PolygonalRegion
+from scenic.core.object_types import Point, Object
 from scenic.core.workspaces import Workspace
 from scenic.core.vectors import Vector
+from scenic.core.geometry import rotateVectorArray, rectangleSeparations, CircleGrid
 from scenic.core.utils import areEquivalent
 from scenic.core.errors import InvalidScenarioError
 from scenic.core.dynamics import Behavior
 from scenic.core.requirements import BoundRequirement
+import scenic.core.parallel as parallel
 
 class Scene:
 	"""Scene()
@@ -61,6 +69,12 @@ class Scene:
 			self.workspace.zoomAround(plt, self.objects, expansion=zoom)
 		plt.show(block=block)
 
+class CheckStatistics(typing.NamedTuple):
+	"""Statistics on a requirement checked while sampling; see `Scenario.samplingStats`."""
+	evaluations: int	#: number of times the requirement was checked
+	rejections: int		#: number of samples rejected by it
+	meanTime: float		#: mean time taken to check it, in seconds
+
 class Scenario:
 	"""Scenario()
 
@@ -109,6 +123,11 @@ class Scenario:
 				if isinstance(value, Samplable):
 					behaviorDeps.append(value)
 		self.dependencies = self.objects + paramDeps + tuple(requirementDeps) + tuple(behaviorDeps)
+		self.samplingBackend = 'recursive'
+		self._samplingPlan = None
+		self._checkSchedule = None
+		self._checkStats = {}
+		self._samplesSinceReordering = 0
 
 		self.validate()
 
@@ -136,6 +155,7 @@ class Scenario:
 		objects = self.objects
 		staticVisibility = self.egoObject and not needsSampling(self.egoObject.visibleRegion)
 		staticBounds = [self.hasStaticBounds(obj) for obj in objects]
+		collisions = CircleGrid()
 		for i in range(len(objects)):
 			oi = objects[i]
 			container = self.containerOfObject(oi)
@@ -152,15 +172,14 @@ class Scenario:
 			if staticVisibility and oi.requireVisible is True and oi is not self.egoObject:
 				if not self.egoObject.canSee(oi):
 					raise InvalidScenarioError(f'Object at {oi.position} is not visible from ego')
-			if not oi.allowCollisions:
+			if not oi.allowCollisions and not needsSampling(oi.radius):
 				# Require object to not intersect another object
-				for j in range(i):
-					oj = objects[j]
-					if oj.allowCollisions or not staticBounds[j]:
-						continue
+				x, y = oi.position
+				for oj in collisions.overlapping(x, y, oi.radius):
 					if oi.intersects(oj):
 						raise InvalidScenarioError(f'Object at {oi.position} intersects'
 												   f' object at {oj.position}')
+				collisions.insert(oi, x, y, oi.radius)
 
 	def hasStaticBounds(self, obj):
 		if needsSampling(obj.position):
@@ -169,7 +188,7 @@ class Scenario:
 			return False
 		return True
 
-	def generate(self, maxIterations=2000, verbosity=0, feedback=None):
+	def generate(self, maxIterations=2000, verbosity=0, feedback=None, rng=None):
 		"""Sample a `Scene` from this scenario.
 
 		Args:
@@ -177,6 +196,10 @@ class Scenario:
 			verbosity (int): Verbosity level.
 			feedback (float): Feedback to pass to external samplers doing active sampling.
 				See :mod:`scenic.core.external_params`.
+			rng: Random number generator to use, with the same interface as
+				:obj:`random.Random` (default is Python's global generator). Passing
+				a generator seeded with `sceneSeed` regenerates a scene of a batch
+				produced by `generateMany`.
 
 		Returns:
 			A pair with the sampled `Scene` and the number of iterations used.
@@ -184,10 +207,11 @@ class Scenario:
 		Raises:
 			`RejectionException`: if no valid sample is found in **maxIterations** iterations.
 		"""
-		objects = self.objects
+		if rng is None:
+			rng = random
 
 		# choose which custom requirements will be enforced for this sample
-		activeReqs = [req for req in self.initialRequirements if random.random() <= req.prob]
+		activeReqs = [req for req in self.initialRequirements if rng.random() <= req.prob]
 
 		# do rejection sampling until requirements are satisfied
 		rejection = True
@@ -204,55 +228,241 @@ class Scenario:
 			try:
 				if self.externalSampler is not None:
 					self.externalSampler.sample(feedback)
-				sample = Samplable.sampleAll(self.dependencies)
+				sample, rejection = self._sampleWithEarlyRejection(rng, activeReqs)
 			except RejectionException as e:
 				rejection = e
 				continue
-			rejection = None
-			ego = sample[self.egoObject]
-			# Normalize types of some built-in properties
+
+		# obtained a valid sample; assemble a scene from it
+		return self._makeScene(sample), iterations
+
+	#: Names of the backends which can be used to sample the scenario's dependencies
+	#: (see `setSamplingBackend`).
+	samplingBackends = ('recursive', 'plan')
+
+	def setSamplingBackend(self, backend):
+		"""Choose how `generate` samples the values the scenario depends on.
+
+		Args:
+			backend (str): Either ``'recursive'`` (the default), which traverses the
+				dependency graph afresh for each sample using `Samplable.sampleAll`, or
+				``'plan'``, which compiles the graph once into a flat `SamplingPlan`.
+				Both make the same random choices, so they generate the same scenes.
+		"""
+		if backend not in self.samplingBackends:
+			raise ValueError(f'unknown sampling backend {backend!r}')
+		self.samplingBackend = backend
+		self._samplingPlan = None
+
+	def _sampleInStages(self, rng):
+		# Sample the scenario's dependencies in order, yielding the values sampled so
+		# far at the start and after each one
+		if self.samplingBackend == 'plan':
+			if self._samplingPlan is None:
+				self._samplingPlan = SamplingPlan(self.dependencies)
+			yield from self._samplingPlan.sampleInStages(rng)
+			return
+		sample = SampledValues(rng)
+		yield sample
+		for q in self.dependencies:
+			if q not in sample:
+				sample[q] = q.sample(sample) if isinstance(q, Samplable) else q
+			yield sample
+
+	def _sampleWithEarlyRejection(self, rng, activeReqs):
+		"""Sample the scenario's dependencies, checking each requirement as soon as possible.
+
+		The built-in requirements on an object are checked as soon as the object (and
+		for visibility and intersection, the other object involved) has been sampled,
+		and the given user requirements as soon as all their dependencies have, so that
+		an invalid sample is abandoned without sampling the rest of the scenario.
+		Objects which may intersect are found using a `CircleGrid` of their bounding
+		circles, so that only those pairs are checked exactly. Checks which become
+		possible at the same time are made in order of increasing expected cost per
+		rejection, estimated from previous samples (see `samplingStats`); this does
+		not affect which samples are accepted.
+
+		Returns:
+			A pair with the sample and the reason for rejecting it, or None if it is valid.
+		"""
+		if self._checkSchedule is None:
+			self._checkSchedule = self._makeCheckSchedule()
+		self._samplesSinceReordering += 1
+		if self._samplesSinceReordering >= _reorderingInterval:
+			self._samplesSinceReordering = 0
+			for objects, checks in self._checkSchedule:
+				checks.sort(key=_SamplingCheck.expectedCost)
+		active = set(id(req) for req in activeReqs)
+		collisions = CircleGrid()
+		for sample, (objects, checks) in zip(self._sampleInStages(rng), self._checkSchedule):
 			for obj in objects:
-				sampledObj = sample[obj]
-				assert not needsSampling(sampledObj)
-				# position, heading
-				assert isinstance(sampledObj.position, Vector)
-				sampledObj.heading = float(sampledObj.heading)
-				# behavior
-				behavior = sampledObj.behavior
-				if behavior is not None and not isinstance(behavior, Behavior):
-					raise InvalidScenarioError(
-						f'behavior {behavior} of Object {obj} is not a behavior')
-
-			# Check built-in requirements
-			for i in range(len(objects)):
-				vi = sample[objects[i]]
-				# Require object to be contained in the workspace/valid region
-				container = self.containerOfObject(vi)
-				if not container.containsObject(vi):
-					rejection = 'object containment'
-					break
-				# Require object to be visible from the ego object
-				if vi.requireVisible and vi is not ego and not ego.canSee(vi):
-					rejection = 'object visibility'
-					break
-				# Require object to not intersect another object
-				if not vi.allowCollisions:
-					for j in range(i):
-						vj = sample[objects[j]]
-						if not vj.allowCollisions and vi.intersects(vj):
-							rejection = 'object intersection'
-							break
+				self._normalizeObject(obj, sample[obj])
+			for check in checks:
+				if check.requirement is not None and id(check.requirement) not in active:
+					continue
+				rejection = check(sample, collisions)
 				if rejection is not None:
-					break
-			if rejection is not None:
-				continue
-			# Check user-specified requirements
-			for req in activeReqs:
-				if not req.satisfiedBy(sample):
-					rejection = str(req)
-					break
+					return sample, rejection
+		return sample, None
 
-		# obtained a valid sample; assemble a scene from it
+	def _makeCheckSchedule(self):
+		# For each of the scenario's dependencies, the objects and checks which become
+		# possible once it has been sampled; the first entry lists those which are
+		# possible before sampling anything
+		objects, ego = self.objects, self.egoObject
+		sampled = set()
+		def visit(q):
+			sampled.add(id(q))
+			for child in q._conditioned._dependencies:
+				if id(child) not in sampled:
+					visit(child)
+		def makeCheck(name, function, requirement=None):
+			stats = self._checkStats.get(name)
+			if stats is None:
+				stats = self._checkStats[name] = _SamplingCheck(name, function, requirement)
+			else:	# keep statistics from before the schedule was recomputed
+				stats.function, stats.requirement = function, requirement
+			return stats
+		finished = []
+		pendingReqs = list(self.initialRequirements)
+		schedule = []
+		for q in (None,) + self.dependencies:
+			if isinstance(q, Samplable):
+				if id(q) not in sampled:
+					visit(q)
+			elif q is not None:
+				sampled.add(id(q))
+			newObjects, checks = [], []
+			for i, obj in enumerate(objects):
+				if obj in finished or id(obj) not in sampled:
+					continue
+				finished.append(obj)
+				newObjects.append(obj)
+				checks.append(makeCheck(f'containment of object {i}',
+				                        self._containmentCheck(obj)))
+				checks.append(makeCheck(f'intersection of object {i}',
+				                        self._intersectionCheck(obj)))
+				for j, other in enumerate(objects):
+					if other in finished and other is not obj:
+						if obj is ego:
+							checks.append(makeCheck(f'visibility of object {j}',
+							                        self._visibilityCheck(other)))
+						elif other is ego:
+							checks.append(makeCheck(f'visibility of object {i}',
+							                        self._visibilityCheck(obj)))
+			for req in tuple(pendingReqs):
+				if all(id(dep) in sampled for dep in req.dependencies):
+					pendingReqs.remove(req)
+					check = self._requirementCheck(req)
+					checks.append(makeCheck(str(req), check, requirement=req))
+			schedule.append((newObjects, checks))
+		assert not pendingReqs
+		return schedule
+
+	def _containmentCheck(self, obj):
+		def check(sample, collisions):
+			vi = sample[obj]
+			# Require object to be contained in the workspace/valid region
+			if not self.containerOfObject(vi).containsObject(vi):
+				return 'object containment'
+		return check
+
+	def _visibilityCheck(self, obj):
+		ego = self.egoObject
+		def check(sample, collisions):
+			vi = sample[obj]
+			# Require object to be visible from the ego object
+			if vi.requireVisible and not sample[ego].canSee(vi):
+				return 'object visibility'
+		return check
+
+	def _intersectionCheck(self, obj):
+		def check(sample, collisions):
+			vi = sample[obj]
+			# Require object to not intersect any other object checked so far
+			if vi.allowCollisions:
+				return None
+			x, y = vi.position
+			for vj in collisions.overlapping(x, y, vi.radius):
+				if vi.intersects(vj):
+					return 'object intersection'
+			collisions.insert(vi, x, y, vi.radius)
+		return check
+
+	def _requirementCheck(self, req):
+		def check(sample, collisions):
+			if not req.satisfiedBy(sample):
+				return str(req)
+		return check
+
+	def samplingStats(self):
+		"""Statistics on the requirements checked while sampling from this scenario.
+
+		The statistics cover all calls to `generate` in this process (scenes generated
+		in worker processes by `generateMany` are not included).
+
+		Returns:
+			A dict mapping a description of each check (e.g. ``'containment of object 1'``,
+			or the name or line number of a user requirement) to a `CheckStatistics`
+			giving the number of times it was evaluated, the number of samples it
+			rejected, and its mean evaluation time in seconds.
+		"""
+		return { name: CheckStatistics(check.evaluations, check.rejections, check.meanTime)
+		         for name, check in self._checkStats.items() }
+
+	def _normalizeSample(self, sample):
+		for obj in self.objects:
+			self._normalizeObject(obj, sample[obj])
+
+	@staticmethod
+	def _normalizeObject(obj, sampledObj):
+		# Normalize types of some built-in properties
+		assert not needsSampling(sampledObj)
+		# position, heading
+		assert isinstance(sampledObj.position, Vector)
+		sampledObj.heading = float(sampledObj.heading)
+		# behavior
+		behavior = sampledObj.behavior
+		if behavior is not None and not isinstance(behavior, Behavior):
+			raise InvalidScenarioError(
+				f'behavior {behavior} of Object {obj} is not a behavior')
+
+	def _checkRequirements(self, sample, activeReqs, passed=()):
+		"""Check a sample against the built-in and the given requirements.
+
+		Built-in checks listed in **passed** (see `_batchCheckRequirements`) are skipped.
+		Returns None if the sample is valid, and otherwise the reason for rejecting it.
+		"""
+		objects = self.objects
+		ego = sample[self.egoObject]
+		collisions = CircleGrid()
+		# Check built-in requirements
+		for i in range(len(objects)):
+			vi = sample[objects[i]]
+			# Require object to be contained in the workspace/valid region
+			container = self.containerOfObject(vi)
+			if not container.containsObject(vi):
+				return 'object containment'
+			# Require object to be visible from the ego object
+			if (vi.requireVisible and vi is not ego and ('visibility', i) not in passed
+			    and not ego.canSee(vi)):
+				return 'object visibility'
+			# Require object to not intersect another object
+			if not vi.allowCollisions:
+				x, y = vi.position
+				for j, vj in collisions.overlapping(x, y, vi.radius):
+					if ('intersection', i, j) not in passed and vi.intersects(vj):
+						return 'object intersection'
+				collisions.insert((i, vi), x, y, vi.radius)
+		# Check user-specified requirements
+		for req in activeReqs:
+			if not req.satisfiedBy(sample):
+				return str(req)
+		return None
+
+	def _makeScene(self, sample):
+		objects = self.objects
+		ego = sample[self.egoObject]
 		sampledObjects = tuple(sample[obj] for obj in objects)
 		sampledParams = {}
 		for param, value in self.params.items():
@@ -278,7 +488,247 @@ class Scenario:
 					  alwaysReqs, eventuallyReqs, terminationConds, termSimulationConds,
 					  recordedExprs, recordedInitialExprs,recordedFinalExprs,
 					  self.monitors, sampledNamespaces, self.dynamicScenario)
-		return scene, iterations
+		return scene
+
+	def generateBatch(self, n, maxIterations=2000, batchSize=None, verbosity=0, rng=None):
+		"""Sample several `Scene` objects, drawing candidate samples in vectorized batches.
+
+		Candidate samples are drawn **batchSize** at a time using `Samplable.batchSampleAll`,
+		so that the properties of the objects are sampled as NumPy arrays where possible.
+		The built-in requirements are then checked on the whole batch at once, using
+		approximations which never reject a valid sample; only the candidates passing
+		these checks are turned into objects and checked exactly, as in `generate`. As
+		in `generate`, the soft requirements to enforce are chosen once for each scene.
+
+		The scenes have the same distribution as those produced by repeated calls to
+		`generate`, but are not the same scenes for a given seed. For scenarios using
+		an external sampler, `generate` is simply called for each scene.
+
+		As for `generate`, randomness comes from **rng**, a generator with the
+		interface of :obj:`random.Random`. The vectorized sampling uses a
+		`numpy.random.Generator` seeded by a single draw from **rng**, and the
+		soft requirements to enforce are chosen using **rng** itself, so the scenes
+		are determined by the state of **rng**: seeding it (or Python's global
+		generator) the same way gives the same batch of scenes.
+
+		Args:
+			n (int): Number of scenes to generate.
+			maxIterations (int): Maximum number of candidate samples to draw per scene
+				(on average over the **n** scenes).
+			batchSize (int): Number of candidate samples to draw at a time. By default,
+				this is estimated from the fraction of candidates accepted so far.
+			verbosity (int): Verbosity level.
+			rng: Random number generator to use, with the same interface as
+				:obj:`random.Random` (default is Python's global generator).
+
+		Returns:
+			A pair with the list of sampled `Scene` objects and the total number of
+			candidate samples used.
+
+		Raises:
+			`RejectionException`: if the scenes are not found within
+				``n * maxIterations`` candidate samples.
+		"""
+		if self.externalSampler is not None:
+			results = [self.generate(maxIterations=maxIterations, verbosity=verbosity,
+			                         rng=rng)
+			           for i in range(n)]
+			return [scene for scene, _ in results], sum(its for _, its in results)
+		if rng is None:
+			rng = random
+		batchRNG = numpy.random.default_rng(rng.getrandbits(64))
+		quantities = []
+		for obj in self.objects:
+			quantities.extend(obj._conditioned._dependencies)
+
+		scenes = []
+		iterations = 0
+		activeReqs = None
+		size = n
+		while len(scenes) < n:
+			if iterations >= n * maxIterations:
+				raise RejectionException(f'failed to generate {n} scenes in '
+				                         f'{iterations} iterations')
+			if batchSize is not None:
+				size = batchSize
+			elif iterations > 0:
+				# aim to finish with this batch, given the acceptance rate so far
+				remaining = n - len(scenes)
+				size = math.ceil(remaining * iterations / len(scenes)) if scenes else 2 * size
+				size = min(size, _maxBatchSize)
+			values = Samplable.batchSampleAll(quantities, size, batchRNG)
+			valid, passed = self._batchCheckRequirements(values)
+			candidates = numpy.flatnonzero(valid)
+			if verbosity >= 2:
+				print(f'  {len(candidates)} of {size} samples passed vectorized checks')
+			used = size
+			for index in candidates.tolist():
+				# choose which custom requirements will be enforced for the next scene
+				if activeReqs is None:
+					activeReqs = [req for req in self.initialRequirements
+					              if rng.random() <= req.prob]
+				sample = values.row(index)
+				try:
+					for dep in self.dependencies:
+						if dep not in sample:
+							sample[dep] = dep.sample(sample) if isinstance(dep, Samplable) else dep
+				except RejectionException as e:
+					rejection = e
+				else:
+					self._normalizeSample(sample)
+					rowPassed = set(check for check, column in passed.items() if column[index])
+					rejection = self._checkRequirements(sample, activeReqs, rowPassed)
+				if rejection is not None:
+					if verbosity >= 2:
+						print(f'  Rejected sample {iterations + index + 1} because of: {rejection}')
+					continue
+				scenes.append(self._makeScene(sample.detached()))
+				activeReqs = None
+				if len(scenes) == n:
+					used = index + 1
+					break
+			iterations += used
+		return scenes, iterations
+
+	def _batchCheckRequirements(self, values):
+		"""Check the built-in requirements on a batch of samples at once.
+
+		Only approximations are used here, conservative in both directions: this
+		returns a boolean array marking the samples of the `BatchedValues` which may
+		satisfy the requirements, together with a dict mapping individual checks to
+		arrays marking the samples for which they certainly pass. The other checks must
+		be done exactly for each sample.
+		"""
+		valid = ~values.rejected
+		passed = {}
+		objects = self.objects
+		boxes = [self._batchBoundingBox(obj, values) for obj in objects]
+		# Require objects to be contained in their containers: all corners must be
+		for obj, box in zip(objects, boxes):
+			container = self.containerOfObject(obj._conditioned)
+			if box is not None and isinstance(container, PolygonalRegion):
+				valid &= container.containsPoints(box[4]).all(axis=-1)
+		# Require objects to be visible from the ego: some corner must be
+		ego = self.egoObject._conditioned
+		if (boxes[0] is not None and type(ego).canSee is Point.canSee
+		    and type(ego).visibleRegion is Object.visibleRegion):
+			offset = values.vectors(ego.cameraOffset)
+			visibleDistance = values.numbers(ego.visibleDistance)
+			viewAngle = values.numbers(ego.viewAngle)
+			if offset is not None and visibleDistance is not None and viewAngle is not None:
+				position, heading = boxes[0][:2]
+				camera = position + rotateVectorArray(offset, heading)
+				distanceLimit = numpy.expand_dims(visibleDistance, -1) + _tolerance
+				angleLimit = numpy.expand_dims(viewAngle, -1) / 2 + _tolerance
+				base = numpy.expand_dims(heading, -1) + (math.pi / 2)
+				for i in range(1, len(objects)):
+					box = boxes[i]
+					if box is None or objects[i]._conditioned.requireVisible is not True:
+						continue
+					dx, dy = numpy.moveaxis(box[4] - camera[:, None, :], -1, 0)
+					angle = numpy.mod(numpy.arctan2(dy, dx) - base + math.pi, math.tau) - math.pi
+					distance, angle = numpy.hypot(dx, dy), numpy.abs(angle)
+					visible = (distance <= distanceLimit) & (angle <= angleLimit)
+					valid &= visible.any(axis=-1)
+					surelyVisible = ((distance <= distanceLimit - 2*_tolerance)
+					                 & (angle <= angleLimit - 2*_tolerance))
+					passed['visibility', i] = surelyVisible.any(axis=-1)
+		# Require objects not to intersect, using the separating axis test
+		for i in range(len(objects)):
+			if boxes[i] is None or objects[i]._conditioned.allowCollisions is not False:
+				continue
+			for j in range(i):
+				if boxes[j] is None or objects[j]._conditioned.allowCollisions is not False:
+					continue
+				separation = rectangleSeparations(boxes[i][-1], boxes[j][-1])
+				valid &= (separation >= -_tolerance)
+				passed['intersection', i, j] = (separation > _tolerance)
+		return valid, passed
+
+	@staticmethod
+	def _batchBoundingBox(obj, values):
+		# Columns giving the position, heading, half-width, half-length, corners, and
+		# (x, y, heading, hw, hl) rectangle of an object in a batch of samples, or None
+		# if they are not all vectorized
+		obj = obj._conditioned
+		if not isinstance(obj, Object) or obj.mutationEnabled is not False:
+			return None
+		position = values.vectors(obj.position)
+		heading = values.numbers(obj.heading)
+		width, length = values.numbers(obj.width), values.numbers(obj.length)
+		if position is None or heading is None or width is None or length is None:
+			return None
+		n = values.n
+		position = numpy.broadcast_to(position, (n, 2)).astype(float)
+		heading = numpy.broadcast_to(heading, n).astype(float)
+		hw = numpy.broadcast_to(width, n) / 2
+		hl = numpy.broadcast_to(length, n) / 2
+		offsets = numpy.stack([numpy.stack([hw, hl], -1), numpy.stack([-hw, hl], -1),
+		                       numpy.stack([-hw, -hl], -1), numpy.stack([hw, -hl], -1)], 1)
+		corners = position[:, None, :] + rotateVectorArray(offsets, heading[:, None])
+		rectangles = numpy.column_stack([position, heading, hw, hl])
+		return position, heading, hw, hl, corners, rectangles
+
+	def generateMany(self, n, workers=None, seed=None, maxIterations=2000, verbosity=0):
+		"""Sample several independent `Scene` objects from this scenario, in parallel.
+
+		Each scene is generated from its own random stream, seeded by `sceneSeed`
+		from **seed** and the index of the scene, so the scenes returned do not depend
+		on the number of workers used, and any one of them can be regenerated directly
+		by passing such a stream to `generate`. Workers are created by forking the
+		current process, so that they share the compiled scenario; on platforms
+		without ``fork``, or if the scenario uses an external sampler (whose state
+		cannot be split across processes), the scenes are generated sequentially in
+		the current process.
+
+		Args:
+			n (int): Number of scenes to generate.
+			workers (int): Number of worker processes to use (default is the number
+				of CPUs).
+			seed (int): Seed from which to derive the random streams of the scenes.
+				If not given, a seed is drawn from Python's global random generator.
+			maxIterations (int): Maximum number of rejection sampling iterations for
+				each scene.
+			verbosity (int): Verbosity level.
+
+		Returns:
+			A list of pairs of the sampled `Scene` and the number of iterations used,
+			ordered by scene index.
+
+		Raises:
+			`RejectionException`: if some scene could not be generated within
+				**maxIterations** iterations.
+		"""
+		if seed is None:
+			seed = random.getrandbits(64)
+		if workers is None:
+			workers = os.cpu_count() or 1
+		workers = min(workers, n)
+		context = parallel.forkContext()
+		if workers <= 1 or context is None or self.externalSampler is not None:
+			return [self._generateFromSeed(self.sceneSeed(seed, i), maxIterations, verbosity)
+			        for i in range(n)]
+
+		shared = parallel.SharedObjects(self)
+		initArgs = (self, shared, seed, maxIterations, verbosity)
+		with context.Pool(workers, initializer=_initGenerationWorker,
+		                  initargs=initArgs) as pool:
+			return [shared.loads(data)
+			        for data in pool.imap(_generateInWorker, range(n))]
+
+	def _generateFromSeed(self, seed, maxIterations, verbosity):
+		return self.generate(maxIterations=maxIterations, verbosity=verbosity,
+		                     rng=random.Random(seed))
+
+	@staticmethod
+	def sceneSeed(seed, index):
+		"""Seed for the random stream of the scene with the given index in a batch.
+
+		The scene generated by ``generate(rng=random.Random(sceneSeed(seed, i)))``
+		is the same as the one at index *i* of ``generateMany(n, seed=seed)``; it
+		can be computed without generating the scenes before it.
+		"""
+		return parallel.deriveSeed(seed, index)
 
 	def resetExternalSampler(self):
 		"""Reset the scenario's external sampler, if any.
@@ -290,6 +740,9 @@ class Scenario:
 
 	def conditionOn(self, scene=None, objects=(), params={}):
 		assert objects or params
+		# sampling plan and check schedule must be recomputed to reflect the conditioning
+		self._samplingPlan = None
+		self._checkSchedule = None
 		assert bool(scene) == bool(objects)
 		if scene:
 			assert len(self.objects) == len(scene.objects)
@@ -310,3 +763,58 @@ class Scenario:
 			raise RuntimeError('scenario does not specify a simulator')
 		import scenic.syntax.veneer as veneer
 		return veneer.instantiateSimulator(self.simulator, self.params)
+
+# Absolute tolerance for the approximate checks in Scenario.generateBatch, so that
+# floating-point differences from the exact checks cannot cause valid samples to be
+# rejected
+_tolerance = 1e-9
+
+class _SamplingCheck:
+	# A check made by Scenario.generate, with statistics on its evaluations
+	def __init__(self, name, function, requirement=None):
+		self.name = name
+		self.function = function
+		self.requirement = requirement
+		self.evaluations = 0
+		self.rejections = 0
+		self.totalTime = 0
+
+	def __call__(self, sample, collisions):
+		startTime = time.perf_counter()
+		rejection = self.function(sample, collisions)
+		self.totalTime += time.perf_counter() - startTime
+		self.evaluations += 1
+		if rejection is not None:
+			self.rejections += 1
+		return rejection
+
+	@property
+	def meanTime(self):
+		return self.totalTime / self.evaluations if self.evaluations else 0
+
+	def expectedCost(self):
+		# Expected time spent per rejection, which is minimized by checking
+		# requirements in increasing order of this ratio (assuming independence);
+		# the rejection probability is estimated with add-one smoothing
+		rejectionRate = (self.rejections + 1) / (self.evaluations + 2)
+		return self.meanTime / rejectionRate
+
+# Number of samples between reorderings of the checks made by Scenario.generate
+_reorderingInterval = 32
+
+# Largest batch size chosen automatically by Scenario.generateBatch
+_maxBatchSize = 10000
+
+## Worker processes for Scenario.generateMany
+
+_workerState = None
+
+def _initGenerationWorker(*state):
+	global _workerState
+	_workerState = state
+
+def _generateInWorker(index):
+	scenario, shared, seed, maxIterations, verbosity = _workerState
+	result = scenario._generateFromSeed(scenario.sceneSeed(seed, index),
+	                                    maxIterations, verbosity)
+	return shared.dumps(result)
@@ -1,17 +1,27 @@
 
 """Interface between Scenic and simulators."""
 
+import collections.abc
 import enum
+import io
+import multiprocessing.util
+import os
+import random
+import struct
 import time
 import types
+import zipfile
 from collections import OrderedDict, defaultdict
 
-from scenic.core.object_types import (enableDynamicProxyFor, setDynamicProxyFor,
-                                      disableDynamicProxyFor)
+import numpy
+
+from scenic.core.object_types import updateDynamicProxyFor, disableDynamicProxyFor
+from scenic.core.recording import SimulationRecorder
 from scenic.core.distributions import RejectionException
 import scenic.core.dynamics as dynamics
 from scenic.core.errors import RuntimeParseError, InvalidScenarioError
 from scenic.core.requirements import RequirementType
+import scenic.core.parallel as parallel
 from scenic.core.vectors import Vector
 
 class SimulationCreationError(Exception):
@@ -29,8 +39,17 @@ class Simulator:
     """A simulator which can import/execute scenes from Scenic."""
 
     def simulate(self, scene, maxSteps=None, maxIterations=100, verbosity=0,
-                 raiseGuardViolations=False):
-        """Run a simulation for a given scene."""
+                 raiseGuardViolations=False, columnarTrajectory=False, recorder=None):
+        """Run a simulation for a given scene.
+
+        If **columnarTrajectory** is true, the trajectory of the simulation is stored
+        in NumPy arrays (see `ColumnarTrajectory`), which is much more compact for
+        long simulations with many objects.
+
+        If **recorder** is given, it should be a `SimulationRecorder`, which will be
+        notified of the progress of each simulation (for example to save it to disk
+        using a `StreamingRecorder`).
+        """
 
         # Repeatedly run simulations until we find one satisfying the requirements
         iterations = 0
@@ -39,7 +58,8 @@ class Simulator:
             # Run a single simulation
             try:
                 simulation = self.createSimulation(scene, verbosity=verbosity)
-                simulation.run(maxSteps)
+                simulation.run(maxSteps, columnarTrajectory=columnarTrajectory,
+                               recorder=recorder)
             except (RejectSimulationException, RejectionException, dynamics.GuardViolation) as e:
                 if verbosity >= 2:
                     print(f'  Rejected simulation {iterations} at time step '
@@ -73,25 +93,43 @@ class Simulation:
         self.currentTime = 0
         self.timestep = timestep
         self.verbosity = verbosity
-        self.worker_num = 0
+        self.worker_num = _workerNum     # nonzero if running as part of a campaign
 
-    def run(self, maxSteps):
+    def run(self, maxSteps, columnarTrajectory=False, recorder=None):
         """Run the simulation.
 
         Throws a RejectSimulationException if a requirement is violated.
+
+        If **columnarTrajectory** is true, the trajectory is stored as a
+        `ColumnarTrajectory` instead of a list of states. If **recorder** is given,
+        it is notified of the states and recorded values of the simulation as it
+        runs (see `SimulationRecorder`).
         """
+        if recorder is None:
+            recorder = SimulationRecorder()
+        keepTrajectory = recorder.keepTrajectory
+        recordsStates = (type(recorder).recordState
+                         is not SimulationRecorder.recordState)
+        if columnarTrajectory:
+            if not keepTrajectory:
+                raise RuntimeError('cannot discard the states of a columnar trajectory')
+            self.trajectory = ColumnarTrajectory(self.objects)
         trajectory = self.trajectory
         records = self.records
         if self.currentTime > 0:
             raise RuntimeError('tried to run a Simulation which has already run')
         assert len(trajectory) == 1
         actionSequence = []
+        result = None
 
         import scenic.syntax.veneer as veneer
         veneer.beginSimulation(self)
         dynamicScenario = self.scene.dynamicScenario
 
         try:
+            recorder.beginSimulation(self)
+            recorder.recordState(0, trajectory[0])
+
             # Initialize dynamic scenario
             dynamicScenario._start()
 
@@ -107,6 +145,7 @@ class Simulation:
             values = dynamicScenario._evaluateRecordedExprs(RequirementType.recordInitial)
             for name, val in values.items():
                 records[name] = val
+            recorder.recordValues(0, values, RequirementType.recordInitial)
 
             # Run simulation
             assert self.currentTime == 0
@@ -125,6 +164,7 @@ class Simulation:
                 values = dynamicScenario._evaluateRecordedExprs(RequirementType.record)
                 for name, val in values.items():
                     records[name].append((self.currentTime, val))
+                recorder.recordValues(self.currentTime, values, RequirementType.record)
 
                 # Check if any requirements fail
                 dynamicScenario._checkAlwaysRequirements()
@@ -184,8 +224,18 @@ class Simulation:
                 self.currentTime += 1
 
                 # Save the new state
-                trajectory.append(self.currentState())
-                actionSequence.append(allActions)
+                if columnarTrajectory:
+                    trajectory.appendStateOf(self.objects)
+                    if recordsStates:   # only build the state if the recorder uses it
+                        recorder.recordState(self.currentTime, trajectory[-1])
+                else:
+                    state = self.currentState()
+                    trajectory.append(state)
+                    recorder.recordState(self.currentTime, state)
+                if keepTrajectory:
+                    actionSequence.append(allActions)
+                else:
+                    del trajectory[0]
 
             # Reject if some 'require eventually' condition was never satisfied
             if unsatEventuallyReq is not None:
@@ -195,6 +245,7 @@ class Simulation:
             values = dynamicScenario._evaluateRecordedExprs(RequirementType.recordFinal)
             for name, val in values.items():
                 records[name] = val
+            recorder.recordValues(self.currentTime, values, RequirementType.recordFinal)
 
             # Package up simulation results into a compact object
             result = SimulationResult(trajectory, actionSequence, terminationType,
@@ -202,6 +253,7 @@ class Simulation:
             self.result = result
             return self
         finally:
+            recorder.endSimulation(result)
             self.destroy()
             for obj in self.scene.objects:
                 disableDynamicProxyFor(obj)
@@ -269,9 +321,9 @@ class Simulation:
             for prop in self.mutableProperties(obj):
                 values[prop] = getattr(obj, prop)
 
-            # Make a new copy of the object to ensure that computed properties like
-            # visibleRegion, etc. are recomputed
-            setDynamicProxyFor(obj, obj.copyWith(**values))
+            # Update the object's proxy, ensuring that computed properties like
+            # visibleRegion, etc. are recomputed if necessary
+            updateDynamicProxyFor(obj, values)
 
     def mutableProperties(self, obj):
         return {'lastActions', 'behavior'}
@@ -369,10 +421,311 @@ class TerminationType(enum.Enum):
 class SimulationResult:
     """Result of running a simulation."""
     def __init__(self, trajectory, actions, terminationType, terminationReason, records):
-        self.trajectory = tuple(trajectory)
+        if not isinstance(trajectory, ColumnarTrajectory):
+            trajectory = tuple(trajectory)
+        self.trajectory = trajectory
         assert self.trajectory
         self.finalState = self.trajectory[-1]
         self.actions = tuple(actions)
         self.terminationType = terminationType
         self.terminationReason = str(terminationReason)
         self.records = dict(records)
+
+class ColumnarTrajectory(collections.abc.Sequence):
+    """Trajectory of a simulation stored in growable NumPy arrays.
+
+    The position, heading, and speed of every object at every time step are stored
+    in the arrays `positions`, `headings`, and `speeds`, whose first two axes are
+    indexed by time step and object (in the order of `Simulation.objects`). Entries
+    for objects which did not yet exist at a given time step are NaN, and the number
+    of objects which did is given by `objectCounts`.
+
+    For compatibility with ordinary trajectories, this class also acts as a sequence
+    of states in the format of the default implementation of
+    `Simulation.currentState`, i.e. tuples of object positions.
+    """
+
+    columns = ('positions', 'headings', 'speeds', 'objectCounts')
+
+    def __init__(self, objects=None, capacity=64):
+        self._length = 0
+        numObjects = max(1, len(objects)) if objects is not None else 1
+        self._allocate(capacity, numObjects)
+        if objects is not None:
+            self.appendStateOf(objects)
+
+    def _allocate(self, steps, numObjects):
+        positions = numpy.full((steps, numObjects, 2), numpy.nan)
+        headings = numpy.full((steps, numObjects), numpy.nan)
+        speeds = numpy.full((steps, numObjects), numpy.nan)
+        counts = numpy.zeros(steps, dtype=numpy.int64)
+        if hasattr(self, '_positions'):
+            length, oldObjects = self._length, self._positions.shape[1]
+            positions[:length, :oldObjects] = self._positions[:length]
+            headings[:length, :oldObjects] = self._headings[:length]
+            speeds[:length, :oldObjects] = self._speeds[:length]
+            counts[:length] = self._counts[:length]
+        self._positions, self._headings, self._speeds = positions, headings, speeds
+        self._counts = counts
+
+    def appendStateOf(self, objects):
+        """Append the current state of the given objects."""
+        t, n = self._length, len(objects)
+        capacity, numObjects = self._headings.shape
+        if t >= capacity or n > numObjects:
+            self._allocate(2*capacity if t >= capacity else capacity,
+                           max(n, 2*numObjects) if n > numObjects else numObjects)
+        positions, headings, speeds = self._positions[t], self._headings[t], self._speeds[t]
+        for i, obj in enumerate(objects):
+            position = obj.position
+            positions[i] = (position.x, position.y)
+            headings[i] = obj.heading
+            speeds[i] = obj.speed
+        self._counts[t] = n
+        self._length = t + 1
+
+    @property
+    def positions(self):
+        return self._positions[:self._length]
+
+    @property
+    def headings(self):
+        return self._headings[:self._length]
+
+    @property
+    def speeds(self):
+        return self._speeds[:self._length]
+
+    @property
+    def objectCounts(self):
+        return self._counts[:self._length]
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(self._length)))
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('trajectory index out of range')
+        count = self._counts[index]
+        return tuple(Vector(x, y) for x, y in self._positions[index, :count].tolist())
+
+    def save(self, path):
+        """Save the trajectory to an uncompressed ``.npz`` file.
+
+        The arrays are written directly from memory, and can be memory-mapped when
+        loading the file with `load`.
+        """
+        # write to an open file so that NumPy does not append a .npz extension
+        with open(path, 'wb') as f:
+            numpy.savez(f, **{ column: getattr(self, column) for column in self.columns })
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a trajectory saved with `save`.
+
+        If **mmap** is true, the arrays are memory-mapped from the file rather than
+        read into memory.
+        """
+        if mmap:
+            arrays = cls._mapArrays(path)
+        else:
+            with numpy.load(path) as data:
+                arrays = { column: data[column] for column in cls.columns }
+        trajectory = cls.__new__(cls)
+        trajectory._positions = arrays['positions']
+        trajectory._headings = arrays['headings']
+        trajectory._speeds = arrays['speeds']
+        trajectory._counts = arrays['objectCounts']
+        trajectory._length = len(trajectory._counts)
+        return trajectory
+
+    @classmethod
+    def _mapArrays(cls, path):
+        # Arrays in uncompressed .npz files are stored contiguously, so they can be
+        # mapped directly once the offsets of their data are known
+        arrays = {}
+        with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+            for column in cls.columns:
+                info = archive.getinfo(column + '.npy')
+                if info.compress_type != zipfile.ZIP_STORED:
+                    raise ValueError(f'cannot memory-map compressed array "{column}"')
+                # skip the local file header, whose extra field may differ from
+                # the one in the central directory
+                f.seek(info.header_offset + 26)
+                nameLength, extraLength = struct.unpack('<HH', f.read(4))
+                f.seek(nameLength + extraLength, io.SEEK_CUR)
+                version = numpy.lib.format.read_magic(f)
+                if version == (1, 0):
+                    shape, fortran, dtype = numpy.lib.format.read_array_header_1_0(f)
+                else:
+                    shape, fortran, dtype = numpy.lib.format.read_array_header_2_0(f)
+                order = 'F' if fortran else 'C'
+                if 0 in shape:
+                    arrays[column] = numpy.empty(shape, dtype=dtype, order=order)
+                else:
+                    arrays[column] = numpy.memmap(path, dtype=dtype, mode='r',
+                                                  offset=f.tell(), shape=shape,
+                                                  order=order)
+        return arrays
+
+    def __getstate__(self):
+        # drop unused capacity
+        state = self.__dict__.copy()
+        length = self._length
+        numObjects = max(1, self.objectCounts.max(initial=0))
+        for column in ('_positions', '_headings', '_speeds'):
+            state[column] = state[column][:length, :numObjects]
+        state['_counts'] = self._counts[:length]
+        return state
+
+## Simulation campaigns
+
+class CampaignRun:
+    """Outcome of one task of a campaign run by `runCampaign`.
+
+    Attributes:
+        index (int): Index of the task.
+        scene (`Scene`): Scene generated for the task.
+        iterations (int): Number of iterations used to generate the scene.
+        result (`SimulationResult`): Result of simulating the scene, or ``None`` if
+            every simulation was rejected or could not be created.
+        error (`SimulationCreationError`): The last error raised when creating a
+            simulation, if no simulation could be created; otherwise ``None``.
+        workerNum (int): Number of the worker process which ran the task, as in
+            `Simulation.worker_num` (0 if the task ran in the current process).
+    """
+    def __init__(self, index, scene, iterations, result, error, workerNum):
+        self.index = index
+        self.scene = scene
+        self.iterations = iterations
+        self.result = result
+        self.error = error
+        self.workerNum = workerNum
+
+def runCampaign(scenario, n, workers=None, simulatorFactory=None, seed=None,
+                maxSteps=None, maxIterations=2000, maxSimulationIterations=1,
+                retries=2, verbosity=0):
+    """Generate scenes from a scenario and simulate them, in parallel.
+
+    Task *i* generates the same scene as index *i* of `Scenario.generateMany` with
+    the same **seed**, then simulates it with Python's global random generator
+    seeded from the scene's seed, so that the outcome of each task does not depend
+    on the number of workers. Workers are created by forking the current process,
+    with the same fallback to running the tasks sequentially as `generateMany`.
+    Each worker creates its own simulator by calling **simulatorFactory**, and
+    its simulations have their `Simulation.worker_num` set to the number of the
+    worker (from 1 to **workers**).
+
+    Args:
+        scenario (`Scenario`): Scenario to generate scenes from.
+        n (int): Number of tasks.
+        workers (int): Number of worker processes to use (default is the number of
+            CPUs).
+        simulatorFactory: Function with no arguments returning a `Simulator`. The
+            default is the scenario's `getSimulator` method.
+        seed (int): Seed from which to derive the random streams of the tasks. If
+            not given, a seed is drawn from Python's global random generator.
+        maxSteps (int): Time limit for each simulation, as in `Simulator.simulate`.
+        maxIterations (int): Maximum number of rejection sampling iterations for
+            each scene.
+        maxSimulationIterations (int): Maximum number of simulations to try for each
+            scene before giving up on it (the **maxIterations** argument of
+            `Simulator.simulate`).
+        retries (int): Number of times to retry simulating a scene when creating the
+            simulation fails with a `SimulationCreationError`.
+        verbosity (int): Verbosity level.
+
+    Returns:
+        An iterator yielding a `CampaignRun` for each task as soon as it completes,
+        so not necessarily in order of index.
+    """
+    if seed is None:
+        seed = random.getrandbits(64)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if simulatorFactory is None:
+        simulatorFactory = scenario.getSimulator
+    workers = min(workers, n)
+    options = (maxSteps, maxIterations, maxSimulationIterations, retries, verbosity)
+    context = parallel.forkContext()
+    if workers <= 1 or context is None or scenario.externalSampler is not None:
+        return _runCampaignSequentially(scenario, n, seed, simulatorFactory, options)
+    return _runCampaignInParallel(scenario, n, seed, simulatorFactory, options,
+                                  workers, context)
+
+def _runCampaignSequentially(scenario, n, seed, simulatorFactory, options):
+    simulator = simulatorFactory()
+    try:
+        for index in range(n):
+            yield _runCampaignTask(scenario, simulator, seed, index, options, 0)
+    finally:
+        simulator.destroy()
+
+def _runCampaignInParallel(scenario, n, seed, simulatorFactory, options, workers, context):
+    shared = parallel.SharedObjects(scenario)
+    counter = context.Value('i', 0)
+    initArgs = (counter, scenario, shared, seed, simulatorFactory, options)
+    pool = context.Pool(workers, initializer=_initCampaignWorker, initargs=initArgs)
+    finished = False
+    try:
+        for data in pool.imap_unordered(_runCampaignInWorker, range(n)):
+            yield shared.loads(data)
+        finished = True
+    finally:
+        if finished:    # let the workers exit normally, destroying their simulators
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
+
+def _runCampaignTask(scenario, simulator, seed, index, options, workerNum):
+    maxSteps, maxIterations, maxSimulationIterations, retries, verbosity = options
+    sceneSeed = scenario.sceneSeed(seed, index)
+    scene, iterations = scenario._generateFromSeed(sceneSeed, maxIterations, verbosity)
+    state = random.getstate()
+    try:
+        random.seed(parallel.deriveSeed(sceneSeed, 0))
+        for attempt in range(retries + 1):
+            try:
+                simulation = simulator.simulate(scene, maxSteps=maxSteps,
+                                                maxIterations=maxSimulationIterations,
+                                                verbosity=verbosity)
+                error = None
+                break
+            except SimulationCreationError as e:
+                if verbosity >= 1:
+                    print(f'  Failed to create simulation for task {index}: {e}')
+                simulation, error = None, e
+    finally:
+        random.setstate(state)
+    result = simulation.result if simulation else None
+    return CampaignRun(index, scene, iterations, result, error, workerNum)
+
+## Worker processes for runCampaign
+
+_workerState = None
+_workerSimulator = None
+_workerNum = 0
+
+def _initCampaignWorker(counter, *state):
+    global _workerState, _workerNum
+    with counter.get_lock():
+        counter.value += 1
+        _workerNum = counter.value
+    _workerState = state
+
+def _runCampaignInWorker(index):
+    global _workerSimulator
+    scenario, shared, seed, simulatorFactory, options = _workerState
+    if _workerSimulator is None:
+        # create the simulator here rather than in the initializer, since the pool
+        # would keep restarting workers whose initializer fails
+        _workerSimulator = simulatorFactory()
+        multiprocessing.util.Finalize(None, _workerSimulator.destroy, exitpriority=10)
+    result = _runCampaignTask(scenario, _workerSimulator, seed, index, options,
+                              _workerNum)
+    return shared.dumps(result)
@@ -9,14 +9,16 @@ import collections
 import itertools
 
 import decorator
+import numpy
 import shapely.geometry
+import shapely.prepared
 
 from scenic.core.distributions import (Samplable, Distribution, MethodDistribution,
     needsSampling, makeOperatorHandler, distributionMethod, distributionFunction,
-	RejectionException)
+	RejectionException, underlyingFunction)
 from scenic.core.lazy_eval import valueInContext, needsLazyEvaluation, makeDelayedFunctionCall
 import scenic.core.utils as utils
-from scenic.core.geometry import normalizeAngle
+from scenic.core.geometry import normalizeAngle, rotateVectorArray, BoundingBoxIndex
 
 class VectorDistribution(Distribution):
 	"""A distribution over Vectors."""
@@ -59,6 +61,12 @@ class VectorOperatorDistribution(VectorDistribution):
 		op = getattr(first, self.operator)
 		return op(*rest)
 
+	def batchSampleGiven(self, values):
+		result = batchVectorOperator(self.operator, self.object, self.operands, values)
+		if result is None:
+			return super().batchSampleGiven(values)
+		return result
+
 	def evaluateInner(self, context):
 		obj = valueInContext(self.object, context)
 		operands = tuple(valueInContext(arg, context) for arg in self.operands)
@@ -82,6 +90,16 @@ class VectorMethodDistribution(VectorDistribution):
 		kwargs = { name: value[arg] for name, arg in self.kwargs.items() }
 		return self.method(self.object, *args, **kwargs)
 
+	def batchSampleGiven(self, values):
+		op = self.method.__name__
+		result = None
+		if (not self.kwargs and isinstance(self.object, Vector)
+		    and underlyingFunction(getattr(Vector, op, None)) is self.method):
+			result = batchVectorOperator(op, self.object, self.arguments, values)
+		if result is None:
+			return super().batchSampleGiven(values)
+		return result
+
 	def evaluateInner(self, context):
 		obj = valueInContext(self.object, context)
 		arguments = tuple(valueInContext(arg, context) for arg in self.arguments)
@@ -92,6 +110,50 @@ class VectorMethodDistribution(VectorDistribution):
 		args = utils.argsToString(itertools.chain(self.arguments, self.kwargs.values()))
 		return f'{self.object}.{self.method.__name__}{args}'
 
+## Vectorized operators for batch sampling
+
+def _radialColumn(radius, heading):
+	x, y = -numpy.sin(heading) * radius, numpy.cos(heading) * radius
+	return numpy.stack(numpy.broadcast_arrays(x, y), axis=-1)
+
+# Vector operators which can be applied to columns of vectors (arrays of shape (n, 2))
+# when batch sampling: for each operator, the kinds of its arguments and a function
+# computing the operator on columns.
+_columnOperators = {
+	'rotatedBy': (('scalar',), rotateVectorArray),
+	'offsetRotated': (('scalar', 'vector'),
+	                  lambda self, heading, offset: self + rotateVectorArray(offset, heading)),
+	'offsetRadially': (('scalar', 'scalar'),
+	                   lambda self, radius, heading: self + _radialColumn(radius, heading)),
+	'__add__': (('vector',), lambda self, other: self + other),
+	'__radd__': (('vector',), lambda self, other: self + other),
+	'__sub__': (('vector',), lambda self, other: self - other),
+	'__rsub__': (('vector',), lambda self, other: other - self),
+	'__mul__': (('scalar',), lambda self, other: self * numpy.expand_dims(other, -1)),
+	'__truediv__': (('scalar',), lambda self, other: self / numpy.expand_dims(other, -1)),
+}
+
+def batchVectorOperator(op, obj, args, values):
+	"""Apply a Vector operator to columns of a `BatchedValues`, if possible.
+
+	Returns the resulting column of vectors, or None if the operator or the types
+	of its arguments are not supported.
+	"""
+	signature = _columnOperators.get(op)
+	if signature is None or len(args) != len(signature[0]):
+		return None
+	kinds, function = signature
+	first = values.vectors(obj)
+	columns = [values.vectors(arg) if kind == 'vector' else values.numbers(arg)
+	           for kind, arg in zip(kinds, args)]
+	if first is None or any(column is None for column in columns):
+		return None
+	with numpy.errstate(all='ignore'):
+		result = function(first, *columns)
+	if result.shape != (values.n, 2):
+		return None
+	return result
+
 def scalarOperator(method):
 	"""Decorator for vector operators that yield scalars."""
 	op = method.__name__
@@ -165,6 +227,12 @@ class Vector(Samplable, collections.abc.Sequence):
 	def sampleGiven(self, value):
 		return Vector(*(value[coord] for coord in self.coordinates))
 
+	def batchSampleGiven(self, values):
+		coords = [values.numbers(coord) for coord in self.coordinates]
+		if any(coord is None for coord in coords):
+			return super().batchSampleGiven(values)
+		return numpy.stack([numpy.broadcast_to(coord, values.n) for coord in coords], axis=-1)
+
 	def evaluateInner(self, context):
 		return Vector(*(valueInContext(coord, context) for coord in self.coordinates))
 
@@ -364,6 +432,10 @@ class PolygonalVectorField(VectorField):
 			specified headings, if any (default :obj:`None`).
 		defaultHeading: heading for points not contained in any cell (default
 			:obj:`None`, meaning reject such points).
+
+	If several cells contain a point, the first one takes precedence. Cells are found
+	using a spatial index over their bounding boxes, built the first time the field
+	is evaluated.
 	"""
 	def __init__(self, name, cells, headingFunction=None, defaultHeading=None):
 		self.cells = tuple(cells)
@@ -374,12 +446,26 @@ class PolygonalVectorField(VectorField):
 			if heading is None and headingFunction is None and defaultHeading is None:
 				raise RuntimeError(f'missing heading for cell of PolygonalVectorField')
 		self.defaultHeading = defaultHeading
+		self._index = None
 		super().__init__(name, self.valueAt)
 
+	def _buildIndex(self):
+		index = BoundingBoxIndex(cell.bounds for cell, heading in self.cells)
+		prepared = tuple(shapely.prepared.prep(cell) for cell, heading in self.cells)
+		self._index = (index, prepared)
+		return self._index
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['_index'] = None
+		return state
+
 	def valueAt(self, pos):
+		index, prepared = self._index or self._buildIndex()
 		point = shapely.geometry.Point(pos)
-		for cell, heading in self.cells:
-			if cell.intersects(point):
+		for i in index.candidates(point.coords[0]):
+			if prepared[i].intersects(point):
+				heading = self.cells[i][1]
 				return self.headingFunction(pos) if heading is None else heading
 		if self.defaultHeading is not None:
 			return self.defaultHeading
@@ -402,12 +488,27 @@ class PiecewiseVectorField(VectorField):
 	def __init__(self, name, regions, defaultHeading=None):
 		self.regions = tuple(regions)
 		self.defaultHeading = defaultHeading
+		self._index = None
 		super().__init__(name, self.valueAt)
 
 	def valueAt(self, point):
-		for region in self.regions:
+		regions = self.regions
+		for i in (self._index or self._buildIndex()).candidates(point):
+			region = regions[i]
 			if region.containsPoint(point) and region.orientation:
 				return region.orientation[point]
 		if self.defaultHeading is not None:
 			return self.defaultHeading
 		raise RejectionException(f'evaluated PiecewiseVectorField at undefined point')
+
+	def _buildIndex(self):
+		# The boxes of the regions are found without computing regions which are
+		# computed lazily (e.g. unions), and the regions' orientations are only checked
+		# when evaluating the field, so that building the index does not force them
+		self._index = BoundingBoxIndex(region._boundingBox() for region in self.regions)
+		return self._index
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['_index'] = None
+		return state
@@ -1,5 +1,7 @@
 """Workspaces."""
 
+import random
+
 from scenic.core.distributions import needsSampling
 from scenic.core.regions import Region, everywhere
 from scenic.core.geometry import findMinMax
@@ -48,8 +50,8 @@ class Workspace(Region):
 		"""Convert Scenic coordinates to those used for schematic rendering."""
 		return coords
 
-	def uniformPointInner(self):
-		return self.region.uniformPointInner()
+	def uniformPointInner(self, rng=random):
+		return self.region._uniformPointWithRNG(rng)
 
 	def intersect(self, other, triedReversed=False):
 		return self.region.intersect(other, triedReversed)
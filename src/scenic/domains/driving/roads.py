@@ -20,18 +20,24 @@ import numbers
 from typing import FrozenSet, Union, Tuple, Optional, Sequence, List
 import itertools
 import pathlib
-import gzip
+import mmap
+import os
 import pickle
 import time
 import struct
 import weakref
 
 import attr
+import numpy
+import shapely.geometry
+import shapely.prepared
 from shapely.geometry import Polygon, MultiPolygon
 
 from scenic.core.distributions import distributionFunction, distributionMethod
-from scenic.core.vectors import Vector, VectorField
-from scenic.core.regions import PolygonalRegion, PolylineRegion
+from scenic.core.vectors import (Vector, VectorField, PolygonalVectorField,
+                                  PiecewiseVectorField)
+from scenic.core.regions import (PolygonalRegion, PolylineRegion, PolygonalUnionRegion,
+                                 EmptyRegion, nowhere)
 from scenic.core.object_types import Point
 import scenic.core.geometry as geometry
 import scenic.core.utils as utils
@@ -62,6 +68,17 @@ def _rejectIfNonexistent(element, name='network element'):
         _rejectSample(f'requested {name} does not exist')
     return element
 
+def _constantHeading(polyline, tolerance=1e-9):
+    """Heading of a polyline all of whose segments point the same way, or None."""
+    segments = polyline.segments
+    start, end = segments[0]
+    heading = Vector(*start).angleTo(Vector(*end))
+    ends = numpy.array([(tuple(start)[:2], tuple(end)[:2]) for start, end in segments])
+    dx, dy = (ends[:, 1] - ends[:, 0]).T
+    deviations = numpy.arctan2(dy, dx) - (math.pi / 2) - heading
+    deviations = numpy.remainder(deviations + math.pi, math.tau) - math.pi
+    return heading if numpy.all(numpy.abs(deviations) <= tolerance) else None
+
 class _ElementReferencer:
     """Mixin class to improve pickling of classes that reference network elements.
 
@@ -69,7 +86,9 @@ class _ElementReferencer:
     """
     def __getstate__(self):
         if hasattr(super(), '__getstate__'):
-            state = super().__getstate__()
+            # copy the state, since object.__getstate__ (Python 3.11+) returns the
+            # instance's own __dict__
+            state = super().__getstate__().copy()
         else:
             state = self.__dict__.copy()
         # replace links to network elements by placeholders to prevent deep
@@ -88,6 +107,348 @@ class _ElementPlaceholder:
     def __init__(self, uid):
         self.uid = uid
 
+class _LazyElements:
+    """The states of the elements of a network stored in a memory-mapped cache file.
+
+    Each state is a separate pickle, stored uncompressed from **offsets** [i] to
+    **offsets** [i+1] of the file, so that processes loading the same file share its
+    pages. Links between elements are not pickled but stored in integer tables:
+    the attributes of element *i* linking to other elements are the links
+    **linkStarts** [i] to **linkStarts** [i+1]; link *k* is the attribute named by
+    **linkNames** [**linkKeys** [k]], and its targets are the positions of elements
+    **linkTargets** [**linkTargetStarts** [k] : **linkTargetStarts** [k+1]]. Other
+    references to network elements, and to objects shared between elements
+    (maneuvers and signals), are replaced in the pickles by their positions in the
+    **elements** and **shared** tables (the latter using negative positions, starting
+    from -1), and geometry by its position in the table saved by `_GeometryTable`.
+    All the tables are arrays mapped directly from the file; only `load` copies data
+    out of it.
+
+    Elements which have not been loaded yet only have their ``uid`` and ``network``
+    attributes; **fields** maps each class of element to the names of the other
+    attributes saved for elements of that class, which are the ones whose access
+    triggers loading.
+
+    :meta private:
+    """
+    def __init__(self, data, arrays, fields, linkNames, elements, shared=None):
+        self.data = data
+        self.arrays = arrays
+        self.fields = fields
+        self.linkNames = linkNames
+        self.elements = elements
+        self.shared = shared
+
+    def shell(self, position, cls, uid):
+        """Create an element whose state will be loaded when first needed."""
+        elem = cls.__new__(cls)
+        elem.__dict__.update(uid=uid, _lazySource=self, _lazyPosition=position)
+        return elem
+
+    def isField(self, elem, name):
+        """Whether accessing the given attribute of an unloaded element should load it."""
+        return name in self.fields.get(type(elem), ())
+
+    def boundingBox(self, elem):
+        """Bounding box of an unloaded element, as saved in the cache."""
+        box = self.arrays['boxes'][elem.__dict__['_lazyPosition']]
+        return () if numpy.isnan(box[0]) else tuple(box.tolist())
+
+    def load(self, elem):
+        position = elem.__dict__.pop('_lazyPosition')
+        arrays = self.arrays
+        start, end = arrays['offsets'][position:position+2].tolist()
+        state = self.unpickle(io.BytesIO(self.data[start:end]))
+        first, last = arrays['linkStarts'][position:position+2].tolist()
+        if first < last:
+            keys = arrays['linkKeys'][first:last].tolist()
+            bounds = arrays['linkTargetStarts'][first:last+1].tolist()
+            base = bounds[0]
+            targets = arrays['linkTargets'][base:bounds[-1]].tolist()
+            for key, start, end in zip(keys, bounds, bounds[1:]):
+                name, kind = self.linkNames[key]
+                linked = [self.elements[target] for target in targets[start-base:end-base]]
+                state[name] = linked[0] if kind is None else kind(linked)
+        elem.__dict__.update(state)
+
+    def unpickle(self, stream):
+        """Unpickle an object from the stream, resolving references to the tables."""
+        geometries = {}     # preserve the identity of geometry used several times
+        def resolve(key):
+            if isinstance(key, tuple):
+                position, = key
+                geometry = geometries.get(position)
+                if geometry is None:
+                    geometry = _GeometryTable.build(self.arrays, position)
+                    geometries[position] = geometry
+                return geometry
+            if key < 0:
+                return self.shared[-1 - key]
+            return self.elements[key]
+        unpickler = pickle.Unpickler(stream)
+        unpickler.persistent_load = resolve
+        return unpickler.load()
+
+class _GeometryTable:
+    """Table of the geometry of a cached network, stored as flat arrays.
+
+    The table holds shapely `LineString`, `Polygon`, and `MultiPolygon` objects,
+    tuples of points (as in the ``points`` attribute of regions), and `PolylineRegion`
+    objects which were created from such tuples and not modified afterward (these are
+    rebuilt from their points, rather than pickled with the segments and lengths
+    computed from them). Geometry *g* of kind **geometryKinds** [g] consists of the polygons **geometryParts** [g] to
+    **geometryParts** [g+1], polygon *p* of the rings **partRings** [p] to
+    **partRings** [p+1] (the first being its exterior), and ring *r* of the points
+    **coords** [**ringEnds** [r] : **ringEnds** [r+1]]; line strings, tuples of
+    points, and polylines have a single polygon with a single ring.
+
+    :meta private:
+    """
+    # Tuples of points and polylines have two kinds, depending on whether the points
+    # themselves are tuples or lists
+    (pointsKind, pointListsKind, polylineKind, polylineListsKind,
+     lineKind, polygonKind, multiPolygonKind) = range(7)
+
+    # Attributes of a PolylineRegion created from points, which the table can rebuild
+    _polylineAttributes = frozenset((
+        'usingDefaultOrientation', 'orientation', 'name', 'points', 'lineString',
+        'segments', 'cumulativeLengths', '_dependencies', '_requiredProperties',
+        '_conditioned'
+    ))
+
+    def __init__(self):
+        self.positions = {}
+        self.geometries = []    # keep the geometry alive, so that ids stay unique
+        self.kinds, self.parts, self.rings, self.ends = [], [0], [0], [0]
+        self.coords = []
+        self.numCoords = 0
+
+    def add(self, obj):
+        """Add an object to the table, returning its position (or None if it is not
+        geometry which can be stored in the table)."""
+        position = self.positions.get(id(obj))
+        if position is not None:
+            return position
+        if type(obj) is tuple:
+            pointType = self._pointTypeOf(obj) if len(obj) > 2 else None
+            if pointType is None:
+                return None
+            kind = self.pointsKind if pointType is tuple else self.pointListsKind
+            polygons = [[obj]]
+        elif type(obj) is PolylineRegion:
+            pointType = self._pointTypeOf(obj.points) if self._isPlain(obj) else None
+            if pointType is None:
+                return None
+            kind = self.polylineKind if pointType is tuple else self.polylineListsKind
+            polygons = [[obj.points]]
+        elif isinstance(obj, (shapely.geometry.LineString, Polygon, MultiPolygon)):
+            if obj.is_empty or obj.has_z:
+                return None
+            if isinstance(obj, shapely.geometry.LineString):
+                kind, polygons = self.lineKind, [[obj.coords]]
+            elif isinstance(obj, Polygon):
+                kind, polygons = self.polygonKind, [self._ringsOf(obj)]
+            else:
+                kind = self.multiPolygonKind
+                polygons = [self._ringsOf(polygon) for polygon in obj.geoms]
+        else:
+            return None
+        for rings in polygons:
+            for ring in rings:
+                coords = numpy.array(ring, dtype=float).reshape(-1, 2)
+                self.coords.append(coords)
+                self.numCoords += len(coords)
+                self.ends.append(self.numCoords)
+            self.rings.append(len(self.ends) - 1)
+        self.parts.append(len(self.rings) - 1)
+        self.kinds.append(kind)
+        position = len(self.geometries)
+        self.positions[id(obj)] = position
+        self.geometries.append(obj)
+        return position
+
+    @staticmethod
+    def _pointTypeOf(points):
+        """Type of the points of a tuple of 2D points (tuple or list), if it is one."""
+        if type(points) is not tuple or not points:
+            return None
+        pointType = type(points[0])
+        if pointType not in (tuple, list):
+            return None
+        for point in points:
+            if not (type(point) is pointType and len(point) == 2
+                    and type(point[0]) is float and type(point[1]) is float):
+                return None
+        return pointType
+
+    @classmethod
+    def _isPlain(cls, polyline):
+        return (polyline.__dict__.keys() == cls._polylineAttributes
+                and polyline.usingDefaultOrientation and polyline.name is None
+                and polyline._conditioned is polyline and not polyline._dependencies
+                and not polyline._requiredProperties)
+
+    @staticmethod
+    def _ringsOf(polygon):
+        return [polygon.exterior.coords] + [ring.coords for ring in polygon.interiors]
+
+    def arrays(self):
+        coords = numpy.concatenate(self.coords) if self.coords else numpy.empty((0, 2))
+        return {
+            'geometryKinds': numpy.array(self.kinds, dtype=numpy.uint8),
+            'geometryParts': numpy.array(self.parts, dtype=numpy.int64),
+            'partRings': numpy.array(self.rings, dtype=numpy.int64),
+            'ringEnds': numpy.array(self.ends, dtype=numpy.int64),
+            'coords': coords,
+        }
+
+    @classmethod
+    def build(cls, arrays, position):
+        """Build geometry from the arrays of a table."""
+        kind = int(arrays['geometryKinds'][position])
+        first, last = arrays['geometryParts'][position:position+2].tolist()
+        rings = arrays['partRings'][first:last+1].tolist()
+        ends = arrays['ringEnds'][rings[0]:rings[-1]+1].tolist()
+        coords = arrays['coords']
+        ringCoords = [coords[start:end] for start, end in zip(ends, ends[1:])]
+        if kind < cls.lineKind:
+            points = ringCoords[0].tolist()
+            if kind in (cls.pointsKind, cls.polylineKind):
+                points = map(tuple, points)
+            points = tuple(points)
+            if kind in (cls.polylineKind, cls.polylineListsKind):
+                return PolylineRegion(points)
+            return points
+        if kind == cls.lineKind:
+            return shapely.geometry.LineString(ringCoords[0])
+        base = rings[0]
+        polygons = [Polygon(ringCoords[start-base], ringCoords[start-base+1:end-base])
+                    for start, end in zip(rings, rings[1:])]
+        return polygons[0] if kind == cls.polygonKind else MultiPolygon(polygons)
+
+def _writeArrays(f, arrays):
+    """Write arrays to a file so that they can be mapped by `_mapArrays`.
+
+    Returns the layout of the arrays, to be passed to `_mapArrays`.
+    """
+    layout = {}
+    for name, array in arrays.items():
+        array = numpy.ascontiguousarray(array)
+        f.write(bytes(-f.tell() % 64))     # align the array
+        layout[name] = (array.dtype.str, array.shape, f.tell())
+        f.write(array.tobytes())
+    return layout
+
+def _mapArrays(data, layout):
+    """Map arrays written by `_writeArrays` from a buffer, without copying them."""
+    arrays = {}
+    for name, (dtype, shape, offset) in layout.items():
+        count = int(numpy.prod(shape))
+        array = numpy.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        arrays[name] = array.reshape(shape)
+    return arrays
+
+class _ElementIndex:
+    """Spatial index over the bounding boxes of a sequence of network elements.
+
+    :meta private:
+    """
+    def __init__(self, elements, boxes=None):
+        self.elements = tuple(elements)
+        if boxes is None:
+            boxes = (elem._boundingBox() for elem in self.elements)
+        self.index = geometry.BoundingBoxIndex(boxes)
+
+    def candidates(self, point, tolerance=0):
+        """Elements whose bounding boxes lie within **tolerance** of the point.
+
+        The elements are returned in their original order.
+        """
+        elements = self.elements
+        return [elements[i] for i in self.index.candidates(point, tolerance)]
+
+class _LookupGrid:
+    """Raster of a sequence of network elements, for point location in constant time.
+
+    Each cell of the grid stores either the position of the element which
+    `Network.findPointIn` finds for every point in the cell (when that element covers
+    the cell and no earlier element comes near it), or a list of the positions of the
+    candidate elements which come within **tolerance** of the cell, to be tested
+    exactly. The grid stores positions rather than elements so that it can be pickled
+    independently of them.
+
+    :meta private:
+    """
+    def __init__(self, elements, cellSize, tolerance):
+        self.cellSize = cellSize
+        bounds = numpy.array([elem.polygons.bounds for elem in elements], dtype=float)
+        if len(bounds) == 0:
+            bounds = numpy.zeros((1, 4))
+        minx, miny = bounds[:, :2].min(axis=0) - tolerance
+        maxx, maxy = bounds[:, 2:].max(axis=0) + tolerance
+        self.origin = (minx, miny)
+        width = max(1, math.ceil((maxx - minx) / cellSize))
+        height = max(1, math.ceil((maxy - miny) / cellSize))
+        # codes: -1 for no candidates, i >= 0 for element i, and -2-k for the kth list
+        codes = numpy.full((height, width), -1, dtype=numpy.int32)
+        cells = {}
+        for position, elem in enumerate(elements):
+            prepared = shapely.prepared.prep(elem.polygons)
+            ex0, ey0, ex1, ey1 = elem.polygons.bounds
+            x0, y0 = self._cellOf(ex0 - tolerance, ey0 - tolerance)
+            x1, y1 = self._cellOf(ex1 + tolerance, ey1 + tolerance)
+            for j in range(max(y0, 0), min(y1, height - 1) + 1):
+                cy = miny + j * cellSize
+                for i in range(max(x0, 0), min(x1, width - 1) + 1):
+                    cx = minx + i * cellSize
+                    near = shapely.geometry.box(cx - tolerance, cy - tolerance,
+                                                cx + cellSize + tolerance,
+                                                cy + cellSize + tolerance)
+                    if not prepared.intersects(near):
+                        continue
+                    candidates = cells.get((i, j))
+                    if candidates is None:
+                        cell = shapely.geometry.box(cx, cy, cx + cellSize, cy + cellSize)
+                        covers = prepared.covers(cell)
+                        cells[i, j] = [covers, position]
+                    else:
+                        candidates.append(position)
+        lists, listCodes = [], {}
+        for (i, j), (covers, *candidates) in cells.items():
+            if covers:
+                codes[j, i] = candidates[0]
+            else:
+                candidates = tuple(candidates)
+                code = listCodes.get(candidates)
+                if code is None:
+                    code = listCodes[candidates] = -2 - len(lists)
+                    lists.append(candidates)
+                codes[j, i] = code
+        self.codes = codes
+        self.candidateLists = lists
+
+    def _cellOf(self, x, y):
+        size = self.cellSize
+        return math.floor((x - self.origin[0]) / size), math.floor((y - self.origin[1]) / size)
+
+    def lookup(self, point):
+        """Look up the cell containing a point.
+
+        Returns:
+            Either the position of the element found at the point, or a tuple of the
+            positions of the candidate elements for the point.
+        """
+        i, j = self._cellOf(*point)
+        height, width = self.codes.shape
+        if not (0 <= i < width and 0 <= j < height):
+            return ()
+        code = int(self.codes[j, i])
+        if code >= 0:
+            return code
+        if code == -1:
+            return ()
+        return self.candidateLists[-2 - code]
+
 ## Metadata
 
 @enum.unique
@@ -239,10 +600,37 @@ class NetworkElement(_ElementReferencer, PolygonalRegion):
         return (self.orientation[_toVector(point)],)
 
     def __getstate__(self):
+        self._materialize()
         state = super().__getstate__()
         del state['network']    # do not pickle weak reference to parent network
         return state
 
+    def __getattr__(self, name):
+        # Only called for attributes which are not set, i.e. all but uid and network
+        # for elements of cached networks which have not been loaded yet; we load
+        # the element only if the attribute is one of those saved in the cache
+        source = self.__dict__.get('_lazySource')
+        if source is None or not source.isField(self, name):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        self._materialize()
+        return getattr(self, name)
+
+    def _boundingBox(self):
+        # use the bounding box saved in the cache, if the element is not loaded yet
+        source = self.__dict__.get('_lazySource')
+        if source is not None:
+            return source.boundingBox(self)
+        return super()._boundingBox()
+
+    def _materialize(self):
+        """Load the state of this element, if it was deferred by `Network.fromPickle`.
+
+        :meta private:
+        """
+        source = self.__dict__.pop('_lazySource', None)
+        if source is not None:
+            source.load(self)
+
     def __repr__(self):
         s = f'<{type(self).__name__} at {hex(id(self))}; '
         if self.name:
@@ -388,7 +776,7 @@ class Road(LinearElement):
     @distributionFunction
     def sectionAt(self, point: Vectorlike, reject=False) -> Union[RoadSection, None]:
         """Get the `RoadSection` passing through a given point."""
-        return self.network.findPointIn(point, self.sections, reject)
+        return self.network._findPointIn(point, self.sections, reject)
 
     @distributionFunction
     def laneSectionAt(self, point: Vectorlike, reject=False) -> Union[LaneSection, None]:
@@ -400,17 +788,17 @@ class Road(LinearElement):
     @distributionFunction
     def laneAt(self, point: Vectorlike, reject=False) -> Union[Lane, None]:
         """Get the `Lane` passing through a given point."""
-        return self.network.findPointIn(point, self.lanes, reject)
+        return self.network._findPointIn(point, self.lanes, reject)
 
     @distributionFunction
     def laneGroupAt(self, point: Vectorlike, reject=False) -> Union[LaneGroup, None]:
         """Get the `LaneGroup` passing through a given point."""
-        return self.network.findPointIn(point, self.laneGroups, reject)
+        return self.network._findPointIn(point, self.laneGroups, reject)
 
     @distributionFunction
     def crossingAt(self, point: Vectorlike, reject=False) -> Union[PedestrianCrossing, None]:
         """Get the :obj:`.PedestrianCrossing` passing through a given point."""
-        return self.network.findPointIn(point, self.crossings, reject)
+        return self.network._findPointIn(point, self.crossings, reject)
 
     @distributionFunction
     def shiftLanes(self, point: Vectorlike, offset: int) -> Union[Vector, None]:
@@ -471,7 +859,7 @@ class LaneGroup(LinearElement):
     @distributionFunction
     def laneAt(self, point: Vectorlike, reject=False) -> Union[Lane, None]:
         """Get the `Lane` passing through a given point."""
-        return self.network.findPointIn(point, self.lanes, reject)
+        return self.network._findPointIn(point, self.lanes, reject)
 
 @attr.s(auto_attribs=True, kw_only=True, eq=False, repr=False)
 class Lane(_ContainsCenterline, LinearElement):
@@ -491,7 +879,7 @@ class Lane(_ContainsCenterline, LinearElement):
     @distributionFunction
     def sectionAt(self, point: Vectorlike, reject=False) -> Union[LaneSection, None]:
         """Get the LaneSection passing through a given point."""
-        return self.network.findPointIn(point, self.sections, reject)
+        return self.network._findPointIn(point, self.sections, reject)
 
     # TODO remove hack; freeze all these classes
     __hash__ = object.__hash__
@@ -549,7 +937,7 @@ class RoadSection(LinearElement):
     @distributionFunction
     def laneAt(self, point: Vectorlike, reject=False) -> Union[LaneSection, None]:
         """Get the lane section passing through a given point."""
-        return self.network.findPointIn(point, self.lane, reject)
+        return self.network._findPointIn(point, self.lane, reject)
 
 @attr.s(auto_attribs=True, kw_only=True, repr=False)
 class LaneSection(_ContainsCenterline, LinearElement):
@@ -714,6 +1102,11 @@ class Signal:
         """bool: Whether or not this signal is a traffic light."""
         return self.type == "1000001"
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('network', None)  # do not pickle weak reference to parent network
+        return state
+
 @attr.s(auto_attribs=True, kw_only=True, repr=False)
 class Network:
     """Network()
@@ -770,6 +1163,9 @@ class Network:
     shoulderRegion: PolygonalRegion = None
 
     #: Traffic flow vector field aggregated over all roads (0 elsewhere).
+    #:
+    #: By default this is a `PolygonalVectorField` whose cells of constant heading are
+    #: the straight lanes of the network, so that it can be used for pruning.
     roadDirection: VectorField = None
 
     def __attrs_post_init__(self):
@@ -782,23 +1178,42 @@ class Network:
         self.roadSections = tuple(sec for road in self.roads for sec in road.sections)
         self.laneSections = tuple(sec for lane in self.lanes for sec in lane.sections)
 
+        # The aggregate regions are only computed when first used (see
+        # PolygonalUnionRegion), since many scenarios never use some of them
+        def union(regions):
+            return PolygonalRegion.unionAll(regions, lazy=True)
         if self.roadRegion is None:
-            self.roadRegion = PolygonalRegion.unionAll(self.roads)
+            self.roadRegion = union(self.roads)
         if self.laneRegion is None:
-            self.laneRegion = PolygonalRegion.unionAll(self.lanes)
+            self.laneRegion = union(self.lanes)
         if self.intersectionRegion is None:
-            self.intersectionRegion = PolygonalRegion.unionAll(self.intersections)
+            self.intersectionRegion = union(self.intersections)
         if self.crossingRegion is None:
-            self.crossingRegion = PolygonalRegion.unionAll(self.crossings)
+            self.crossingRegion = union(self.crossings)
         if self.sidewalkRegion is None:
-            self.sidewalkRegion = PolygonalRegion.unionAll(self.sidewalks)
+            self.sidewalkRegion = union(self.sidewalks)
         if self.shoulderRegion is None:
-            self.shoulderRegion = PolygonalRegion.unionAll(self.shoulders)
+            self.shoulderRegion = union(self.shoulders)
+
+        # Find the lanes with constant headings, which become cells of the polygonal
+        # vector fields below (allowing pruning of scenarios using them)
+        laneHeadings = {lane: _constantHeading(lane.centerline) for lane in self.lanes}
 
         if self.drivableRegion is None:
-            self.drivableRegion = self.laneRegion.union(self.intersectionRegion)
+            parts = [region for region in (self.laneRegion, self.intersectionRegion)
+                     if not isinstance(region, EmptyRegion)]
+            if not parts:
+                self.drivableRegion = nowhere   # e.g. loaded with bounds missing all roads
+            else:
+                # equivalent to the default orientation of the union, which uses the
+                # orientation of the first lane containing the point (if any)
+                lanesField = PiecewiseVectorField('lanes', self.lanes)
+                cells = [(lane.polygon, laneHeadings[lane]) for lane in self.lanes]
+                orientation = PolygonalVectorField('laneDirection', cells,
+                                                   headingFunction=lanesField.valueAt)
+                self.drivableRegion = PolygonalUnionRegion(parts, orientation=orientation)
         if self.walkableRegion is None:
-            self.walkableRegion = self.sidewalkRegion.union(self.crossingRegion)
+            self.walkableRegion = union((self.sidewalkRegion, self.crossingRegion))
 
         if self.curbRegion is None:
             edges = []
@@ -810,8 +1225,68 @@ class Network:
             self.curbRegion = PolylineRegion.unionAll(edges)
 
         if self.roadDirection is None:
-            # TODO replace with a PolygonalVectorField for better pruning
-            self.roadDirection = VectorField('roadDirection', self._defaultRoadDirection)
+            self.roadDirection = PolygonalVectorField('roadDirection',
+                                                      self._roadDirectionCells(laneHeadings),
+                                                      headingFunction=self._defaultRoadDirection,
+                                                      defaultHeading=0)
+
+        self._lookupGrids = {}
+        self._buildSpatialIndices()
+
+    #: Lists of elements indexed to speed up `findPointIn`.
+    _indexedElements = ('allRoads', 'lanes', 'intersections')
+
+    def _buildSpatialIndices(self, boxes=None):
+        # Index the lists of elements searched by roadAt, laneAt, etc., keyed by the
+        # ids of the lists; the STRtrees are rebuilt rather than pickled, but the
+        # lookup grids (if any) are pickled since they are expensive to compute.
+        # If given, boxes maps uids to bounding boxes (saving us from loading the
+        # elements of cached networks).
+        self._spatialIndices = {}
+        for name in self._indexedElements:
+            elems = getattr(self, name)
+            grid = self._lookupGrids.get(name)
+            elemBoxes = None if boxes is None else [boxes[elem.uid] for elem in elems]
+            index = _ElementIndex(elems, elemBoxes)
+            self._spatialIndices[id(elems)] = (elems, index, grid)
+
+    def buildLookupGrid(self, cellSize: float = 1):
+        """Precompute rasters of the network to speed up queries like `laneAt`.
+
+        For each kind of element searched by `roadAt`, `laneAt`, and `intersectionAt`,
+        this computes a grid recording, for each cell, the element found at every point
+        of the cell if it is unique, and otherwise a short list of candidates. Queries
+        in the interior of elements then take constant time. The grids are saved
+        in cached versions of the network (see `fromFile`).
+
+        Args:
+            cellSize: Side length of the grid cells, in meters.
+        """
+        self._lookupGrids = {
+            name: _LookupGrid(getattr(self, name), cellSize, self.tolerance)
+            for name in self._indexedElements
+        }
+        self._buildSpatialIndices()
+
+    @property
+    def lookupGridCellSize(self) -> Optional[float]:
+        """Cell size of the lookup grids built by `buildLookupGrid`, if any."""
+        grids = self._lookupGrids
+        return next(iter(grids.values())).cellSize if grids else None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_spatialIndices']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._spatialIndices = None     # rebuilt when first needed
+
+    def _getSpatialIndices(self):
+        if self._spatialIndices is None:
+            self._buildSpatialIndices()
+        return self._spatialIndices
 
     def _defaultRoadDirection(self, point):
         """Default value for the `roadDirection` vector field.
@@ -822,6 +1297,33 @@ class Network:
         road = self.roadAt(point)
         return 0 if road is None else road.orientation[point]
 
+    def _roadDirectionCells(self, laneHeadings):
+        """Cells of the default `roadDirection` vector field.
+
+        Each road contributes a cell of constant heading for each of its straight lanes,
+        followed by a cell covering the rest of the road (up to the tolerance) where
+        the heading is computed by `_defaultRoadDirection`.
+
+        :meta private:
+        """
+        cells = []
+        for road in self.allRoads:
+            straight = []
+            for group in road.laneGroups:
+                for lane in group.lanes:
+                    heading = laneHeadings[lane]
+                    if heading is not None:
+                        straight.append(lane.polygon)
+                        cells.append((lane.polygon, heading))
+            rest = road.polygon
+            if self.tolerance > 0:
+                rest = rest.buffer(self.tolerance)
+            if straight:
+                rest = rest.difference(geometry.polygonUnion(straight))
+            if not rest.is_empty:
+                cells.append((rest, None))
+        return cells
+
     #: File extension for cached versions of processed networks.
     pickledExt = '.snet'
 
@@ -837,14 +1339,17 @@ class Network:
 
         :meta private:
         """
-        return 16
+        return 26
 
     class DigestMismatchError(Exception):
         """Exception raised when loading a cached map not matching the original file."""
         pass
 
     @classmethod
-    def fromFile(cls, path, useCache:bool = True, writeCache:bool = True, **kwargs):
+    def fromFile(cls, path, useCache:bool = True, writeCache:bool = True,
+                 lookupGridCellSize:Optional[float] = None,
+                 bounds:Optional[Tuple[float, float, float, float]] = None,
+                 margin:float = 0, **kwargs):
         """Create a `Network` from a map file.
 
         This function calls an appropriate parsing routine based on the extension of the
@@ -865,6 +1370,14 @@ class Network:
                 changes, the cached version will still not be used).
             writeCache: Whether to save a cached version of the processed map
                 after parsing has finished (default true).
+            lookupGridCellSize: If not `None`, build lookup grids with this cell size
+                using `buildLookupGrid` (default `None`). The grids are saved in the
+                cached version of the map, and only rebuilt if the cell size changes.
+            bounds: If not `None`, a tuple ``(xmin, ymin, xmax, ymax)``; only the part
+                of the map within this box is loaded (see `Network.fromOpenDrive`).
+                The cached version of the map is only used if it was loaded with the
+                same bounds and margin.
+            margin: Distance by which to expand **bounds** (default 0).
             kwargs: Additional keyword arguments specific to particular map formats.
 
         Raises:
@@ -903,20 +1416,38 @@ class Network:
         # Otherwise, hash the underlying file to detect when the pickle is outdated
         with open(path, 'rb') as f:
             data = f.read()
-        digest = hashlib.blake2b(data).digest()
+        hasher = hashlib.blake2b(data)
+        if bounds is not None:
+            bounds = tuple(float(coord) for coord in bounds)
+            hasher.update(struct.pack('<5d', *bounds, margin))
+        digest = hasher.digest()
 
         # By default, use the pickled version if it exists and is not outdated
         pickledPath = path.with_suffix(cls.pickledExt)
         if useCache and pickledPath.exists():
             try:
-                return cls.fromPickle(pickledPath, originalDigest=digest)
+                network = cls.fromPickle(pickledPath, originalDigest=digest)
             except pickle.UnpicklingError:
                 verbosePrint('Unable to load cached network (old format or corrupted).')
             except cls.DigestMismatchError:
                 verbosePrint('Cached network does not match original file; ignoring it.')
+            else:
+                if (lookupGridCellSize is None
+                    or network.lookupGridCellSize == lookupGridCellSize):
+                    return network
+                verbosePrint('Computing lookup grids for cached network...')
+                network.buildLookupGrid(lookupGridCellSize)
+                if writeCache:
+                    network.dumpPickle(pickledPath, digest)
+                return network
 
         # Not using the pickled version; parse the original file based on its extension
+        if bounds is not None:
+            kwargs.update(bounds=bounds, margin=margin)
         network = handlers[ext](path, **kwargs)
+        if lookupGridCellSize is not None:
+            verbosePrint('Computing lookup grids...')
+            network.buildLookupGrid(lookupGridCellSize)
         if writeCache:
             verbosePrint(f'Caching road network in {cls.pickledExt} file.')
             network.dumpPickle(path.with_suffix(cls.pickledExt), digest)
@@ -925,7 +1456,10 @@ class Network:
     @classmethod
     def fromOpenDrive(cls, path, ref_points:int = 20, tolerance:float = 0.05,
                       fill_gaps:bool = True, fill_intersections:bool = True,
-                      elide_short_roads:bool = False):
+                      elide_short_roads:bool = False, workers:int = 1,
+                      stream:bool = False,
+                      bounds:Optional[Tuple[float, float, float, float]] = None,
+                      margin:float = 0):
         """Create a `Network` from an OpenDRIVE file.
 
         Args:
@@ -938,6 +1472,16 @@ class Network:
                 intersections.
             elide_short_roads: Whether to attempt to fix geometry artifacts by
                 eliding roads with length less than **tolerance**.
+            workers: Number of processes to use to compute the geometry of the
+                roads (on platforms supporting ``fork``). The resulting network is
+                the same for any number of workers.
+            stream: Whether to read the file incrementally, so that the memory used
+                for parsing is bounded by the largest road rather than the whole file.
+            bounds: If not `None`, a tuple ``(xmin, ymin, xmax, ymax)`` giving a box
+                in map coordinates: only roads whose reference lines pass within
+                **margin** of the box are loaded. Links to roads which are not loaded
+                are cut, so that the resulting network is self-contained.
+            margin: Distance by which to expand **bounds** (default 0).
         """
         import scenic.formats.opendrive.xodr_parser as xodr_parser
         road_map = xodr_parser.RoadMap(tolerance=tolerance,
@@ -945,9 +1489,10 @@ class Network:
                                        elide_short_roads=elide_short_roads)
         startTime = time.time()
         verbosePrint('Parsing OpenDRIVE file...')
-        road_map.parse(path)
+        road_map.parse(path, stream=stream, bounds=bounds, margin=margin)
         verbosePrint('Computing road geometry... (this may take a while)')
-        road_map.calculate_geometry(ref_points, calc_gap=fill_gaps, calc_intersect=True)
+        road_map.calculate_geometry(ref_points, calc_gap=fill_gaps, calc_intersect=True,
+                                    workers=workers)
         network = road_map.toScenicNetwork()
         totalTime = time.time() - startTime
         verbosePrint(f'Finished loading OpenDRIVE map in {totalTime:.2f} seconds.')
@@ -955,6 +1500,12 @@ class Network:
 
     @classmethod
     def fromPickle(cls, path, originalDigest=None):
+        """Load a cached network saved by `dumpPickle`.
+
+        The file is memory-mapped, and the network elements are only unpickled when
+        first used (so that networks can be loaded quickly, and processes loading the
+        same file share its pages, which are never copied except to load elements).
+        """
         startTime = time.time()
         verbosePrint('Loading cached version of road network...')
 
@@ -974,45 +1525,159 @@ class Network:
                     f'{cls.pickledExt} file does not correspond to the original map; '
                     ' regenerate it'
                 )
-            with gzip.open(f) as gf:
-                try:
-                    network = pickle.load(gf)
-                except pickle.UnpicklingError:
-                    raise    # propagate unpickling errors
-                except Exception as e:
-                    # convert various other ways unpickling can fail into a more
-                    # standard exception
-                    raise pickle.UnpicklingError('unpickling failed') from e
-
-        # Reconnect links between network elements
-        def reconnect(thing):
-            state = thing.__dict__
-            for key, value in state.items():
-                if isinstance(value, _ElementPlaceholder):
-                    state[key] = network.elements[value.uid]
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            # Read the table of elements, create placeholders for them, then read the
+            # rest of the network (referring to the placeholders)
+            tableStart, = struct.unpack_from('<Q', data, len(data) - 8)
+            metadata = io.BytesIO(data[tableStart:len(data) - 8])
+            classes, uids, fields, linkNames, layout = pickle.load(metadata)
+            arrays = _mapArrays(data, layout)
+            elements = []
+            source = _LazyElements(data, arrays, fields, linkNames, elements)
+            for position, (elemClass, uid) in enumerate(zip(classes, uids)):
+                elements.append(source.shell(position, elemClass, uid))
+            source.shared, network = source.unpickle(metadata)
+            boxes = arrays['boxes']
+        except pickle.UnpicklingError:
+            raise    # propagate unpickling errors
+        except Exception as e:
+            # convert various other ways unpickling can fail into a more
+            # standard exception
+            raise pickle.UnpicklingError('unpickling failed') from e
+
         proxy = weakref.proxy(network)
         for elem in network.elements.values():
-            reconnect(elem)
             elem.network = proxy
-        for elem in itertools.chain(network.lanes, network.intersections):
-            for maneuver in elem.maneuvers:
-                reconnect(maneuver)
+        boxes = {uid: (() if numpy.isnan(box[0]) else tuple(box))
+                 for uid, box in zip(uids, boxes.tolist())}
+        network._buildSpatialIndices(boxes)
 
         totalTime = time.time() - startTime
         verbosePrint(f'Loaded cached network in {totalTime:.2f} seconds.')
         return network
 
     def dumpPickle(self, path, digest):
+        """Save this network in the cache format read by `fromPickle`.
+
+        After a header giving the format version and the digest of the original map,
+        the file contains the states of the network elements, pickled separately and
+        uncompressed (so that any element can be loaded without reading the others,
+        and the file can be shared between processes which map it). They are
+        followed by arrays giving the positions of the states, the bounding boxes of
+        the elements, the links between them, and the coordinates of their geometry
+        (see `_LazyElements` and `_GeometryTable`), and then by the metadata: a table
+        of the elements (giving their classes and the names of their attributes),
+        the layout of the arrays, and the pickled network, in which references to
+        elements are replaced by their positions in the table. The file ends with the
+        offset of the metadata.
+
+        The aggregate regions of the network (e.g. `drivableRegion`) are saved as
+        they are: those which have not been used yet are saved as the lists of
+        regions they are the union of, so that the unions are only computed when
+        first used after loading, as for a network loaded from the original map.
+        """
         path = pathlib.Path(path)
         if not path.suffix:
             path = path.with_suffix(self.pickledExt)
         version = struct.pack('<I', self._currentFormatVersion())
-        data = pickle.dumps(self)
-        with open(path, 'wb') as f:
-            f.write(version)    # uncompressed in case we change compression schemes later
-            f.write(digest)     # uncompressed for quick lookup
-            with gzip.open(f, 'wb') as gf:
-                gf.write(data)
+
+        # Signals are not NetworkElements, so are pickled with the network, as are
+        # maneuvers (to preserve their identity, since they are shared by elements)
+        elements, shared = [], {}
+        for elem in self.elements.values():
+            if isinstance(elem, NetworkElement):
+                elements.append(elem)
+            else:
+                shared[id(elem)] = elem
+        for elem in itertools.chain(self.lanes, self.intersections):
+            for maneuver in elem.maneuvers:
+                shared.setdefault(id(maneuver), maneuver)
+        shared = tuple(shared.values())
+        positions = {id(elem): position for position, elem in enumerate(elements)}
+        uidPositions = {elem.uid: position for position, elem in enumerate(elements)}
+        sharedPositions = {id(obj): -1 - position for position, obj in enumerate(shared)}
+        geometries = _GeometryTable()
+        def elementID(obj):
+            if isinstance(obj, NetworkElement):
+                return positions[id(obj)]
+            if isinstance(obj, _ElementPlaceholder):
+                return uidPositions[obj.uid]
+            return None
+        def geometryID(obj):
+            position = geometries.add(obj)
+            return None if position is None else (position,)
+        def networkID(obj):
+            position = elementID(obj)
+            return geometryID(obj) if position is None else position
+        def referenceID(obj):
+            position = elementID(obj)
+            if position is None:
+                position = sharedPositions.get(id(obj))
+            return geometryID(obj) if position is None else position
+        def dumps(value, persistentID=None):
+            stream = io.BytesIO()
+            pickler = pickle.Pickler(stream, protocol=pickle.HIGHEST_PROTOCOL)
+            if persistentID:
+                pickler.persistent_id = persistentID
+            pickler.dump(value)
+            return stream.getvalue()
+
+        # Pickle the elements, moving their links to other elements into the tables
+        states, fields = [], {}
+        linkNames, linkStarts, linkKeys, linkTargetStarts, linkTargets = {}, [0], [], [0], []
+        boxes = numpy.full((len(elements), 4), numpy.nan)
+        for position, elem in enumerate(elements):
+            state = elem.__getstate__()
+            fields.setdefault(type(elem), set()).update(state)
+            for name, value in tuple(state.items()):
+                if type(value) in (tuple, list):
+                    kind, targets = type(value), [elementID(item) for item in value]
+                else:
+                    kind, targets = None, [elementID(value)]
+                if not targets or None in targets:
+                    continue
+                del state[name]
+                linkKeys.append(linkNames.setdefault((name, kind), len(linkNames)))
+                linkTargets.extend(targets)
+                linkTargetStarts.append(len(linkTargets))
+            linkStarts.append(len(linkKeys))
+            states.append(dumps(state, referenceID))
+            bounds = elem.polygons.bounds
+            if bounds:
+                boxes[position] = bounds
+        fields = {cls: frozenset(names) for cls, names in fields.items()}
+        networkState = dumps((shared, self), networkID)
+
+        # Write to a temporary file and then rename it, so that processes which have
+        # memory-mapped an older version of the file are unaffected
+        tempPath = path.with_name(path.name + '.tmp')
+        with open(tempPath, 'wb') as f:
+            f.write(version)
+            f.write(digest)
+            offsets = [f.tell()]
+            for state in states:
+                f.write(state)
+                offsets.append(f.tell())
+            arrays = {
+                'offsets': numpy.array(offsets, dtype=numpy.int64),
+                'boxes': boxes,
+                'linkStarts': numpy.array(linkStarts, dtype=numpy.int64),
+                'linkKeys': numpy.array(linkKeys, dtype=numpy.int32),
+                'linkTargetStarts': numpy.array(linkTargetStarts, dtype=numpy.int64),
+                'linkTargets': numpy.array(linkTargets, dtype=numpy.int32),
+                **geometries.arrays(),
+            }
+            layout = _writeArrays(f, arrays)
+            tableStart = f.tell()
+            table = (tuple(type(elem) for elem in elements),
+                     tuple(elem.uid for elem in elements),
+                     fields, tuple(linkNames), layout)
+            f.write(dumps(table))
+            f.write(networkState)
+            f.write(struct.pack('<Q', tableStart))
+        os.replace(tempPath, path)
 
     @distributionMethod
     def findPointIn(self, point: Vectorlike,
@@ -1024,8 +1689,29 @@ class Network:
         point, then we search again allowing an error of up to **tolerance**. If there
         are still no matches, we return None, unless **reject** is true, in which case we
         reject the current sample.
+
+        If **elems** is one of the lists of elements of the network (e.g. `lanes`), only
+        the elements whose bounding boxes are near the point are tested, using a
+        spatial index (or the lookup grids, if they have been built: see
+        `buildLookupGrid`).
         """
+        return self._findPointIn(point, elems, reject)
+
+    def _findPointIn(self, point, elems, reject):
+        # Implementation of findPointIn for use by other methods of the network and its
+        # elements, avoiding the overhead of handling random arguments (in particular,
+        # scanning the elements to see if any are random)
         point = _toVector(point)
+        indices = self._getSpatialIndices().get(id(elems))
+        if indices is not None:
+            elems, index, grid = indices
+            if grid is None:
+                elems = index.candidates(point, self.tolerance)
+            else:
+                found = grid.lookup(point)
+                if isinstance(found, int):
+                    return elems[found]
+                elems = [elems[position] for position in found]
         for element in elems:
             if element.containsPoint(point):
                 return element
@@ -1043,6 +1729,7 @@ class Network:
 
     def _findPointInAll(self, point, things, key=lambda e: e):
         point = _toVector(point)
+        things = self._indexOf(things, key).candidates(point, self.tolerance)
         found = []
         for thing in things:
             if key(thing).containsPoint(point):
@@ -1053,6 +1740,18 @@ class Network:
                     found.append(thing)
         return found
 
+    def _indexOf(self, things, key):
+        # Spatial index over a sequence of things located by the elements key(thing),
+        # built when first needed and kept with the indices of the element lists (so
+        # that the sequence stays alive and its id is not reused); a given sequence
+        # must always be searched with the same key
+        indices = self._getSpatialIndices()
+        entry = indices.get(id(things))
+        if entry is None:
+            boxes = [key(thing)._boundingBox() for thing in things]
+            entry = indices[id(things)] = (things, _ElementIndex(things, boxes), None)
+        return entry[1]
+
     @distributionMethod
     def elementAt(self, point: Vectorlike, reject=False) -> Union[NetworkElement, None]:
         """Get the highest-level `NetworkElement` at a given point, if any.
@@ -1070,12 +1769,12 @@ class Network:
     @distributionMethod
     def roadAt(self, point: Vectorlike, reject=False) -> Union[Road, None]:
         """Get the `Road` passing through a given point."""
-        return self.findPointIn(point, self.allRoads, reject)
+        return self._findPointIn(point, self.allRoads, reject)
 
     @distributionMethod
     def laneAt(self, point: Vectorlike, reject=False) -> Union[Lane, None]:
         """Get the `Lane` passing through a given point."""
-        return self.findPointIn(point, self.lanes, reject)
+        return self._findPointIn(point, self.lanes, reject)
 
     @distributionMethod
     def laneSectionAt(self, point: Vectorlike, reject=False) -> Union[LaneSection, None]:
@@ -1103,7 +1802,7 @@ class Network:
     def intersectionAt(self, point: Vectorlike,
                        reject=False) -> Union[Intersection, None]:
         """Get the `Intersection` at a given point."""
-        return self.findPointIn(point, self.intersections, reject)
+        return self._findPointIn(point, self.intersections, reject)
 
     @distributionMethod
     def nominalDirectionsAt(self, point: Vectorlike, reject=False) -> Tuple[float]:
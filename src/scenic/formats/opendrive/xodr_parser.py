@@ -5,10 +5,9 @@ import itertools
 import warnings
 import xml.etree.ElementTree as ET
 import numpy as np
-from scipy.integrate import quad
-from scipy.integrate import solve_ivp
-from pynverse import inversefunc
-from shapely.geometry import Polygon, MultiPolygon, GeometryCollection, Point, MultiPoint
+from scipy.special import fresnel
+from shapely.geometry import (Polygon, MultiPolygon, GeometryCollection, Point, MultiPoint,
+                              LineString, box)
 from shapely.ops import unary_union, snap
 import abc
 from collections import defaultdict
@@ -17,6 +16,7 @@ from scenic.core.regions import PolygonalRegion, PolylineRegion
 from scenic.core.geometry import (polygonUnion, cleanPolygon, cleanChain, plotPolygon,
                                   removeHoles, averageVectors)
 from scenic.core.vectors import Vector
+import scenic.core.parallel as parallel
 from scenic.domains.driving import roads as roadDomain
 
 class OpenDriveWarning(UserWarning):
@@ -43,6 +43,33 @@ class Poly3:
         return self.b + 2 * self.c * x + 3 * self.d * x ** 2
 
 
+# Nodes and weights for Gauss-Legendre quadrature on [-1, 1], used to integrate
+# smooth functions along curves.
+_gauss_nodes, _gauss_weights = np.polynomial.legendre.leggauss(20)
+
+def _integrate(f, t):
+    '''Integrate the vectorized function F from 0 to each value in the array T.
+
+    If T is a scalar, the integral is returned as a float.'''
+    t = np.asarray(t, dtype=float)
+    if t.ndim == 0:
+        return float(_integrate(f, t[np.newaxis])[0])
+    nodes = (t[:, np.newaxis] / 2) * (_gauss_nodes + 1)
+    return (t / 2) * (f(nodes) @ _gauss_weights)
+
+def _invert_arclength(speed, s, t0, tolerance=1e-12, max_iter=50):
+    '''Find the parameter values where a curve has the given arc lengths.
+
+    The curve is given by its SPEED as a function of the parameter. Arc lengths are
+    measured from parameter 0, and T0 is the initial guess for Newton's method.'''
+    t = t0
+    for i in range(max_iter):
+        step = (_integrate(speed, t) - s) / np.maximum(speed(t), 1e-12)
+        t = t - step
+        if np.all(np.abs(step) <= tolerance * (1 + np.abs(t))):
+            break
+    return t
+
 class Curve:
     ''' Geometric elements which compose road reference lines.
     See the OpenDRIVE Format Specification for coordinate system details.'''
@@ -72,16 +99,23 @@ class Curve:
                 next_extra = next(extras)
             s_vals.append(s)
             last_s = s
-        return [self.point_at(s) for s in s_vals]
+        points = self.points_at(np.array(s_vals, dtype=float))
+        return [tuple(point) for point in points.tolist()]
 
-    @abc.abstractmethod
     def point_at(self, s):
         '''Get an (x, y, s) point along the curve at the given s coordinate.'''
+        return tuple(self.points_at(np.array([s], dtype=float))[0].tolist())
+
+    @abc.abstractmethod
+    def points_at(self, s):
+        '''Get an array of (x, y, s) points along the curve at the given array of
+        s coordinates.'''
         return
 
     def rel_to_abs(self, point):
         '''Convert from relative coordinates of curve to absolute coordinates.
-        I.e. rotate counterclockwise by self.hdg and translate by (x0, x1).'''
+        I.e. rotate counterclockwise by self.hdg and translate by (x0, x1).
+        The coordinates may be arrays, in which case so are the results.'''
         x, y, s = point
         return (self.x0 + self.cos_hdg * x - self.sin_hdg * y,
                 self.y0 + self.sin_hdg * x + self.cos_hdg * y,
@@ -97,12 +131,12 @@ class Cubic(Curve):
 
     def arclength(self, u):
         d_arc = lambda x: np.sqrt(1 + self.poly.grad_at(x) ** 2)
-        return quad(d_arc, 0, u)[0]
+        return _integrate(d_arc, u)
 
-    def point_at(self, s):
-        u = float(inversefunc(self.arclength, s))
-        pt = (s, self.poly.eval_at(u), s)
-        return self.rel_to_abs(pt)
+    def points_at(self, s):
+        d_arc = lambda x: np.sqrt(1 + self.poly.grad_at(x) ** 2)
+        u = _invert_arclength(d_arc, s, s)
+        return np.column_stack(self.rel_to_abs((s, self.poly.eval_at(u), s)))
 
 
 class ParamCubic(Curve):
@@ -118,15 +152,17 @@ class ParamCubic(Curve):
         self.v_poly = Poly3(av, bv, cv, dv)
         self.p_range = p_range if p_range else 1
 
+    def _speed(self, p):
+        return np.hypot(self.u_poly.grad_at(p), self.v_poly.grad_at(p))
+
     def arclength(self, p):
-        d_arc = lambda x: math.hypot(self.u_poly.grad_at(x),
-                                     self.v_poly.grad_at(x))
-        return quad(d_arc, 0, p)[0]
+        return _integrate(self._speed, p)
 
-    def point_at(self, s):
-        p = float(inversefunc(self.arclength, s))
-        pt = (self.u_poly.eval_at(p), self.v_poly.eval_at(p), s)
-        return self.rel_to_abs(pt)
+    def points_at(self, s):
+        guess = s * (self.p_range / self.length) if self.length > 0 else s
+        p = _invert_arclength(self._speed, s, guess)
+        return np.column_stack(self.rel_to_abs((self.u_poly.eval_at(p),
+                                                self.v_poly.eval_at(p), s)))
 
 
 class Clothoid(Curve):
@@ -140,31 +176,43 @@ class Clothoid(Curve):
         self.curve_rate = (curv1 - curv0) / length
         self.a = abs(curv0)
         self.r = 1 / self.a if curv0 != 0 else 1    # value not used if curv0 == 0
-        self.ode_init = np.array([x0, y0, hdg])
 
-    def point_at(self, s):
-        # Generate a origin-centered clothoid with zero curvature at origin,
-        # then translate/rotate the relevant segment.
+    def points_at(self, s):
         # Arcs are just a degenerate clothoid:
         if self.curv0 == self.curv1:
             if self.curv0 == 0:
-                pt = (s, 0, s)
+                pt = (s, np.zeros_like(s), s)
             else:
                 r = self.r
                 th = s * self.a
                 if self.curv0 > 0:
-                    pt = (r * math.sin(th), r - r * math.cos(th), s)
+                    pt = (r * np.sin(th), r - r * np.cos(th), s)
                 else:
-                    pt = (r * math.sin(th), -r + r * math.cos(th), s)
-            return self.rel_to_abs(pt)
+                    pt = (r * np.sin(th), -r + r * np.cos(th), s)
+            return np.column_stack(self.rel_to_abs(pt))
+        # Otherwise the heading is hdg + curv0*s + (rate/2)*s^2, so completing the
+        # square the position is given by Fresnel integrals. Spirals with decreasing
+        # curvature are handled by reflecting them across the x-axis.
+        sign = 1 if self.curve_rate > 0 else -1
+        rate = abs(self.curve_rate)
+        curv0, hdg = sign * self.curv0, sign * self.hdg
+        phase = hdg - (curv0 * curv0) / (2 * rate)
+        if abs(phase) > 1e7:
+            # Spiral too close to an arc for the Fresnel integrals to be accurate;
+            # integrate the heading numerically instead.
+            heading = lambda t: hdg + t * (curv0 + (rate / 2) * t)
+            dx = _integrate(lambda t: np.cos(heading(t)), s)
+            dy = _integrate(lambda t: np.sin(heading(t)), s)
         else:
-            def clothoid_ode(s, state):
-                x, y, theta = state
-                return np.array([math.cos(theta), math.sin(theta),
-                                self.curv0 + (self.curve_rate * s)])
-            sol = solve_ivp(clothoid_ode, (0, s), self.ode_init)
-            x, y, hdg = sol.y[:,-1]
-            return (x, y, s)
+            scale = math.sqrt(math.pi / rate)
+            u0 = curv0 / (rate * scale)
+            S0, C0 = fresnel(u0)
+            S, C = fresnel(u0 + s / scale)
+            dC, dS = C - C0, S - S0
+            cos_phase, sin_phase = math.cos(phase), math.sin(phase)
+            dx = scale * (cos_phase * dC - sin_phase * dS)
+            dy = scale * (sin_phase * dC + cos_phase * dS)
+        return np.column_stack((self.x0 + dx, self.y0 + sign * dy, s))
 
 class Line(Curve):
     '''A line segment between (x0, y0) and (x1, y1).'''
@@ -174,8 +222,8 @@ class Line(Curve):
         self.x1 = x0 + length * math.cos(hdg)
         self.y1 = y0 + length * math.sin(hdg)
 
-    def point_at(self, s):
-        return self.rel_to_abs((s, 0, s))
+    def points_at(self, s):
+        return np.column_stack(self.rel_to_abs((s, np.zeros_like(s), s)))
 
 
 class Lane():
@@ -552,14 +600,54 @@ class Road:
             self.end_bounds_right.update(last_rights)
         return (sec_points, sec_polys, sec_lane_polys, lane_polys, union_poly)
 
+    # Attributes of roads and of their lanes computed by calculate_polygons
+    geometry_attrs = ('sec_points', 'sec_polys', 'sec_lane_polys', 'lane_polys',
+                      'drivable_region', 'sidewalk_region', 'shoulder_region',
+                      'ref_line_points', 'start_bounds_left', 'start_bounds_right',
+                      'end_bounds_left', 'end_bounds_right')
+    lane_geometry_attrs = ('left_bounds', 'right_bounds', 'centerline', 'poly',
+                           'parent_lane_poly')
+
     def calculate_geometry(self, num, tolerance, calc_gap, drivable_lane_types,
                            sidewalk_lane_types, shoulder_lane_types):
+        self.calculate_polygons(num, tolerance, calc_gap, drivable_lane_types,
+                                sidewalk_lane_types, shoulder_lane_types)
+        self.classify_lanes(drivable_lane_types, sidewalk_lane_types,
+                            shoulder_lane_types)
+
+    def calculate_polygons(self, num, tolerance, calc_gap, drivable_lane_types,
+                           sidewalk_lane_types, shoulder_lane_types):
         # Note: this also calculates self.start_bounds_left, self.start_bounds_right,
         # self.end_bounds_left, self.end_bounds_right
         (self.sec_points, self.sec_polys, self.sec_lane_polys,
          self.lane_polys, self.drivable_region) = self.calc_geometry_for_type(
             drivable_lane_types, num, tolerance, calc_gap=calc_gap)
 
+        _, _, _, _, self.sidewalk_region = self.calc_geometry_for_type(
+            sidewalk_lane_types, num, tolerance, calc_gap=calc_gap)
+
+        _, _, _, _, self.shoulder_region = self.calc_geometry_for_type(
+            shoulder_lane_types, num, tolerance, calc_gap=calc_gap)
+
+    def get_geometry(self):
+        '''Get the attributes computed by calculate_polygons, e.g. to send them
+        from a worker process to the parent.'''
+        lanes = [{id_: {name: lane.__dict__[name]
+                        for name in self.lane_geometry_attrs if name in lane.__dict__}
+                  for id_, lane in sec.lanes.items()}
+                 for sec in self.lane_secs]
+        return {name: getattr(self, name) for name in self.geometry_attrs}, lanes
+
+    def set_geometry(self, geometry):
+        '''Set the attributes computed by calculate_polygons from get_geometry.'''
+        attrs, lanes = geometry
+        self.__dict__.update(attrs)
+        for sec, lane_attrs in zip(self.lane_secs, lanes):
+            for id_, lane in sec.lanes.items():
+                lane.__dict__.update(lane_attrs[id_])
+
+    def classify_lanes(self, drivable_lane_types, sidewalk_lane_types,
+                       shoulder_lane_types):
         for i, sec in enumerate(self.lane_secs):
             sec.drivable_lanes = {}
             sec.sidewalk_lanes = {}
@@ -592,12 +680,6 @@ class Road:
             sec.right_edge = rightmost.right_bounds
             assert len(sec.right_edge) >= 2
 
-        _, _, _, _, self.sidewalk_region = self.calc_geometry_for_type(
-            sidewalk_lane_types, num, tolerance, calc_gap=calc_gap)
-
-        _, _, _, _, self.shoulder_region = self.calc_geometry_for_type(
-            shoulder_lane_types, num, tolerance, calc_gap=calc_gap)
-
     def toScenicRoad(self, tolerance):
         assert self.sec_points
         allElements = []
@@ -1056,15 +1138,27 @@ class RoadMap:
         self.shoulder_lane_types = shoulder_lane_types
         self.elide_short_roads = elide_short_roads
 
-    def calculate_geometry(self, num, calc_gap=False, calc_intersect=True):
+    def calculate_geometry(self, num, calc_gap=False, calc_intersect=True, workers=1):
         # If calc_gap=True, fills in gaps between connected roads.
         # If calc_intersect=True, calculates intersection regions.
         # These are fairly expensive.
-        for road in self.roads.values():
-            road.calculate_geometry(num, calc_gap=calc_gap, tolerance=self.tolerance,
-                                    drivable_lane_types=self.drivable_lane_types,
-                                    sidewalk_lane_types=self.sidewalk_lane_types,
-                                    shoulder_lane_types=self.shoulder_lane_types)
+        # If workers > 1, the polygons of the roads (which are independent) are
+        # computed in that many processes forked from this one.
+        roads = list(self.roads.values())
+        workers = min(workers, len(roads))
+        context = parallel.forkContext()
+        if workers > 1 and context is not None:
+            with context.Pool(workers, initializer=_initGeometryWorker,
+                              initargs=(self, roads, num, calc_gap)) as pool:
+                geometries = pool.map(_calculateGeometryInWorker, range(len(roads)))
+            for road, geometry in zip(roads, geometries):
+                road.set_geometry(geometry)
+        else:
+            for road in roads:
+                self.calculate_road_polygons(road, num, calc_gap)
+        for road in roads:
+            road.classify_lanes(self.drivable_lane_types, self.sidewalk_lane_types,
+                                self.shoulder_lane_types)
             self.sec_lane_polys.extend(road.sec_lane_polys)
             self.lane_polys.extend(road.lane_polys)
 
@@ -1138,6 +1232,12 @@ class RoadMap:
         if calc_intersect:
             self.calculate_intersections()
 
+    def calculate_road_polygons(self, road, num, calc_gap):
+        road.calculate_polygons(num, calc_gap=calc_gap, tolerance=self.tolerance,
+                                drivable_lane_types=self.drivable_lane_types,
+                                sidewalk_lane_types=self.sidewalk_lane_types,
+                                shoulder_lane_types=self.shoulder_lane_types)
+
     def calculate_intersections(self):
         intersect_polys = []
         for junc in self.junctions.values():
@@ -1269,235 +1369,79 @@ class RoadMap:
             self.__parse_signal_validity(signal_reference_elem.find('validity'))
         )
 
-    def parse(self, path):
-        tree = ET.parse(path)
-        root = tree.getroot()
-        if root.tag != 'OpenDRIVE':
-            raise RuntimeError(f'{path} does not appear to be an OpenDRIVE file')
+    def parse(self, path, stream=False, bounds=None, margin=0):
+        '''Parse an OpenDRIVE file.
 
-        # parse junctions
-        for j in root.iter('junction'):
-            junction = Junction(int(j.get('id')), j.get('name'))
-            for c in j.iter('connection'):
-                ty = c.get('type', 'default')
-                if ty != 'default':
-                    raise RuntimeError(f'unhandled "{ty}" type of junction connection')
-                lane_links = {}
-                for l in c.iter('laneLink'):
-                    lane_links[int(l.get('from'))] = int(l.get('to'))
-                junction.add_connection(int(c.get('incomingRoad')),
-                                        int(c.get('connectingRoad')),
-                                        c.get('contactPoint'),
-                                        lane_links)
-                junction.paths.append(int(c.get('connectingRoad')))
-            if not junction.paths:
-                warn(f'junction {junction.id_} has no connecting roads; skipping it')
-                continue
-            self.junctions[junction.id_] = junction
-
-        # Creating temporal signals container to resolve referenced signals.
-        _temp_signals = {}
-        for r in root.iter('road'):
-            signals = r.find('signals')
-            if signals is not None:
-                for s in signals.iter('signal'):
-                    signal = self.__parse_signal(s)
-                    _temp_signals[signal.id_] = signal
-
-        # parse roads
+        If STREAM is true, the file is read incrementally, discarding each road and
+        junction element once it has been processed, so that the memory used is
+        bounded by the largest road rather than the whole file. The resulting state
+        of the RoadMap is the same either way.
+
+        If BOUNDS is given as a tuple (xmin, ymin, xmax, ymax), only roads whose
+        reference lines come within MARGIN of that box are kept. Links to the
+        other roads are cut, and junctions are restricted to the connecting roads
+        which were kept (being dropped if there are none).'''
+        if bounds is None:
+            region = None
+        else:
+            xmin, ymin, xmax, ymax = bounds
+            region = box(xmin - margin, ymin - margin, xmax + margin, ymax + margin)
+        if stream:
+            elements = self.__stream_elements(path)
+        else:
+            root = ET.parse(path).getroot()
+            self.__check_root(root, path)
+            elements = itertools.chain(root.iter('junction'), root.iter('road'))
+
+        # Links from roads to junctions are parsed once all junctions are known,
+        # and references to signals once all roads are known
         self.elidedRoads = {}
-        for r in root.iter('road'):
-            road = Road(r.get('name'), int(r.get('id')), float(r.get('length')),
-                        r.get('junction'))
-            link = r.find('link')
+        road_links = []
+        all_signals = {}
+        references = []
+        dropped = set()
+        for elem in elements:
+            if elem.tag == 'junction':
+                self.__parse_junction(elem)
+            else:
+                road = self.__parse_road(elem, all_signals, references, region)
+                if road is None:
+                    dropped.add(int(elem.get('id')))
+                else:
+                    road_links.append((road, elem.find('link')))
+        if dropped:
+            self.__restrict_junctions(dropped)
+
+        # parse links
+        for road, link in road_links:
             if link is not None:
-                pred_elem = link.find('predecessor')
-                succ_elem = link.find('successor')
-                pred_link = self.__parse_link(pred_elem, road, 'start')
-                succ_link = self.__parse_link(succ_elem, road, 'end')
+                pred_link = self.__parse_link(link.find('predecessor'), road, 'start')
+                succ_link = self.__parse_link(link.find('successor'), road, 'end')
             else:
                 pred_link = succ_link = None
-
-            if road.length < self.tolerance:
-                warn(f'road {road.id_} has length shorter than tolerance;'
-                     ' geometry may contain artifacts')
-                if self.elide_short_roads:
-                    warn(f'attempting to elide road {road.id_} of length {road.length}')
-                    assert road.junction is None
-                    self.elidedRoads[road.id_] = road
-                    if pred_link:
-                        road.predecessor = pred_link.id_b
-                        road.predecessorContact = pred_link.contact_b
-                    else:
-                        road.predecessorContact = None
-                    if succ_link:
-                        road.successor = succ_link.id_b
-                        road.successorContact = succ_link.contact_b
-                    else:
-                        road.successorContact = None
-                    continue
-
-            # Parse planView:
-            plan_view = r.find('planView')
-            curves = []
-            for geom in plan_view.iter('geometry'):
-                x0 = float(geom.get('x'))
-                y0 = float(geom.get('y'))
-                s0 = float(geom.get('s'))
-                hdg = float(geom.get('hdg'))
-                length = float(geom.get('length'))
-                curve_elem = geom[0]
-                curve = None
-                if curve_elem.tag == 'line':
-                    curve = Line(x0, y0, hdg, length)
-                elif curve_elem.tag == 'arc':
-                    # Arc is clothoid of constant curvature.
-                    curv = float(curve_elem.get('curvature'))
-                    curve = Clothoid(x0, y0, hdg, length, curv, curv)
-                elif curve_elem.tag == 'spiral':
-                    curv0 = float(curve_elem.get('curvStart'))
-                    curv1 = float(curve_elem.get('curvEnd'))
-                    curve = Clothoid(x0, y0, hdg, length, curv0, curv1)
-                elif curve_elem.tag == 'poly3':
-                    a, b, c, d = cubic_elem.get('a'), \
-                        float(curve_elem.get('b')), \
-                        float(curve_elem.get('c')), \
-                        float(curve_elem.get('d'))
-                    curve = Cubic(x0, y0, hdg, length, a, b, c, d)
-                elif curve_elem.tag == 'paramPoly3':
-                    au, bu, cu, du, av, bv, cv, dv = \
-                        float(curve_elem.get('aU')), \
-                        float(curve_elem.get('bU')), \
-                        float(curve_elem.get('cU')), \
-                        float(curve_elem.get('dU')), \
-                        float(curve_elem.get('aV')), \
-                        float(curve_elem.get('bV')), \
-                        float(curve_elem.get('cV')), \
-                        float(curve_elem.get('dV'))
-                    p_range = curve_elem.get('pRange')
-                    if p_range and p_range != 'normalized':
-                        # TODO support arcLength
-                        raise RuntimeError('unsupported pRange for paramPoly3')
-                    else:
-                        p_range = 1
-                    curve = ParamCubic(x0, y0, hdg, length,
-                                       au, bu, cu, du, av, bv,
-                                       cv, dv, p_range)
-                curves.append((s0, curve))
-            if not curves:
-                raise RuntimeError(f'road {road.id_} has an empty planView')
-            if not curves[0][0] == 0:
-                raise RuntimeError(f'reference line of road {road.id_} does not start at s=0')
-            lastS = 0
-            lastCurve = curves[0][1]
-            refLine = []
-            for s0, curve in curves[1:]:
-                l = s0 - lastS
-                if abs(lastCurve.length - l) > 1e-4:
-                    raise RuntimeError(f'planView of road {road.id_} has inconsistent length')
-                if l < 0:
-                    raise RuntimeError(f'planView of road {road.id_} is not in order')
-                elif l < 1e-6:
-                    warn(f'road {road.id_} reference line has a geometry of '
-                         f'length {l}; skipping it')
+            if road.id_ in self.elidedRoads:
+                if pred_link:
+                    road.predecessor = pred_link.id_b
+                    road.predecessorContact = pred_link.contact_b
                 else:
-                    refLine.append(lastCurve)
-                lastS = s0
-                lastCurve = curve
-            if refLine and lastCurve.length < 1e-6:
-                warn(f'road {road.id_} reference line has a geometry of '
-                     f'length {lastCurve.length}; skipping it')
-            else:
-                # even if the last curve is shorter than the threshold, we'll keep it if
-                # it is the only curve; getting rid of the road entirely is handled by
-                # road elision above
-                refLine.append(lastCurve)
-            assert refLine
-            road.ref_line = refLine
-
-            # Parse lanes:
-            lanes = r.find('lanes')
-            for offset in lanes.iter('laneOffset'):
-                road.offset.append((Poly3(float(offset.get('a')),
-                                         float(offset.get('b')),
-                                         float(offset.get('c')),
-                                         float(offset.get('d'))),
-                                   float(offset.get('s'))))
-
-            def popLastSectionIfShort(l):
-                if l < 1e-6:
-                    warn(f'road {road.id_} has a lane section of length {l}; skipping it')
-
-                    # delete the length-0 section and re-link lanes appropriately
-                    badSec = road.lane_secs.pop()
-                    if road.lane_secs:
-                        prev = road.lane_secs[-1]
-                        for id_, lane in prev.lanes.items():
-                            if lane.succ is not None:
-                                lane.succ = badSec.lanes[lane.succ].succ
-                    else:
-                        if road.remappedStartLanes is None:
-                            road.remappedStartLanes = { l: l for l in badSec.lanes }
-                        for start, current in road.remappedStartLanes.items():
-                            road.remappedStartLanes[start] = badSec.lanes[current].succ
-                    return badSec
+                    road.predecessorContact = None
+                if succ_link:
+                    road.successor = succ_link.id_b
+                    road.successorContact = succ_link.contact_b
                 else:
-                    return None
-
-            last_s = float('-inf')
-            for ls_elem in lanes.iter('laneSection'):
-                s = float(ls_elem.get('s'))
-                l = s - last_s
-                assert l >= 0
-                badSec = popLastSectionIfShort(l)
-
-                last_s = s
-                left = ls_elem.find('left')
-                right = ls_elem.find('right')
-                left_lanes = {}
-                right_lanes = {}
-
-                if left is not None:
-                    left_lanes = self.__parse_lanes(left)
-
-                if right is not None:
-                    right_lanes = self.__parse_lanes(right)
-
-                lane_sec = LaneSection(s, left_lanes, right_lanes)
-
-                if badSec is not None:      # finish re-linking lanes across deleted section
-                    for id_, lane in lane_sec.lanes.items():
-                        if lane.pred is not None:
-                            lane.pred = badSec.lanes[lane.pred].pred
-
-                road.lane_secs.append(lane_sec)
-
-            # parse signals
-            signals = r.find('signals')
-            if signals is not None:
-                for signal_elem in signals.iter('signal'):
-                    signal = self.__parse_signal(signal_elem)
-                    if signal.is_valid():
-                        road.signals.append(signal)
-
-                for signal_ref_elem in signals.iter('signalReference'):
-                    signalReference = self.__parse_signal_reference(signal_ref_elem)
-                    if signalReference.is_valid():
-                        referencedSignal = _temp_signals[signalReference.id_]
-                        signal = Signal(
-                            referencedSignal.id_,
-                            referencedSignal.country,
-                            referencedSignal.type_,
-                            referencedSignal.subtype,
-                            signalReference.orientation,
-                            signalReference.validity
-                        )
-                        road.signals.append(signal)
-
-            if len(road.lane_secs) > 1:
-                popLastSectionIfShort(road.length - s)
-            assert road.lane_secs
-            self.roads[road.id_] = road
+                    road.successorContact = None
+
+        # resolve signal references
+        for road, index, signalReference in references:
+            referencedSignal = all_signals[signalReference.id_]
+            road.signals[index] = Signal(
+                referencedSignal.id_,
+                referencedSignal.country,
+                referencedSignal.type_,
+                referencedSignal.subtype,
+                signalReference.orientation,
+                signalReference.validity
+            )
 
         # Handle links to/from elided roads
         new_links = []
@@ -1517,6 +1461,286 @@ class RoadMap:
             new_links.append(link)
         self.road_links = new_links
 
+        # Cut links to roads outside the bounds
+        if dropped:
+            self.__cut_links(dropped)
+
+    def __restrict_junctions(self, dropped):
+        '''Remove connections involving the given roads from all junctions, dropping
+        junctions with no remaining connecting roads.'''
+        for jid, junction in list(self.junctions.items()):
+            junction.connections = [
+                c for c in junction.connections
+                if c.connecting_id in self.roads and c.incoming_id not in dropped
+            ]
+            junction.paths = [i for i in junction.paths if i in self.roads]
+            if not junction.paths:
+                del self.junctions[jid]
+
+    def __cut_links(self, dropped):
+        '''Remove links to the given roads, clearing the links of the lanes at the
+        corresponding ends of the remaining roads. Junction connections leading
+        into connecting roads whose other ends were cut are also removed.'''
+        new_links = []
+        cut_ends = set()
+        for link in self.road_links:
+            if link.id_b not in dropped:
+                new_links.append(link)
+                continue
+            road = self.roads.get(link.id_a)
+            if road is None:
+                continue
+            cut_ends.add((road.id_, link.contact_a))
+            if link.contact_a == 'start':
+                for lane in road.lane_secs[0].lanes.values():
+                    lane.pred = None
+            else:
+                for lane in road.lane_secs[-1].lanes.values():
+                    lane.succ = None
+        self.road_links = new_links
+
+        for junction in self.junctions.values():
+            junction.connections = [
+                c for c in junction.connections
+                if (c.connecting_id,
+                    'end' if c.connecting_contact == 'start' else 'start') not in cut_ends
+            ]
+
+    @staticmethod
+    def __check_root(root, path):
+        if root.tag != 'OpenDRIVE':
+            raise RuntimeError(f'{path} does not appear to be an OpenDRIVE file')
+
+    def __stream_elements(self, path):
+        '''Yield the junction and road elements of a file as they are parsed,
+        clearing each one after it has been processed.'''
+        root = None
+        depth = 0
+        for event, elem in ET.iterparse(path, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                    self.__check_root(root, path)
+                depth += 1
+                continue
+            depth -= 1
+            if elem.tag in ('junction', 'road'):
+                yield elem
+                elem.clear()
+                if depth == 1:
+                    root.remove(elem)
+
+    @staticmethod
+    def __meets_region(ref_line, region):
+        # sample the reference line at (at most) 1 m intervals
+        points = []
+        for curve in ref_line:
+            num = max(2, math.ceil(curve.length) + 1)
+            s_vals = np.linspace(0, curve.length, num=num)
+            points.append(curve.points_at(s_vals)[:, :2])
+        return region.intersects(LineString(np.concatenate(points)))
+
+    def __parse_junction(self, j):
+        junction = Junction(int(j.get('id')), j.get('name'))
+        for c in j.iter('connection'):
+            ty = c.get('type', 'default')
+            if ty != 'default':
+                raise RuntimeError(f'unhandled "{ty}" type of junction connection')
+            lane_links = {}
+            for l in c.iter('laneLink'):
+                lane_links[int(l.get('from'))] = int(l.get('to'))
+            junction.add_connection(int(c.get('incomingRoad')),
+                                    int(c.get('connectingRoad')),
+                                    c.get('contactPoint'),
+                                    lane_links)
+            junction.paths.append(int(c.get('connectingRoad')))
+        if not junction.paths:
+            warn(f'junction {junction.id_} has no connecting roads; skipping it')
+            return
+        self.junctions[junction.id_] = junction
+
+    def __parse_road(self, r, all_signals, references, region=None):
+        '''Parse a road element, returning the new Road (or None if its reference
+        line does not meet REGION, in which case only its signals are recorded).'''
+        road = Road(r.get('name'), int(r.get('id')), float(r.get('length')),
+                    r.get('junction'))
+
+        # Parse signals, recording them so that references from other roads (even
+        # elided ones) can be resolved
+        signals = r.find('signals')
+        road_signals = []
+        if signals is not None:
+            for signal_elem in signals.iter('signal'):
+                signal = self.__parse_signal(signal_elem)
+                all_signals[signal.id_] = signal
+                road_signals.append(signal)
+
+        if road.length < self.tolerance:
+            warn(f'road {road.id_} has length shorter than tolerance;'
+                 ' geometry may contain artifacts')
+            if self.elide_short_roads:
+                warn(f'attempting to elide road {road.id_} of length {road.length}')
+                assert road.junction is None
+                self.elidedRoads[road.id_] = road
+                return road
+
+        # Parse planView:
+        plan_view = r.find('planView')
+        curves = []
+        for geom in plan_view.iter('geometry'):
+            x0 = float(geom.get('x'))
+            y0 = float(geom.get('y'))
+            s0 = float(geom.get('s'))
+            hdg = float(geom.get('hdg'))
+            length = float(geom.get('length'))
+            curve_elem = geom[0]
+            curve = None
+            if curve_elem.tag == 'line':
+                curve = Line(x0, y0, hdg, length)
+            elif curve_elem.tag == 'arc':
+                # Arc is clothoid of constant curvature.
+                curv = float(curve_elem.get('curvature'))
+                curve = Clothoid(x0, y0, hdg, length, curv, curv)
+            elif curve_elem.tag == 'spiral':
+                curv0 = float(curve_elem.get('curvStart'))
+                curv1 = float(curve_elem.get('curvEnd'))
+                curve = Clothoid(x0, y0, hdg, length, curv0, curv1)
+            elif curve_elem.tag == 'poly3':
+                a, b, c, d = float(curve_elem.get('a')), \
+                    float(curve_elem.get('b')), \
+                    float(curve_elem.get('c')), \
+                    float(curve_elem.get('d'))
+                curve = Cubic(x0, y0, hdg, length, a, b, c, d)
+            elif curve_elem.tag == 'paramPoly3':
+                au, bu, cu, du, av, bv, cv, dv = \
+                    float(curve_elem.get('aU')), \
+                    float(curve_elem.get('bU')), \
+                    float(curve_elem.get('cU')), \
+                    float(curve_elem.get('dU')), \
+                    float(curve_elem.get('aV')), \
+                    float(curve_elem.get('bV')), \
+                    float(curve_elem.get('cV')), \
+                    float(curve_elem.get('dV'))
+                p_range = curve_elem.get('pRange')
+                if p_range and p_range != 'normalized':
+                    # TODO support arcLength
+                    raise RuntimeError('unsupported pRange for paramPoly3')
+                else:
+                    p_range = 1
+                curve = ParamCubic(x0, y0, hdg, length,
+                                   au, bu, cu, du, av, bv,
+                                   cv, dv, p_range)
+            curves.append((s0, curve))
+        if not curves:
+            raise RuntimeError(f'road {road.id_} has an empty planView')
+        if not curves[0][0] == 0:
+            raise RuntimeError(f'reference line of road {road.id_} does not start at s=0')
+        lastS = 0
+        lastCurve = curves[0][1]
+        refLine = []
+        for s0, curve in curves[1:]:
+            l = s0 - lastS
+            if abs(lastCurve.length - l) > 1e-4:
+                raise RuntimeError(f'planView of road {road.id_} has inconsistent length')
+            if l < 0:
+                raise RuntimeError(f'planView of road {road.id_} is not in order')
+            elif l < 1e-6:
+                warn(f'road {road.id_} reference line has a geometry of '
+                     f'length {l}; skipping it')
+            else:
+                refLine.append(lastCurve)
+            lastS = s0
+            lastCurve = curve
+        if refLine and lastCurve.length < 1e-6:
+            warn(f'road {road.id_} reference line has a geometry of '
+                 f'length {lastCurve.length}; skipping it')
+        else:
+            # even if the last curve is shorter than the threshold, we'll keep it if
+            # it is the only curve; getting rid of the road entirely is handled by
+            # road elision above
+            refLine.append(lastCurve)
+        assert refLine
+        if region is not None and not self.__meets_region(refLine, region):
+            return None
+        road.ref_line = refLine
+
+        # Parse lanes:
+        lanes = r.find('lanes')
+        for offset in lanes.iter('laneOffset'):
+            road.offset.append((Poly3(float(offset.get('a')),
+                                     float(offset.get('b')),
+                                     float(offset.get('c')),
+                                     float(offset.get('d'))),
+                               float(offset.get('s'))))
+
+        def popLastSectionIfShort(l):
+            if l < 1e-6:
+                warn(f'road {road.id_} has a lane section of length {l}; skipping it')
+
+                # delete the length-0 section and re-link lanes appropriately
+                badSec = road.lane_secs.pop()
+                if road.lane_secs:
+                    prev = road.lane_secs[-1]
+                    for id_, lane in prev.lanes.items():
+                        if lane.succ is not None:
+                            lane.succ = badSec.lanes[lane.succ].succ
+                else:
+                    if road.remappedStartLanes is None:
+                        road.remappedStartLanes = { l: l for l in badSec.lanes }
+                    for start, current in road.remappedStartLanes.items():
+                        road.remappedStartLanes[start] = badSec.lanes[current].succ
+                return badSec
+            else:
+                return None
+
+        last_s = float('-inf')
+        for ls_elem in lanes.iter('laneSection'):
+            s = float(ls_elem.get('s'))
+            l = s - last_s
+            assert l >= 0
+            badSec = popLastSectionIfShort(l)
+
+            last_s = s
+            left = ls_elem.find('left')
+            right = ls_elem.find('right')
+            left_lanes = {}
+            right_lanes = {}
+
+            if left is not None:
+                left_lanes = self.__parse_lanes(left)
+
+            if right is not None:
+                right_lanes = self.__parse_lanes(right)
+
+            lane_sec = LaneSection(s, left_lanes, right_lanes)
+
+            if badSec is not None:      # finish re-linking lanes across deleted section
+                for id_, lane in lane_sec.lanes.items():
+                    if lane.pred is not None:
+                        lane.pred = badSec.lanes[lane.pred].pred
+
+            road.lane_secs.append(lane_sec)
+
+        # add signals
+        if signals is not None:
+            for signal in road_signals:
+                if signal.is_valid():
+                    road.signals.append(signal)
+
+            for signal_ref_elem in signals.iter('signalReference'):
+                signalReference = self.__parse_signal_reference(signal_ref_elem)
+                if signalReference.is_valid():
+                    # the referenced signal may belong to a later road, so we
+                    # resolve the reference once all roads have been parsed
+                    references.append((road, len(road.signals), signalReference))
+                    road.signals.append(None)
+
+        if len(road.lane_secs) > 1:
+            popLastSectionIfShort(road.length - s)
+        assert road.lane_secs
+        self.roads[road.id_] = road
+        return road
+
     def toScenicNetwork(self):
         assert self.intersection_region is not None
 
@@ -1587,8 +1811,6 @@ class RoadMap:
         # Hook up connecting road links and create intersections
         intersections = {}
         for jid, junction in self.junctions.items():
-            if not junction.connections:
-                continue
             assert junction.poly is not None
             if junction.poly.is_empty:
                 warn(f'skipping empty junction {jid}')
@@ -1703,6 +1925,8 @@ class RoadMap:
 
             # Order connected roads and lanes by adjacency
             def cyclicOrder(elements, contactStart=None):
+                if not elements:
+                    return ()   # e.g. all roads on this side were cut off by bounds
                 points = []
                 for element in elements:
                     if contactStart is None:
@@ -1781,7 +2005,7 @@ class RoadMap:
                 lane.maneuvers = (maneuver,)
 
         def combine(regions):
-            return PolygonalRegion.unionAll(regions, buf=self.tolerance)
+            return PolygonalRegion.unionAll(regions, buf=self.tolerance, lazy=True)
 
         return roadDomain.Network(
             elements=allElements,
@@ -1800,3 +2024,17 @@ class RoadMap:
             crossingRegion=combine(crossings),
             sidewalkRegion=combine(sidewalks)
         )
+
+## Worker processes for RoadMap.calculate_geometry
+
+_workerState = None
+
+def _initGeometryWorker(*state):
+    global _workerState
+    _workerState = state
+
+def _calculateGeometryInWorker(index):
+    road_map, roads, num, calc_gap = _workerState
+    road = roads[index]
+    road_map.calculate_road_polygons(road, num, calc_gap)
+    return road.get_geometry()
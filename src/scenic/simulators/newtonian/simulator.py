@@ -3,6 +3,7 @@
 import numpy as np
 import math
 from math import sin, radians, degrees, copysign
+import operator
 import shapely
 import os
 
@@ -27,6 +28,8 @@ HEIGHT = 800
 MAX_ACCELERATION = 5.6 # in m/s2, seems to be a pretty reasonable value
 MAX_BRAKING = 4.6
 
+_controls = operator.attrgetter('throttle', 'brake', 'hand_brake', 'steer')
+
 class NewtonianSimulator(DrivingSimulator):
     """Implementation of `Simulator` for the Newtonian simulator."""
     def __init__(self, network, timestep=0.1, render=False):
@@ -44,6 +47,17 @@ class NewtonianSimulation(DrivingSimulation):
         self.network = network
         self.ego = self.objects[0]
 
+        # The state of all objects is stored in arrays, which are created at the
+        # first time step and only copied back into the objects by getProperties
+        self._positions = None
+        self._headings = None
+        self._speeds = None
+        self._velocities = None
+        self._lengths = None
+        self._indices = {}
+        self._reported = []     # (position, heading, speed) last given to each object
+        self._stateLists = None
+
         # Set actor's initial velocity (if specified)
         for obj in self.objects:
             if obj.speed is not None:
@@ -112,51 +126,122 @@ class NewtonianSimulation(DrivingSimulation):
                onScreen(x2, y1)
 
     def step(self):
-        for obj in self.objects:
-            if obj.hand_brake:
-                acceleration = -MAX_BRAKING
-            elif obj.brake > 0:
-                acceleration = -obj.brake * MAX_BRAKING
-            else:
-                acceleration = obj.throttle * MAX_ACCELERATION
-            obj.speed += acceleration * self.timestep
-            obj.velocity = Vector(0, obj.speed).rotatedBy(obj.heading)
-            if obj.steer:
-                turning_radius = obj.length / sin(obj.steer * np.pi / 2)
-                angular_velocity = obj.speed / turning_radius
-            else:
-                angular_velocity = 0
-            obj.position += obj.velocity * self.timestep
-            obj.heading -= angular_velocity * self.timestep
+        self.loadState()
+        timestep = self.timestep
+        controls = np.array([_controls(obj) for obj in self.objects], dtype=float)
+        throttle, brake, handBrake, steer = controls.reshape(-1, 4).T
+        acceleration = np.where(handBrake != 0, -MAX_BRAKING,
+                                np.where(brake > 0, -brake * MAX_BRAKING,
+                                         throttle * MAX_ACCELERATION))
+        speeds, headings = self._speeds, self._headings
+        speeds += acceleration * timestep
+        velocities = self._velocities
+        velocities[:, 0] = -np.sin(headings) * speeds
+        velocities[:, 1] = np.cos(headings) * speeds
+        turningRadii = np.divide(self._lengths, np.sin(steer * np.pi / 2),
+                                 out=np.full_like(steer, np.inf), where=(steer != 0))
+        self._positions += velocities * timestep
+        headings -= (speeds / turningRadii) * timestep
+        self._stateLists = None
         if self.render:
             self.draw_objects()
 
+    def loadState(self):
+        """Load the state of any objects whose properties have changed into our arrays.
+
+        Objects whose position, heading, or speed differ from the values last given by
+        getProperties (e.g. because they were set by actions), as well as any objects
+        created since the last time step, have their state read back from their
+        properties.
+        """
+        objects = self.objects
+        numObjects = len(objects)
+        if self._positions is None or len(self._positions) < numObjects:
+            old = 0 if self._positions is None else len(self._positions)
+            newObjects = objects[old:]
+            lengths = np.array([obj.length for obj in newObjects], dtype=float)
+            new = np.full((len(newObjects), 2), np.nan)
+            if old == 0:
+                self._positions, self._velocities = new, new.copy()
+                self._headings, self._speeds = np.full((2, numObjects), np.nan)
+                self._lengths = lengths
+            else:
+                self._positions = np.concatenate((self._positions, new))
+                self._velocities = np.concatenate((self._velocities, new))
+                self._headings = np.concatenate((self._headings, new[:, 0]))
+                self._speeds = np.concatenate((self._speeds, new[:, 0]))
+                self._lengths = np.concatenate((self._lengths, lengths))
+            for index, obj in enumerate(newObjects, start=old):
+                self._indices[obj] = index
+                self._reported.append((None, None, None))
+        # Compare values rather than only identities, since updating an object keeps
+        # its old values of properties which are equal to the reported ones
+        positions, headings, speeds = self._positions, self._headings, self._speeds
+        for index, (obj, reported) in enumerate(zip(objects, self._reported)):
+            position, heading, speed = reported
+            value = obj.position
+            if value is not position and value != position:
+                positions[index] = tuple(value)
+            value = obj.heading
+            if value is not heading and value != heading:
+                headings[index] = value
+            value = obj.speed
+            if value is not speed and value != speed:
+                speeds[index] = value
+
     def draw_objects(self):
         self.screen.fill((255, 255, 255))
         for screenPoints in self.network_polygons:
             pygame.draw.polygon(self.screen, (0, 0, 0), list(screenPoints), width=1)
 
         for obj in self.objects:
+            if obj in self._indices:
+                position, heading = self.currentPose(obj)
+            else:
+                position, heading = obj.position, obj.heading
             color = (255, 0, 0) if obj is self.ego else (0, 0, 255)
             h, w = obj.length, obj.width
             pos_vec = Vector(-1.75, 1.75)
             neg_vec = Vector(w / 2, h / 2)
-            heading_vec = Vector(0, 10).rotatedBy(obj.heading)
+            heading_vec = Vector(0, 10).rotatedBy(heading)
             dx, dy = int(heading_vec.x), -int(heading_vec.y)
-            x, y = self.scenicToScreenVal(obj.position)
-            rect_x, rect_y = self.scenicToScreenVal(obj.position + pos_vec)
-            self.rotated_car = pygame.transform.rotate(self.car, obj.heading * 180 / np.pi)
+            x, y = self.scenicToScreenVal(position)
+            rect_x, rect_y = self.scenicToScreenVal(position + pos_vec)
+            self.rotated_car = pygame.transform.rotate(self.car, heading * 180 / np.pi)
             self.screen.blit(self.rotated_car, (rect_x, rect_y))
         pygame.display.update()
         time.sleep(self.timestep)
 
+    def currentPose(self, obj):
+        """Position and heading of an object according to our arrays."""
+        index = self._indices[obj]
+        return Vector(*self._positions[index]), float(self._headings[index])
+
     def getProperties(self, obj, properties):
+        index = self._indices.get(obj)
+        if index is None:     # object not simulated yet
+            return dict(
+                position=obj.position,
+                elevation=obj.elevation,
+                heading=obj.heading,
+                velocity=obj.velocity,
+                speed=obj.speed,
+                angularSpeed=obj.angularSpeed,
+            )
+        if self._stateLists is None:
+            # convert the arrays only once per time step, for all objects
+            self._stateLists = (self._positions.tolist(), self._headings.tolist(),
+                                self._speeds.tolist(), self._velocities.tolist())
+        positions, headings, speeds, velocities = self._stateLists
+        position = Vector(*positions[index])
+        heading, speed = headings[index], speeds[index]
+        self._reported[index] = (position, heading, speed)
         values = dict(
-            position=obj.position,
+            position=position,
             elevation=obj.elevation,
-            heading=obj.heading,
-            velocity=obj.velocity,
-            speed=obj.speed,
+            heading=heading,
+            velocity=Vector(*velocities[index]),
+            speed=speed,
             angularSpeed=obj.angularSpeed,
         )
         return values
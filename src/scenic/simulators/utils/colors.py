@@ -6,6 +6,7 @@ as well as in the interfaces to GTA and Webots.
 """
 
 import colorsys
+import random
 from collections import namedtuple
 
 from scenic.core.distributions import Distribution, Range, Normal, Options, toDistribution
@@ -94,9 +95,9 @@ class NoisyColorDistribution(Distribution):
 
 class ColorMutator(Mutator):
 	"""Mutator that adds Gaussian HSL noise to the ``color`` property."""
-	def appliedTo(self, obj):
-		hueNoise = random.gauss(0, 0.05)
-		satNoise = random.gauss(0, 0.05)
-		lightNoise = random.gauss(0, 0.05)
+	def appliedTo(self, obj, rng=random):
+		hueNoise = rng.gauss(0, 0.05)
+		satNoise = rng.gauss(0, 0.05)
+		lightNoise = rng.gauss(0, 0.05)
 		color = NoisyColorDistribution.addNoiseTo(obj.color, hueNoise, lightNoise, satNoise)
 		return tuple([obj.copyWith(color=color), True])		# allow further mutation
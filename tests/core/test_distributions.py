@@ -1,10 +1,15 @@
 
 import warnings
 
+import pytest
 import scipy.stats
+import numpy
 import numpy.linalg
 
-from scenic.core.distributions import Range, Normal, TruncatedNormal, DiscreteRange, Options
+from scenic.core.distributions import (Samplable, CustomDistribution, RejectionException,
+                                       Range, Normal, TruncatedNormal, DiscreteRange, Options)
+from scenic.core.geometry import hypot
+from scenic.core.vectors import Vector
 
 def similarDistributions(d1, d2, samples=3000, p=0.002):
     s1 = [d1.sample() for i in range(samples)]
@@ -41,3 +46,59 @@ def test_bucketed_discrete_range():
 def test_bucketed_options():
     o = Options({0: 1, 1: 3})
     similarDistributions(o, o.bucket())
+
+def test_batch_sampling():
+    x = Range(0, 1)
+    vec = Vector(x, Normal(0, 1)).offsetRotated(Range(0, 3), Vector(1, 2))
+    num = Options([1, 2, 3]) * x + hypot(x, 3) - TruncatedNormal(0, 1, -1, 2)
+    values = Samplable.batchSampleAll((vec, num), 50, numpy.random.default_rng(7))
+    assert values[vec].shape == (50, 2) and values[num].shape == (50,)
+    for i in (0, 17, 49):
+        row = values.row(i)
+        assert 0 <= row[x] <= 1
+        assert row[vec] == vec.sampleGiven(row)
+        assert row[num] == num.sampleGiven(row)
+    assert len(set(values[num].tolist())) == 50
+
+def test_batch_sampling_fallback():
+    def sampler(values):
+        if values[x] > 0.5:
+            raise RejectionException('too big')
+        return str(values[x])
+    x = Range(0, 1)
+    custom = CustomDistribution(sampler, x)
+    values = Samplable.batchSampleAll((custom,), 100, numpy.random.default_rng(3))
+    assert isinstance(values[custom], list)
+    assert 0 < values.rejected.sum() < 100
+    for i in range(100):
+        if not values.rejected[i]:
+            assert values.row(i)[custom] == str(values.row(i)[x])
+
+def test_batch_sampling_operators():
+    x = DiscreteRange(0, 3)
+    rng = numpy.random.default_rng(5)
+    quotient = 1 / x
+    with pytest.raises(ZeroDivisionError):
+        Samplable.batchSampleAll((quotient,), 50, rng)
+    power = (x - 2) ** Range(0.1, 0.9)
+    big = x * 2**62 + 2**62
+    values = Samplable.batchSampleAll((power, big), 50, rng)
+    assert any(isinstance(value, complex) for value in values[power])
+    assert max(values[big]) == 4 * 2**62
+    for i in range(50):
+        row = values.row(i)
+        assert row[power] == power.sampleGiven(row)
+        assert row[big] == big.sampleGiven(row)
+    exact = x ** 2.0 / (x + 1)
+    values = Samplable.batchSampleAll((exact,), 50, rng)
+    assert isinstance(values[exact], numpy.ndarray)    # still vectorized
+    for i in range(50):
+        assert values.row(i)[exact] == exact.sampleGiven(values.row(i))
+
+def test_batch_sampling_distributions():
+    for dist in (Range(-3, 7), Normal(22, 5), TruncatedNormal(-10, 3, -1, 5),
+                 DiscreteRange(-3, 7, weights=range(1, 12)), Options({0: 1, 1: 3})):
+        values = Samplable.batchSampleAll((dist,), 3000, numpy.random.default_rng(1))
+        s1 = values[dist].tolist()
+        s2 = [dist.sample() for i in range(3000)]
+        assert scipy.stats.ks_2samp(s1, s2).pvalue > 0.002
@@ -52,3 +52,32 @@ def test_triangulation_holes():
         ]
     )
     checkTriangulation(p)
+
+def test_circle_grid():
+    grid = geometry.CircleGrid()
+    grid.insert('a', 0, 0, 1)
+    grid.insert('b', 3, 0, 1)
+    grid.insert('big', 100, 100, 50)
+    assert set(grid.overlapping(1.5, 0, 0.5)) == {'a', 'b'}
+    assert grid.overlapping(1.5, 2, 0.5) == []
+    assert grid.overlapping(0, 2, 1) == ['a']    # tangent circles overlap
+    assert set(grid.overlapping(60, 60, 10)) == {'big'}
+    assert set(grid.overlapping(0, 0, 1000)) == {'a', 'b', 'big'}
+
+def test_rectangle_separation():
+    import random
+    import numpy
+    rng = random.Random(0)
+    def randomRectangle():
+        return (rng.uniform(-3, 3), rng.uniform(-3, 3), rng.uniform(-4, 4),
+                rng.uniform(0.1, 2), rng.uniform(0.1, 2))
+    pairs = [(randomRectangle(), randomRectangle()) for i in range(500)]
+    results = geometry.rectanglesIntersect(*numpy.array(pairs).transpose(1, 0, 2))
+    for (first, second), result in zip(pairs, results):
+        polyA = shapely.geometry.Polygon(geometry._RotatedRectangle.makeCorners(*first))
+        polyB = shapely.geometry.Polygon(geometry._RotatedRectangle.makeCorners(*second))
+        intersects = polyA.intersects(polyB)
+        assert (geometry.rectangleSeparation(first, second) <= 0) == intersects
+        assert result == intersects
+    # touching rectangles intersect
+    assert geometry.rectanglesIntersect((0, 0, 0, 1, 1), (2, 0, 0, 1, 1))
@@ -2,6 +2,7 @@
 import shapely.geometry
 
 from scenic.core.regions import *
+from scenic.core.vectors import PiecewiseVectorField
 
 def test_polygon_sampling():
     p = shapely.geometry.Polygon(
@@ -18,3 +19,105 @@ def test_polygon_sampling():
     assert sum(1 <= y <= 2 for y in ys) <= 870
     assert sum(x >= 1.5 for x in xs) >= 1250
     assert sum(y >= 1.5 for y in ys) >= 1250
+
+def test_polygon_object_containment():
+    import random
+    convex = PolygonalRegion([(0,0), (4,0), (5,2), (4,4), (0,4)])
+    nonconvex = PolygonalRegion([(0,0), (4,0), (2,2), (4,4), (0,4)])
+    assert convex._halfPlanes is not None
+    assert nonconvex._halfPlanes is None
+    rng = random.Random(0)
+    for i in range(500):
+        rect = RectangularRegion((rng.uniform(-1, 6), rng.uniform(-1, 5)),
+                                 rng.uniform(-4, 4), rng.uniform(0.1, 2), rng.uniform(0.1, 2))
+        for region in (convex, nonconvex):
+            assert region.containsObject(rect) == region.polygons.contains(rect.polygon)
+
+def test_polygon_uniform_points():
+    import numpy
+    p = shapely.geometry.Polygon(
+        [(0,0), (0,3), (3,3), (3,0)],
+        holes=[[(1,1), (1,2), (2,2), (2,1)]]
+    )
+    r = PolygonalRegion(polygon=p)
+    pts = r.uniformPoints(3000, numpy.random.default_rng(0))
+    assert pts.shape == (3000, 2)
+    assert r.containsPoints(pts).all()
+    xs, ys = pts.T
+    assert ((1 < xs) & (xs < 2) & (1 < ys) & (ys < 2)).sum() == 0
+    assert ((1 <= xs) & (xs <= 2)).sum() <= 870
+    assert (xs >= 1.5).sum() >= 1250 and (ys >= 1.5).sum() >= 1250
+
+def test_old_style_samplers():
+    class OldRegion(Region):
+        def uniformPointInner(self):
+            return Vector(1, 2)
+    old = OldRegion('old')
+    assert old.uniformPoint() == (1, 2)
+    square = PolygonalRegion([(0,0), (0,3), (3,3), (3,0)])
+    intersection = IntersectionRegion(square, old, sampler=lambda region: Vector(2, 2))
+    assert intersection.uniformPoint() == (2, 2)
+    assert IntersectionRegion(old, square).uniformPoint() == (1, 2)
+    difference = DifferenceRegion(square, old, sampler=lambda region: Vector(1, 1))
+    assert difference.uniformPoint() == (1, 1)
+
+def test_polygon_lazy_triangulation():
+    r = PolygonalRegion([(0,0), (0,3), (3,3), (3,0)])
+    assert r._triangulation is None
+    r.uniformPointInner()
+    assert r.triangles.shape == (2, 3, 2)
+    assert r.cumulativeTriangleAreas[-1] == 9
+
+def test_polygon_lazy_union():
+    import pickle
+    r1 = PolygonalRegion([(0,0), (0,3), (3,3), (3,0)])
+    r2 = PolygonalRegion([(2,0), (2,3), (5,3), (5,0)])
+    assert PolygonalRegion.unionAll((nowhere, nowhere), lazy=True) is nowhere
+    union = PolygonalRegion.unionAll((r1, nowhere, r2), lazy=True)
+    assert isinstance(union, PolygonalUnionRegion)
+    assert not union.isComputed
+    copy = pickle.loads(pickle.dumps(union))
+    assert not copy.isComputed
+    assert union.containsPoint((4, 1)) and not union.containsPoint((6, 1))
+    assert union.isComputed
+    assert union.polygons.equals(PolygonalRegion.unionAll((r1, r2)).polygons)
+    assert union.polygons.area == 15
+    assert copy.polygons.equals(union.polygons)
+    assert pickle.loads(pickle.dumps(union)).polygons.equals(union.polygons)
+
+def test_polygon_hash():
+    points = [(0,0), (0,3), (3,3), (3,0)]
+    r1, r2 = PolygonalRegion(points), PolygonalRegion(points)
+    r3 = PolygonalRegion([(0,0), (0,3), (3,3), (3,1)])
+    assert r1 == r2 and hash(r1) == hash(r2)
+    assert r1 != r3 and hash(r1) != hash(r3)
+    l1, l2 = PolylineRegion(points), PolylineRegion(points)
+    assert hash(l1) == hash(l2)
+
+def test_polyline_hash():
+    region = PolylineRegion([(0,0), (0,3), (3,3)])
+    first = hash(region)
+    assert isinstance(first, int)
+    assert hash(region) == first
+
+def test_piecewise_field():
+    r1 = PolygonalRegion([(0, 0), (10, 0), (10, 10), (0, 10)],
+                         orientation=VectorField('One', lambda pos: 1))
+    r2 = PolygonalRegion([(5, 0), (15, 0), (15, 10), (5, 10)],
+                         orientation=VectorField('Two', lambda pos: 2))
+    r3 = CircularRegion((20, 5), 2)     # no orientation
+    vf = PiecewiseVectorField('Foo', (r3, r1, r2), defaultHeading=3)
+    assert vf[Vector(7, 5)] == 1
+    assert vf[Vector(12, 5)] == 2
+    assert vf[Vector(20, 5)] == 3
+    assert vf[Vector(-10, 5)] == 3
+
+def test_piecewise_field_lazy_union():
+    def square(x):
+        return PolygonalRegion([(x, 0), (x+1, 0), (x+1, 1), (x, 1)])
+    u1 = PolygonalUnionRegion([square(0), square(1)], orientation=VectorField('One', lambda pos: 1))
+    u2 = PolygonalUnionRegion([square(5), square(6)], orientation=VectorField('Two', lambda pos: 2))
+    vf = PiecewiseVectorField('Foo', (u1, u2))
+    assert vf[Vector(1.5, 0.5)] == 1
+    assert u1.isComputed and not u2.isComputed
+    assert vf[Vector(6.5, 0.5)] == 2
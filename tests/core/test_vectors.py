@@ -1,8 +1,13 @@
 
+import pickle
+
+import pytest
+import shapely.geometry
+
 from scenic.core.vectors import *
 from scenic.core.lazy_eval import (LazilyEvaluable, DelayedArgument, valueInContext,
                                    needsLazyEvaluation)
-from scenic.core.distributions import Options, underlyingFunction
+from scenic.core.distributions import Options, underlyingFunction, RejectionException
 
 def test_equality():
     v = Vector(1, 4)
@@ -31,3 +36,18 @@ def test_distribution_method_encapsulation_lazy():
     assert not needsLazyEvaluation(evpt)
     assert isinstance(evpt, VectorMethodDistribution)
     assert evpt.method is underlyingFunction(vf.followFrom)
+
+def test_polygonal_field():
+    cells = [(shapely.geometry.box(0, 0, 10, 10), 1),
+             (shapely.geometry.box(5, 0, 15, 10), 2),     # overlaps the first cell
+             (shapely.geometry.box(20, 0, 30, 10), None)]
+    vf = PolygonalVectorField('Foo', cells, headingFunction=lambda pos: pos[0])
+    assert vf[Vector(2, 3)] == 1
+    assert vf[Vector(7, 3)] == 1    # earlier cells take precedence
+    assert vf[Vector(12, 3)] == 2
+    assert vf[Vector(25, 3)] == 25
+    assert vf[Vector(10, 10)] == 1  # boundaries are included
+    with pytest.raises(RejectionException):
+        vf[Vector(17, 3)]
+    unpickled = pickle.loads(pickle.dumps(PolygonalVectorField('Bar', cells[:2])))
+    assert unpickled[Vector(7, 3)] == 1
@@ -95,6 +95,171 @@ def test_elements_at(cached_maps):
         else:
             assert val is getattr(ego, param), param
 
+def test_spatial_index(cached_maps):
+    import random
+    from scenic.domains.driving.roads import Network
+    path = cached_maps['tests/formats/opendrive/maps/CARLA/Town01.xodr']
+    network = Network.fromFile(path, tolerance=0.05)
+    def linearFind(point, elems):
+        found = [elem for elem in elems if elem.containsPoint(point)]
+        if not found:
+            found = [elem for elem in elems if elem.distanceTo(point) <= network.tolerance]
+        return found[0] if found else None
+    def check():
+        (minx, maxx), (miny, maxy) = network.drivableRegion.getAABB()
+        rng = random.Random(0)
+        for i in range(200):
+            point = (rng.uniform(minx - 5, maxx + 5), rng.uniform(miny - 5, maxy + 5))
+            assert network.roadAt(point) is linearFind(point, network.allRoads)
+            assert network.laneAt(point) is linearFind(point, network.lanes)
+            assert network.intersectionAt(point) is linearFind(point, network.intersections)
+    check()
+    network.buildLookupGrid(cellSize=2)
+    assert network.lookupGridCellSize == 2
+    check()
+    # maneuvers are found using an index over their connecting lanes
+    for intersection in network.intersections:
+        for maneuver in intersection.maneuvers:
+            lane = maneuver.connectingLane
+            point = lane.centerline.pointAlongBy(0.5, normalized=True)
+            maneuvers = intersection.maneuvers
+            expected = [m for m in maneuvers if m.connectingLane.containsPoint(point)]
+            assert maneuver in expected
+            assert intersection.maneuversAt(point) == expected
+
+def test_spatial_index_pickling(cached_maps):
+    import pickle
+    from scenic.domains.driving.roads import Network
+    path = cached_maps['tests/formats/opendrive/maps/CARLA/Town01.xodr']
+    network = Network.fromFile(path)
+    copy = pickle.loads(pickle.dumps(network))
+    for lane in network.lanes[:20]:
+        point = lane.centerline.pointAlongBy(0.5, normalized=True)
+        assert copy.laneAt(point).uid == network.laneAt(point).uid
+        assert copy.roadAt(point).uid == network.roadAt(point).uid
+
+def test_lookup_grid_caching(cached_maps):
+    from scenic.domains.driving.roads import Network
+    path = cached_maps['tests/formats/opendrive/maps/CARLA/Town01.xodr']
+    network = Network.fromFile(path, useCache=False, lookupGridCellSize=4)
+    assert network.lookupGridCellSize == 4
+    network = Network.fromFile(path)
+    assert network.lookupGridCellSize == 4
+    lane = network.lanes[0]
+    assert network.laneAt(lane.centerline.pointAlongBy(0.5, normalized=True)) is lane
+
+def test_lazy_cache(cached_maps):
+    from scenic.domains.driving.roads import Network
+    path = cached_maps['tests/formats/opendrive/maps/CARLA/Town01.xodr']
+    Network.fromFile(path)      # make sure the cached version exists
+    network = Network.fromFile(path)
+    def loaded(elem):
+        return '_lazySource' not in elem.__dict__
+    assert not any(loaded(lane) for lane in network.lanes)
+    assert not network.drivableRegion.isComputed     # unions are not computed in advance
+    source = network.lanes[-1].__dict__['_lazySource']
+    for array in source.arrays.values():    # tables are mapped from the file, not copied
+        assert not array.flags.owndata and not array.flags.writeable
+    assert not hasattr(network.lanes[-1], 'nonexistent')
+    assert not loaded(network.lanes[-1])    # only saved attributes trigger loading
+    lane = network.lanes[0]
+    point = lane.centerline.pointAlongBy(0.5, normalized=True)
+    assert loaded(lane)
+    assert network.laneAt(point) is lane
+    # fall back to the orientation of the lane, indexing the lanes without loading them
+    assert network.drivableRegion.orientation.headingFunction(point) == lane.orientation[point]
+    assert not all(loaded(lane) for lane in network.lanes)
+    for maneuver in lane.maneuvers:
+        assert maneuver.startLane is lane
+        if maneuver.intersection:
+            assert maneuver in maneuver.intersection.maneuvers
+    intersection = network.intersections[0]
+    point = intersection.maneuvers[0].connectingLane.centerline.pointAlongBy(0.5, normalized=True)
+    assert intersection.maneuversAt(point)
+    # the index of the maneuvers is built without loading all their connecting lanes
+    assert not all(loaded(maneuver.connectingLane) for maneuver in intersection.maneuvers)
+    assert network.drivableRegion.containsPoint(point)
+
+def test_parallel_loading(cached_maps):
+    import pickle
+    from scenic.domains.driving.roads import Network
+    path = str(cached_maps['tests/formats/opendrive/maps/LGSVL/cubetown.xodr'])
+    serial = Network.fromOpenDrive(path)
+    parallel = Network.fromOpenDrive(path, workers=2)
+    assert pickle.dumps(parallel) == pickle.dumps(serial)
+
+def test_bounded_loading(cached_maps):
+    from scenic.domains.driving.roads import Network
+    path = cached_maps['tests/formats/opendrive/maps/CARLA/Town01.xodr']
+    bounds = (100, -200, 250, -100)
+    full = Network.fromFile(path)
+    for i in range(2):     # second time loads the cached version
+        network = Network.fromFile(path, bounds=bounds, margin=2)
+        assert 0 < len(network.allRoads) < len(full.allRoads)
+        fullIDs = set(road.id for road in full.allRoads)
+        assert all(road.id in fullIDs for road in network.allRoads)
+        (minx, maxx), (miny, maxy) = network.drivableRegion.getAABB()
+        assert minx < bounds[2] and maxx > bounds[0]
+        assert miny < bounds[3] and maxy > bounds[1]
+        # links to roads outside the bounds have been cut
+        elements = set(id(elem) for elem in network.elements.values())
+        for lane in network.lanes:
+            for section in lane.sections:
+                for other in (section._predecessor, section._successor):
+                    assert other is None or id(other) in elements
+            for maneuver in lane.maneuvers:
+                assert id(maneuver.endLane) in elements
+    # the cached bounded network must not be used for the full map
+    network = Network.fromFile(path)
+    assert len(network.allRoads) == len(full.allRoads)
+
+def test_road_direction(cached_maps):
+    import math
+    import numpy
+    from scenic.core.vectors import PolygonalVectorField
+    from scenic.domains.driving.roads import Network
+    path = cached_maps['tests/formats/opendrive/maps/CARLA/Town01.xodr']
+    network = Network.fromFile(path)
+    field = network.roadDirection
+    assert isinstance(field, PolygonalVectorField)
+    assert any(heading is not None for cell, heading in field.cells)
+    rng = numpy.random.default_rng(0)
+    for x, y in network.drivableRegion.uniformPoints(200, rng):
+        point = (x, y)
+        expected = network._defaultRoadDirection(point)
+        error = (field[point] - expected + math.pi) % math.tau - math.pi
+        assert error == pytest.approx(0, abs=1e-6)
+    assert field[(1e6, 1e6)] == 0
+
+def test_relative_heading_pruning(cached_maps):
+    from scenic.core.vectors import PolygonalVectorField
+    scenario = compileDrivingScenario(cached_maps, """
+        ego = Car on road
+        other = Car on road, with requireVisible False
+        require (relative heading of other) >= 150 deg
+        require (distance to other) <= 15
+    """)
+    ego = scenario.egoObject
+    assert isinstance(ego.heading.object, PolygonalVectorField)
+    # pruning removes parts of the road where no opposing lane is nearby
+    assert ego.position._conditioned is not ego.position
+    for i in range(3):
+        sampleScene(scenario, maxIterations=2000)
+
+def test_relative_heading_pruning_off_road(cached_maps):
+    # roadDirection has a default heading off the road, so pruning must keep
+    # positions on the sidewalk
+    scenario = compileDrivingScenario(cached_maps, """
+        ego = Object on sidewalk, facing roadDirection
+        other = Car on road, with requireVisible False
+        require abs(relative heading of other) <= 10 deg
+        require (distance to other) <= 15
+    """)
+    sidewalk = scenario.egoObject.position.region
+    ego = sampleEgo(scenario, maxIterations=2000)
+    assert sidewalk.containsPoint(ego.position)
+    assert ego.heading == 0
+
 def test_intersection(cached_maps):
     scenario = compileDrivingScenario(cached_maps, """
         intersection = Uniform(*network.intersections)
@@ -1,9 +1,15 @@
 
 import os
 import glob
+import math
+import pickle
 import pytest
+import numpy
+from scipy.integrate import quad
 
 from scenic.formats.opendrive import OpenDriveWorkspace
+from scenic.formats.opendrive.xodr_parser import (RoadMap, Clothoid, Cubic, ParamCubic,
+                                                  Line)
 from scenic.core.geometry import TriangulationError
 
 oldDir = os.getcwd()
@@ -20,3 +26,44 @@ def test_map(path, runLocally):
             OpenDriveWorkspace(path, n=10)
         except TriangulationError:
             pytest.skip('need better triangulation library to run this test')
+
+def test_curve_points():
+    s = numpy.linspace(0, 40, 9)
+    # spirals with increasing/decreasing curvature, compared to numerical integration
+    for curv0, curv1 in ((0.01, 0.05), (0.02, -0.03), (0, -0.1)):
+        spiral = Clothoid(3, 4, 0.5, 40, curv0, curv1)
+        heading = lambda t: 0.5 + curv0 * t + spiral.curve_rate * t * t / 2
+        points = spiral.points_at(s)
+        for (x, y, ps), t in zip(points, s):
+            assert ps == t
+            assert x == pytest.approx(3 + quad(lambda u: math.cos(heading(u)), 0, t)[0])
+            assert y == pytest.approx(4 + quad(lambda u: math.sin(heading(u)), 0, t)[0])
+    # degenerate curves which are straight lines
+    line = Line(3, 4, 0.5, 40).points_at(s)
+    assert line[-1] == pytest.approx((3 + 40 * math.cos(0.5), 4 + 40 * math.sin(0.5), 40))
+    for curve in (Clothoid(3, 4, 0.5, 40, 0, 0), Cubic(3, 4, 0.5, 40, 0, 0, 0, 0),
+                  ParamCubic(3, 4, 0.5, 40, 0, 40, 0, 0, 0, 0, 0, 0)):
+        assert curve.points_at(s) == pytest.approx(line)
+        assert curve.point_at(20) == pytest.approx(tuple(line[4]))
+    # circular arc
+    arc = Clothoid(0, 0, 0, math.pi * 10, 0.1, 0.1)
+    assert arc.point_at(math.pi * 10) == pytest.approx((0, 20, math.pi * 10), abs=1e-9)
+
+def test_cubic_arclength():
+    cubic = Cubic(0, 0, 0, 10, 0, 0.1, 0.01, 0.001)
+    expected = quad(lambda u: math.hypot(1, 0.1 + 0.02*u + 0.003*u*u), 0, 3)[0]
+    length = cubic.arclength(3)
+    assert isinstance(length, float)
+    assert length == pytest.approx(expected)
+    assert cubic.arclength(numpy.array([3, 3])) == pytest.approx([expected, expected])
+    param = ParamCubic(0, 0, 0, 10, 0, 1, 0, 0, 0, 0, 0.1, 0)
+    assert isinstance(param.arclength(0.5), float)
+
+@pytest.mark.filterwarnings("ignore::scenic.formats.opendrive.OpenDriveWarning")
+@pytest.mark.parametrize("elide", (False, True))
+def test_streaming_parse(elide):
+    path = 'tests/formats/opendrive/maps/CARLA/Town07.xodr'
+    full, streamed = RoadMap(elide_short_roads=elide), RoadMap(elide_short_roads=elide)
+    full.parse(path)
+    streamed.parse(path, stream=True)
+    assert pickle.dumps(streamed) == pickle.dumps(full)
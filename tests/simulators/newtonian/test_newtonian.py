@@ -0,0 +1,43 @@
+
+import math
+import pytest
+
+from scenic.core.vectors import Vector
+from scenic.simulators.newtonian.simulator import MAX_ACCELERATION
+from tests.utils import compileScenic
+
+def test_vectorized_step():
+    scenario = compileScenic("""
+        param map = 'tests/formats/opendrive/maps/opendrive.org/CulDeSac.xodr'
+        param map_options = dict(useCache=False)
+        param render = False
+        model scenic.simulators.newtonian.model
+        behavior Accelerate():
+            while True:
+                take SetThrottleAction(1)
+        behavior Turn():
+            take SetThrottleAction(1), SetSteerAction(0.5)
+            take SetPositionAction(self.position + 0 @ 10)
+            while True:
+                wait
+        ego = Car with behavior Accelerate, with allowCollisions True
+        other = Car with behavior Turn, with allowCollisions True, with requireVisible False
+        Car with allowCollisions True, with requireVisible False
+    """)
+    scene, _ = scenario.generate(maxIterations=1000)
+    ego, other, parked = scene.objects
+    simulator = scenario.getSimulator()
+    simulation = simulator.simulate(scene, maxSteps=4)
+    dt = simulator.timestep
+    first, second, final = (simulation.result.trajectory[i] for i in (1, 2, -1))
+    # accelerating in a straight line
+    distance = sum(i * dt * MAX_ACCELERATION * dt for i in range(1, 5))
+    assert final[0] == pytest.approx(ego.position.offsetRotated(ego.heading, Vector(0, distance)))
+    # turning, then teleported (and moving on from the new position)
+    speed = dt * MAX_ACCELERATION
+    assert first[1] == pytest.approx(other.position.offsetRotated(other.heading, Vector(0, speed * dt)))
+    turned = other.heading - speed / (other.length / math.sin(math.pi / 4)) * dt
+    moved = first[1] + (0, 10) + Vector(0, 2 * speed * dt).rotatedBy(turned)
+    assert second[1] == pytest.approx(moved)
+    # objects without behaviors stay put
+    assert final[2] == pytest.approx(parked.position)
@@ -1,7 +1,10 @@
 
+import random
+
 import pytest
 
 import scenic
+from scenic.core.dynamics import Behavior
 from scenic.core.errors import InvalidScenarioError, RuntimeParseError
 from scenic.core.object_types import Object
 from tests.utils import compileScenic, sampleScene, sampleEgo, sampleParamPFrom
@@ -80,6 +83,69 @@ def test_mutate():
     assert ego1.position.y != pytest.approx(1)
     assert ego1.heading != pytest.approx(0)
 
+def test_mutator_without_rng():
+    # mutators written before appliedTo took a random generator still work
+    scenario = compileScenic("""
+        from scenic.core.object_types import Mutator
+        class OldMutator(Mutator):
+            def appliedTo(self, obj):
+                return (obj.copyWith(foo=obj.foo + 1), False)
+        ego = Object with foo 1, with mutator [OldMutator()]
+        mutate
+    """)
+    assert sampleEgo(scenario).foo == 2
+
+def test_generate_many():
+    scenario = compileScenic("""
+        class Foo:
+            width: 2
+        behavior Bar():
+            wait
+        ego = Foo at Range(0, 5) @ 0, with behavior Bar()
+        param p = Range(0, 1)
+        require ego.position.x > 1
+    """)
+    serial = scenario.generateMany(6, workers=1, seed=12)
+    parallel = scenario.generateMany(6, workers=3, seed=12)
+    assert len(serial) == len(parallel) == 6
+    for (scene1, its1), (scene2, its2) in zip(serial, parallel):
+        assert its1 == its2
+        assert scene1.params['p'] == scene2.params['p']
+        assert scene1.egoObject.position == scene2.egoObject.position
+        assert type(scene2.egoObject) is type(scenario.egoObject)
+        assert scene2.workspace is scenario.workspace
+    assert len(set(scene.params['p'] for scene, _ in serial)) == 6
+    other = scenario.generateMany(6, workers=1, seed=13)
+    assert [scene.params['p'] for scene, _ in other] != [scene.params['p'] for scene, _ in serial]
+
+def test_generate_batch():
+    scenario = compileScenic("""
+        class Foo:
+            width: 2
+        behavior Bar():
+            wait
+        ego = Foo at Range(0, 5) @ 0, facing Range(-30, 30) deg, with behavior Bar()
+        other = Object at Range(-5, 5) @ Range(5, 10)
+        param p = Range(0, 1)
+        require ego.position.x > 1
+        require (distance to other) < 8
+    """)
+    scenes, iterations = scenario.generateBatch(20, batchSize=16, rng=random.Random(5))
+    assert len(scenes) == 20
+    assert iterations >= 20
+    for scene in scenes:
+        ego, other = scene.objects
+        assert ego.position.x > 1
+        assert ego.position.distanceTo(other.position) < 8
+        assert not ego.intersects(other)
+        assert ego.canSee(other)
+        assert isinstance(ego.heading, float)
+        assert type(ego) is type(scenario.egoObject)
+        assert isinstance(ego.behavior, Behavior)
+    assert len(set(scene.params['p'] for scene in scenes)) == 20
+    again, _ = scenario.generateBatch(20, batchSize=16, rng=random.Random(5))
+    assert [scene.params['p'] for scene in again] == [scene.params['p'] for scene in scenes]
+
 def test_verbose():
     for verb in range(4):
         scenic.syntax.translator.verbosity = verb
@@ -311,6 +311,62 @@ def test_reproducibility():
             assert scene.params['foo'] == baseScene.params['foo']
             assert iterations == baseIterations
 
+def test_reproducibility_rng():
+    scenario = compileScenic(
+        'ego = Object\n'
+        'Object offset by 0@3, facing Range(0, 360) deg, with foo Normal(0, 1)\n'
+        'Object offset by 0@6, facing Range(0, 360) deg\n'
+        'param foo = Uniform(1, 4, 9, 16, 25, 36)\n'
+        'param bar = (Point in CircularRegion(0@0, 5)).position\n'
+        'mutate\n'
+        'x = Range(0, 1)\n'
+        'require x > 0.8'
+    )
+    def sample(rng):
+        scene, iterations = scenario.generate(maxIterations=200, rng=rng)
+        return ([(obj.position, obj.heading) for obj in scene.objects],
+                scene.objects[1].foo, scene.params, iterations)
+    base = sample(random.Random(12))
+    state = random.getstate()
+    other = sample(random.Random(13))
+    assert random.getstate() == state   # global generator is not used
+    assert other != base
+    assert sample(random.Random(12)) == base
+
+def test_scene_seed():
+    scenario = compileScenic(
+        'ego = Object at Range(0, 10) @ 0\n'
+        'param p = Range(0, 1)\n'
+        'require ego.position.x > 5'
+    )
+    batch = scenario.generateMany(5, workers=1, seed=42)
+    for i in (4, 1):
+        rng = random.Random(scenario.sceneSeed(42, i))
+        scene, iterations = scenario.generate(rng=rng)
+        assert iterations == batch[i][1]
+        assert scene.params['p'] == batch[i][0].params['p']
+        assert scene.egoObject.position == batch[i][0].egoObject.position
+
+def test_sampling_plan():
+    scenario = compileScenic(
+        'ego = Object\n'
+        'Object offset by 0@3, facing Range(0, 360) deg, with foo Normal(0, 1)\n'
+        'Object offset by Range(-1, 1) @ 6, facing Range(0, 360) deg\n'
+        'param foo = Uniform(1, 4, 9, 16, 25, 36)\n'
+        'param bar = (Point in CircularRegion(0@0, 5)).position\n'
+        'mutate\n'
+        'x = Range(0, 1)\n'
+        'require x > 0.5'
+    )
+    def sample(backend):
+        scenario.setSamplingBackend(backend)
+        scene, iterations = scenario.generate(maxIterations=200, rng=random.Random(12))
+        return ([(obj.position, obj.heading) for obj in scene.objects],
+                scene.objects[1].foo, scene.params, iterations)
+    assert sample('plan') == sample('recursive')
+    with pytest.raises(ValueError):
+        scenario.setSamplingBackend('magic')
+
 ## Independence
 
 def test_independence():
@@ -34,6 +34,132 @@ def test_dynamic_derived_property():
     actions = sampleEgoActions(scenario, maxSteps=4)
     assert len(actions) == 3
 
+def test_dynamic_proxy_caching():
+    scenario = compileScenic("""
+        behavior Foo():
+            take self.visibleRegion
+            take self.visibleRegion
+            self.position = self.position + 0@1
+            wait
+            take self.visibleRegion
+        ego = Object with behavior Foo
+    """)
+    actions = sampleEgoActions(scenario, maxSteps=4)
+    first, second, third, fourth = actions
+    assert second is first      # unchanged objects keep their cached values
+    assert third is None
+    assert fourth.center == first.center + (0, 1)
+
+def test_columnar_trajectory(tmp_path):
+    import numpy
+    from scenic.core.simulators import DummySimulator, ColumnarTrajectory
+    scenario = compileScenic("""
+        behavior Foo():
+            while True:
+                self.position = self.position + 0@1
+                wait
+        ego = Object with behavior Foo
+        Object at 5@5
+    """)
+    scene = sampleScene(scenario)
+    results = []
+    for columnar in (False, True):
+        simulation = DummySimulator().simulate(scene, maxSteps=100,
+                                               columnarTrajectory=columnar)
+        results.append(simulation.result)
+    plain, result = results
+    trajectory = result.trajectory
+    assert isinstance(trajectory, ColumnarTrajectory)
+    assert trajectory.positions.shape == (101, 2, 2)
+    assert tuple(trajectory) == plain.trajectory
+    assert result.finalState == plain.finalState
+    assert trajectory[-1][0] == trajectory[0][0] + (0, 100)
+    path = tmp_path / 'trajectory.npz'
+    trajectory.save(path)
+    loaded = ColumnarTrajectory.load(path)
+    assert isinstance(loaded.positions, numpy.memmap)
+    assert tuple(loaded) == plain.trajectory
+    assert numpy.array_equal(loaded.speeds, trajectory.speeds)
+    path = tmp_path / 'trajectory'     # no .npz extension
+    trajectory.save(path)
+    loaded = ColumnarTrajectory.load(path)
+    assert tuple(loaded) == plain.trajectory
+    assert tuple(ColumnarTrajectory.load(path, mmap=False)) == plain.trajectory
+
+def test_streaming_recorder(tmp_path):
+    from scenic.core.simulators import DummySimulator, TerminationType
+    from scenic.core.recording import StreamingRecorder, SimulationRecording
+    scenario = compileScenic("""
+        behavior Foo():
+            while True:
+                self.position = self.position + 0@1
+                wait
+        ego = Object with behavior Foo
+        record initial ego.position.y as start
+        record ego.position.y as y
+        record final ego.position.y as end
+    """)
+    scene = sampleScene(scenario)
+    path = tmp_path / 'simulation.rec'
+    plain = DummySimulator().simulate(scene, maxSteps=25).result
+    recorder = StreamingRecorder(path, decimation=4, keepTrajectory=False, chunkSize=2)
+    result = DummySimulator().simulate(scene, maxSteps=25, recorder=recorder).result
+    assert result.trajectory == (plain.finalState,)
+    assert result.records == plain.records
+    recording = SimulationRecording(path)
+    states = list(recording.states())
+    assert [time for time, state in states] == list(range(0, 25, 4)) + [25]
+    assert all(state == plain.trajectory[time] for time, state in states)
+    records = recording.records
+    assert records['start'] == plain.records['start']
+    assert records['end'] == plain.records['end']
+    assert records['y'] == plain.records['y'][::4]
+    assert recording.termination == (TerminationType.timeLimit, plain.terminationReason)
+    # an interrupted recording can be read up to its last complete chunk
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) // 2])
+    with pytest.warns(UserWarning):
+        truncated = list(recording.states())
+        assert recording.termination is None
+    assert 0 < len(truncated) < len(states)
+
+def test_campaign():
+    from scenic.core.simulators import (DummySimulator, SimulationCreationError,
+                                        runCampaign)
+    class FlakySimulator(DummySimulator):
+        failures = 0
+        def createSimulation(self, scene, verbosity=0):
+            if self.failures < 2:
+                self.failures += 1
+                raise SimulationCreationError('simulator not ready')
+            return super().createSimulation(scene, verbosity=verbosity)
+    scenario = compileScenic("""
+        behavior Foo():
+            while True:
+                take Range(0, 1)
+        ego = Object at Range(0, 5) @ 0, with behavior Foo
+        record initial simulation().worker_num as worker
+    """)
+    def outcome(run):
+        assert run.result.records['worker'] == run.workerNum
+        return (run.index, run.scene.egoObject.position,
+                [actions[run.scene.egoObject] for actions in run.result.actions])
+    runs = {}
+    for workers in (1, 3):
+        campaign = runCampaign(scenario, 6, workers=workers, seed=7, maxSteps=3,
+                               simulatorFactory=FlakySimulator)
+        runs[workers] = sorted(campaign, key=lambda run: run.index)
+    serial, parallel = runs[1], runs[3]
+    assert all(run.workerNum == 0 for run in serial)
+    assert all(1 <= run.workerNum <= 3 for run in parallel)
+    assert [outcome(run) for run in serial] == [outcome(run) for run in parallel]
+    assert len(set(run.scene.egoObject.position for run in serial)) == 6
+    failing = runCampaign(scenario, 2, workers=1, maxSteps=1, retries=1,
+                          simulatorFactory=FlakySimulator)
+    run = next(failing)
+    assert run.result is None and isinstance(run.error, SimulationCreationError)
+    assert next(failing).result is not None
+
 ## Behaviors
 
 # Basic
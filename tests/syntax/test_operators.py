@@ -3,6 +3,7 @@ import math
 import pytest
 
 from scenic.core.errors import RuntimeParseError
+from scenic.core.object_types import Point
 from tests.utils import compileScenic, sampleEgoFrom, sampleParamP, sampleParamPFrom
 
 ## Scalar operators
@@ -139,6 +140,25 @@ def test_oriented_point_can_see_object():
     """)
     assert p == (True, False)
 
+def test_can_see_all():
+    scenario = compileScenic("""
+        ego = Object facing Range(-180, 180) deg, with viewAngle Range(10, 360) deg
+        for i in range(30):
+            Object at Range(-60, 60) @ Range(-60, 60), with requireVisible False,
+                with allowCollisions True
+    """)
+    for i in range(5):
+        scene, _ = scenario.generate(maxIterations=1)
+        ego, others = scene.egoObject, scene.objects[1:]
+        visible = ego.canSeeAll(others)
+        assert visible.dtype == bool and visible.shape == (len(others),)
+        for other, result in zip(others, visible):
+            assert result == ego.canSee(other)
+            assert result == any(ego.visibleRegion.containsPoint(corner)
+                                 for corner in other.corners)
+        pt = Point(position=ego.position)
+        assert list(pt.canSeeAll(others)) == [pt.canSee(other) for other in others]
+
 # in
 
 def test_point_in_region():
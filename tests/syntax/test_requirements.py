@@ -1,3 +1,4 @@
+import random
 
 import pytest
 
@@ -136,6 +137,55 @@ def test_intersection_requirement_disabled_2():
     xs = [sampleEgo(scenario, maxIterations=60).position.x for i in range(60)]
     assert any(x < 1 for x in xs)
 
+def test_early_rejection():
+    scenario = compileScenic("""
+        foo = RectangularRegion(0@0, 0, 10, 10)
+        ego = Object at Range(0, 10) @ 0, with regionContainedIn foo
+        require ego.position.x < 4
+        param p = Range(0, 1)
+    """)
+    class CountingRandom(random.Random):
+        calls = 0
+        def uniform(self, a, b):
+            self.calls += 1
+            return super().uniform(a, b)
+    for backend in scenario.samplingBackends:
+        scenario.setSamplingBackend(backend)
+        rng = CountingRandom(1)
+        total = 0
+        for i in range(30):
+            scene, iterations = scenario.generate(maxIterations=200, rng=rng)
+            assert scene.egoObject.position.x < 4
+            total += iterations
+        # rejected samples are abandoned before sampling the parameter
+        assert rng.calls == total + 30
+
+def test_sampling_stats():
+    scenario = compileScenic("""
+        ego = Object at Range(0, 10) @ 0
+        require ego.position.x < 8
+        require[0.5] ego.position.x > 1
+        other = Object at Range(-10, 10) @ 5
+    """)
+    assert scenario.samplingStats() == {}
+    random.seed(2)
+    scenes = [scenario.generate(maxIterations=1000)[0] for i in range(100)]
+    assert all(scene.egoObject.position.x < 8 for scene in scenes)
+    stats = scenario.samplingStats()
+    assert set(stats) == {
+        'requirement on line 2', 'requirement on line 3',
+        'containment of object 0', 'containment of object 1',
+        'visibility of object 1',
+        'intersection of object 0', 'intersection of object 1'
+    }
+    req = stats['requirement on line 2']
+    assert req.evaluations >= 100
+    assert 0 < req.rejections < req.evaluations
+    assert req.meanTime > 0
+    # the soft requirement is only checked when it is active
+    assert stats['requirement on line 3'].evaluations < req.evaluations
+    assert stats['containment of object 0'].rejections == 0
+
 ## Static violations of built-in requirements
 
 def test_static_containment_violation():
@@ -50,3 +50,16 @@ def test_param_float(tmpdir):
     p = runAndGetP(tmpdir, 'param p = 42',
                    options=['--param', 'p', '123e1'])
     assert p == '1230.0'
+
+def test_workers(tmpdir):
+    program = 'param p = Range(0, 1)'
+    p2 = runAndGetP(tmpdir, program, options=['--seed', '12', '--workers', '2'])
+    p3 = runAndGetP(tmpdir, program, options=['--seed', '12', '--workers', '2'])
+    assert 0 <= float(p2) <= 1
+    assert p2 == p3
+
+def test_sampler(tmpdir):
+    program = 'param p = Range(0, 1)'
+    p1 = runAndGetP(tmpdir, program, options=['--seed', '12'])
+    p2 = runAndGetP(tmpdir, program, options=['--seed', '12', '--sampler', 'plan'])
+    assert p1 == p2